@@ -1,13 +1,23 @@
 # -*- coding: utf-8 -*-
 """
 Isolation Forest anomaly detector with persisted scaler.
+
+A bundle at ``path`` is the joblib payload plus two sidecars written with it:
+``path.meta.json`` (metadata, readable without unpickling anything) and
+``path.forest`` (the compiled forest arrays, stored uncompressed so they can
+be memory-mapped read-only and shared by every process that loads them).
 """
 
 from __future__ import annotations
 
+import json
+import logging
 import os
+import tempfile
+import threading
+import uuid
 
-from typing import Dict, List, Optional
+from typing import IO, Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 import hashlib
 from datetime import datetime, timezone
 
@@ -17,39 +27,214 @@ import pandas as pd
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 
+from forest_engine import CompiledForest
+
 MODEL_BUNDLE_VERSION = "1.0.0"
 
+_LOG = logging.getLogger("ids.detector")
+
+ENGINES = ("iforest", "hst")
+META_SUFFIX = ".meta.json"
+FOREST_SUFFIX = ".forest"
+
+
+def align_columns(
+    X: np.ndarray,
+    columns: Sequence[str],
+    names: Optional[Sequence[str]],
+    cache: Dict[Tuple[str, ...], Optional[np.ndarray]],
+) -> np.ndarray:
+    """Reorder NumPy columns named `columns` into `names` order (missing -> 0);
+    the column mapping is memoized in `cache`."""
+    key = tuple(columns)
+    if key not in cache:
+        names = list(names or [])
+        if key == tuple(names):
+            index = None
+        else:
+            pos = {name: i for i, name in enumerate(key)}
+            index = np.array([pos.get(name, -1) for name in names], dtype=np.intp)
+        cache[key] = index
+    index = cache[key]
+    if index is None:
+        return X
+    out = X[:, np.maximum(index, 0)]
+    out[:, index < 0] = 0.0
+    return out
+
+
+def _atomic_write(path: str, write: Callable[[IO[bytes]], None]) -> None:
+    """Run `write` on a temp file next to `path`, then rename it over `path`,
+    so a reader never sees a half-written file."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(
+        dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            write(fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_dump(payload: Dict, path: str) -> None:
+    """joblib-dump `payload` to `path` atomically."""
+    _atomic_write(path, lambda fh: joblib.dump(payload, fh))
+
+
+def feature_checksum(names: Optional[Sequence[str]]) -> str:
+    """sha256 of the comma-joined feature names ("" for none)."""
+    if not names:
+        return ""
+    data = ",".join(map(str, names)).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_bundle_metadata(
+    path: str, engine: str, feature_names: Optional[List[str]], meta: Dict[str, Any]
+) -> None:
+    """Write the ``path.meta.json`` sidecar (atomically)."""
+    doc = {"engine": engine, "feature_names": feature_names, "meta": meta}
+    data = json.dumps(doc, indent=2, sort_keys=True).encode("utf-8")
+
+    def write(fh: IO[bytes]) -> None:
+        fh.write(data)
+
+    _atomic_write(path + META_SUFFIX, write)
+
+
+def read_bundle_metadata(path: str) -> Optional[Dict[str, Any]]:
+    """The ``path.meta.json`` sidecar, or None for a bundle without one."""
+    try:
+        with open(path + META_SUFFIX, "r", encoding="utf-8") as fh:
+            doc = json.load(fh)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        _LOG.debug("unreadable bundle metadata for %s", path, exc_info=True)
+        return None
+    return doc if isinstance(doc, dict) else None
+
 
 class AnomalyDetector:
     """Train, persist, and use an Isolation Forest with a StandardScaler."""
 
+    engine = "iforest"
+    # Batch model: refit by online retraining, never updated per sample
+    streaming = False
+
     def __init__(
         self,
         contamination: float = 0.05,
         n_estimators: int = 200,
         random_state: int = 42,
+        n_jobs: Optional[int] = None,
     ) -> None:
-        self.model: Optional[IsolationForest] = None
-        self.scaler: Optional[StandardScaler] = None
+        self._model: Optional[IsolationForest] = None
+        self._scaler: Optional[StandardScaler] = None
+        # Bundle whose model and scaler are unpickled on first use (set when
+        # load_model could serve scoring from the memory-mapped forest)
+        self._lazy_path: Optional[str] = None
+        self._lazy_lock = threading.Lock()
         self.feature_names: Optional[List[str]] = None
 
         self.meta: Dict[str, object] = {}
+        # Input column order -> model column positions, for score_batch
+        self._column_index: Dict[Tuple[str, ...], Optional[np.ndarray]] = {}
+        # Flat-array copy of model + scaler used by score_batch; compiled on
+        # first use unless compiling already failed for this model
+        self._compiled: Optional[CompiledForest] = None
+        self._compile_failed = False
+        # Bumped by every train/load_model, so score caches can tell a model
+        # changed in place from the one they cached
+        self.generation = 0
 
         self.contamination = float(contamination)
         self.n_estimators = int(n_estimators)
         self.random_state = int(random_state)
+        # Training parallelism only (not saved; scores do not depend on it)
+        self.n_jobs = n_jobs
+
+    @property
+    def model(self) -> Optional[IsolationForest]:
+        self._load_lazy()
+        return self._model
+
+    @model.setter
+    def model(self, value: Optional[IsolationForest]) -> None:
+        self._model = value
 
-    def train(self, df_features: pd.DataFrame) -> None:
+    @property
+    def scaler(self) -> Optional[StandardScaler]:
+        self._load_lazy()
+        return self._scaler
+
+    @scaler.setter
+    def scaler(self, value: Optional[StandardScaler]) -> None:
+        self._scaler = value
+
+    @property
+    def lazy(self) -> bool:
+        """True while the sklearn model and scaler are not loaded yet."""
+        return self._lazy_path is not None
+
+    @property
+    def forest_mapped(self) -> bool:
+        """True when scoring reads the forest arrays from a memory map."""
+        return isinstance(getattr(self._compiled, "threshold", None), np.memmap)
+
+    def _load_lazy(self) -> None:
+        if self._lazy_path is None:
+            return
+        with self._lazy_lock:
+            path = self._lazy_path
+            if path is None:
+                return
+            payload: Dict = joblib.load(path)
+            if dict(payload.get("meta", {})).get("bundle_id") != self.meta.get(
+                "bundle_id"
+            ):
+                raise RuntimeError(
+                    f"Model bundle changed on disk since it was loaded: {path}"
+                )
+            self._model = payload.get("model", None)
+            self._scaler = payload.get("scaler", None)
+            self._lazy_path = None
+
+    def train(
+        self, df_features: pd.DataFrame, scaler: Optional[StandardScaler] = None
+    ) -> None:
+        """Fit the scaler and forest on `df_features`. A `scaler` already
+        fitted on more data (e.g. with ``partial_fit`` over a whole dataset
+        the frame was sampled from) is used as-is."""
         if df_features is None or df_features.empty:
             raise ValueError("No features provided for training.")
         self.feature_names = list(df_features.columns)
-        self.scaler = StandardScaler()
-        X = self.scaler.fit_transform(df_features.values.astype(float))
+        if scaler is None:
+            self.scaler = StandardScaler()
+            X = self.scaler.fit_transform(df_features.values.astype(float))
+        else:
+            self.scaler = scaler
+            X = scaler.transform(df_features.values.astype(float))
         self.model = IsolationForest(
             contamination=self.contamination,
             n_estimators=self.n_estimators,
             random_state=self.random_state,
+            n_jobs=self.n_jobs,
         ).fit(X)
+        self._lazy_path = None
+        self._column_index = {}
+        self._compiled = None
+        self._compile_failed = False
+        self.generation += 1
 
     def _prepare_features(self, df_features: pd.DataFrame) -> np.ndarray:
         if self.model is None or self.scaler is None or self.feature_names is None:
@@ -74,30 +259,170 @@ class AnomalyDetector:
         X = self._prepare_features(df_features)
         return self.model.decision_function(X)
 
-    def save_model(self, path: str) -> None:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
+    def _align(self, X: np.ndarray, columns: Sequence[str]) -> np.ndarray:
+        """Reorder NumPy columns named `columns` into model order (missing -> 0)."""
+        return align_columns(X, columns, self.feature_names, self._column_index)
 
-        trained_at = datetime.now(timezone.utc).isoformat()
+    @property
+    def compiled(self) -> Optional[CompiledForest]:
+        """The compiled inference engine, or None if the model cannot be compiled."""
+        if (
+            self._compiled is None
+            and not self._compile_failed
+            and self._model is not None
+            and self._scaler is not None
+        ):
+            try:
+                self._compiled = CompiledForest.from_detector(self)
+            except Exception:
+                _LOG.debug("forest compilation failed; using sklearn", exc_info=True)
+                self._compile_failed = True
+        return self._compiled
+
+    def score_batch(
+        self,
+        X: Union[np.ndarray, pd.DataFrame],
+        columns: Optional[Sequence[str]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Decision scores and anomaly flags for many rows in one forest pass.
+
+        `X` is a 2-D array whose columns are `columns` (default: the model's
+        own feature order); DataFrames are reindexed by name as in
+        :meth:`predict`. Returns ``(scores, is_anomaly)`` where scores match
+        :meth:`decision_scores` and ``is_anomaly`` is ``scores < 0``, i.e.
+        exactly ``predict(X) == "Anomaly"``. Scoring runs on :attr:`compiled`
+        (sklearn's own path only if the forest cannot be compiled).
+        """
+        loaded = self.lazy or (self._model is not None and self._scaler is not None)
+        if not loaded or self.feature_names is None:
+            raise RuntimeError("Model not trained or loaded.")
+        if isinstance(X, pd.DataFrame):
+            A = X.reindex(columns=self.feature_names).fillna(0.0).values.astype(float)
+        else:
+            A = np.asarray(X, dtype=float)
+            if A.ndim == 1:
+                A = A.reshape(1, -1)
+            if columns is not None:
+                A = self._align(A, columns)
+            elif A.shape[1] != len(self.feature_names):
+                raise ValueError(
+                    f"Expected {len(self.feature_names)} feature columns, got {A.shape[1]}"
+                )
+            A = np.nan_to_num(A, nan=0.0)
+        engine = self.compiled
+        if engine is not None:
+            scores = engine.decision_function(A)
+        else:
+            model, scaler = self.model, self.scaler
+            assert model is not None and scaler is not None
+            # decision_function == score_samples - offset_; < 0 is an outlier
+            scores = model.score_samples(scaler.transform(A)) - model.offset_
+        return scores, scores < 0
+
+    def warm_up(self) -> None:
+        """Page in the forest and run one row through :meth:`score_batch`, so
+        the first packet scored after a model swap pays no loading cost."""
+        engine = self.compiled
+        if engine is not None:
+            for array in engine.arrays().values():
+                array.max()
+        self.score_batch(np.zeros((1, len(self.feature_names or []))))
 
+    def save_model(self, path: str) -> None:
+        """Write the bundle and its sidecars to `path`, each atomically (temp
+        file + rename). The metadata sidecar goes last; all three carry one
+        ``bundle_id``, so a reader that catches a save half-way falls back
+        to the joblib payload instead of mixing two models."""
+        trained_at = datetime.now(timezone.utc).isoformat()
+        meta = {
+            "engine": self.engine,
+            "contamination": self.contamination,
+            "n_estimators": self.n_estimators,
+            "random_state": self.random_state,
+            "version": MODEL_BUNDLE_VERSION,
+            "trained_at": trained_at,
+            "feature_checksum": self._feature_checksum(self.feature_names),
+            "bundle_id": uuid.uuid4().hex,
+        }
         payload = {
             "model": self.model,
             "scaler": self.scaler,
             "feature_names": self.feature_names,
-            "meta": {
-                "contamination": self.contamination,
-                "n_estimators": self.n_estimators,
-                "random_state": self.random_state,
-                "version": MODEL_BUNDLE_VERSION,
-                "trained_at": trained_at,
-                "feature_checksum": self._feature_checksum(self.feature_names),
-            },
+            "meta": meta,
         }
-        joblib.dump(payload, path)
+        engine = self.compiled
+        if engine is not None:
+            forest = {
+                "bundle_id": meta["bundle_id"],
+                "params": engine.params(),
+                # np.ascontiguousarray: memmapped inputs are dumped as arrays
+                "arrays": {
+                    k: np.ascontiguousarray(v) for k, v in engine.arrays().items()
+                },
+            }
+            atomic_dump(forest, path + FOREST_SUFFIX)
+        else:
+            try:
+                os.remove(path + FOREST_SUFFIX)
+            except OSError:
+                pass
+        atomic_dump(payload, path)
+        write_bundle_metadata(path, self.engine, self.feature_names, meta)
 
-    def load_model(self, path: str) -> None:
+    def _load_forest(self, path: str, bundle_id: object) -> Optional[CompiledForest]:
+        """Memory-map the ``path.forest`` arrays if they belong to `bundle_id`."""
+        try:
+            forest = joblib.load(path + FOREST_SUFFIX, mmap_mode="r")
+            if forest.get("bundle_id") != bundle_id:
+                return None
+            return CompiledForest.from_arrays(forest["arrays"], forest["params"])
+        except FileNotFoundError:
+            return None
+        except Exception:
+            _LOG.debug("cannot map forest arrays for %s", path, exc_info=True)
+            return None
+
+    def load_model(
+        self, path: str, *, lazy: bool = True, payload: Optional[Dict] = None
+    ) -> None:
+        """Load the bundle at `path`.
+
+        With `lazy` and a bundle that has sidecars, only the metadata is read
+        and the compiled forest is memory-mapped; the sklearn model and
+        scaler are unpickled on first access (e.g. :meth:`predict`).
+        `payload` is the bundle already unpickled from `path`, if the caller
+        has it.
+        """
         if not os.path.exists(path):
             raise FileNotFoundError(f"Model file does not exist: {path}")
-        payload: Dict = joblib.load(path)
+        self._column_index = {}
+        self._compiled = None
+        self._compile_failed = False
+        self._lazy_path = None
+        self.generation += 1
+        sidecar = read_bundle_metadata(path) if lazy and payload is None else None
+        if sidecar is not None:
+            meta = dict(sidecar.get("meta") or {})
+            engine = sidecar.get("engine", self.engine)
+            if engine != self.engine:
+                raise RuntimeError(
+                    f"Model bundle uses the {engine!r} engine; set Detector.Engine = {engine}"
+                )
+            forest = self._load_forest(path, meta.get("bundle_id"))
+            if forest is not None and sidecar.get("feature_names"):
+                self._model = self._scaler = None
+                self.feature_names = list(sidecar["feature_names"])
+                self.meta = meta
+                self._compiled = forest
+                self._lazy_path = path
+                return
+        if payload is None:
+            payload = joblib.load(path)
+        engine = dict(payload.get("meta", {})).get("engine", self.engine)
+        if engine != self.engine:
+            raise RuntimeError(
+                f"Model bundle uses the {engine!r} engine; set Detector.Engine = {engine}"
+            )
         self.model = payload.get("model", None)
         self.scaler = payload.get("scaler", None)
         self.feature_names = payload.get("feature_names", None)
@@ -109,16 +434,14 @@ class AnomalyDetector:
 
     @staticmethod
     def _feature_checksum(names: Optional[List[str]]) -> str:
-        if not names:
-            return ""
-        data = ",".join(map(str, names)).encode("utf-8")
-        return hashlib.sha256(data).hexdigest()
+        return feature_checksum(names)
 
     def bundle_metadata(self) -> Dict[str, object]:
         """Return lightweight, human-readable bundle info."""
         return {
             "version": MODEL_BUNDLE_VERSION,
             "trained_at": self.meta.get("trained_at", ""),
+            "engine": self.engine,
             "feature_names": list(self.feature_names or []),
             "feature_count": len(self.feature_names or []),
             "feature_checksum": self._feature_checksum(self.feature_names),
@@ -128,3 +451,64 @@ class AnomalyDetector:
                 "random_state": self.random_state,
             },
         }
+
+
+def make_detector(
+    engine: str = "iforest",
+    contamination: float = 0.05,
+    n_estimators: int = 200,
+    random_state: int = 42,
+    depth: int = 10,
+    window_size: int = 250,
+    n_jobs: Optional[int] = None,
+):
+    """Build the detector named by ``[Detector] Engine``. `depth` and
+    `window_size` only apply to the streaming ``hst`` engine, `n_jobs`
+    (training cores) only to ``iforest``."""
+    engine = (engine or "iforest").strip().lower()
+    if engine == "hst":
+        from hst_detector import HalfSpaceTreesDetector
+
+        return HalfSpaceTreesDetector(
+            contamination=contamination,
+            n_estimators=n_estimators,
+            random_state=random_state,
+            depth=depth,
+            window_size=window_size,
+        )
+    if engine == "iforest":
+        return AnomalyDetector(
+            contamination=contamination,
+            n_estimators=n_estimators,
+            random_state=random_state,
+            n_jobs=n_jobs,
+        )
+    raise ValueError(f"unknown detector engine: {engine!r}")
+
+
+def load_detector(path: str):
+    """Load a bundle with whichever engine (and parameters) wrote it."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model file does not exist: {path}")
+    sidecar = read_bundle_metadata(path)
+    payload: Optional[Dict] = None
+    if sidecar is not None:
+        meta = dict(sidecar.get("meta") or {})
+    else:
+        # Legacy bundle without a sidecar: unpickle once, for both steps
+        payload = joblib.load(path)
+        meta = dict(payload.get("meta", {}))
+    params = {
+        key: meta[key]
+        for key in (
+            "contamination",
+            "n_estimators",
+            "random_state",
+            "depth",
+            "window_size",
+        )
+        if key in meta
+    }
+    detector = make_detector(str(meta.get("engine", "iforest")), **params)
+    detector.load_model(path, payload=payload)
+    return detector
@@ -548,6 +548,17 @@ def stats():
     )
 
 
+@app.get("/api/runtime")
+def runtime_stats():
+    """Sensor health: ingest queue, packet window and capture counters."""
+    require_auth()
+    try:
+        components = webdb.get_runtime_stats()
+    except Exception:
+        components = {}
+    return jsonify({"ok": True, "components": components, "ts": _iso_utc(_utcnow())})
+
+
 # =========================
 # New: settings (GET/PUT)
 # =========================
@@ -555,6 +566,7 @@ SAFE_KEYS = {
     ("Logging", "LogLevel"),
     ("Logging", "EnableFileLogging"),
     ("Monitoring", "AlertThresholds"),
+    ("Monitoring", "AlertPercentiles"),
     ("Signatures", "Enable"),
 }
 
@@ -637,13 +649,49 @@ def healthz():
         db_ok = True
     except Exception:
         db_ok = False
-    return jsonify(
-        {
-            "ok": db_ok,
-            "uptime_sec": int((_utcnow() - _APP_STARTED).total_seconds()),
-            "time": _iso_utc(_utcnow()),
-        }
-    ), (200 if db_ok else 500)
+    body = {
+        "ok": db_ok,
+        "uptime_sec": int((_utcnow() - _APP_STARTED).total_seconds()),
+        "time": _iso_utc(_utcnow()),
+    }
+    # Model in use and last (re)load outcome, as published by the monitor
+    try:
+        components = webdb.get_runtime_stats()
+    except Exception:
+        components = {}
+    body["model"] = components.get("model")
+    shards = {k: v for k, v in components.items() if k.startswith("model-shard")}
+    if shards:
+        body["model_shards"] = shards
+    return jsonify(body), (200 if db_ok else 500)
+
+
+@app.get("/api/thresholds")
+def alert_thresholds():
+    """Severity cutoffs in effect, with the score percentiles behind them
+    when Monitoring.AlertPercentiles is set (as published by the monitor)."""
+    require_auth()
+    try:
+        components = webdb.get_runtime_stats()
+    except Exception:
+        components = {}
+    body = {"ok": True, "thresholds": components.get("thresholds"), "ts": _iso_utc(_utcnow())}
+    shards = {k: v for k, v in components.items() if k.startswith("thresholds-shard")}
+    if shards:
+        body["shards"] = shards
+    return jsonify(body)
+
+
+@app.post("/api/model/reload")
+def model_reload():
+    """Ask the running monitor to reload its model bundle (picked up within
+    Monitoring.ModelWatchSeconds; the outcome is reported by /healthz)."""
+    require_auth()
+    try:
+        request_id = webdb.post_command("model_reload")
+    except Exception as exc:
+        return jsonify({"ok": False, "error": f"reload_request_failed: {exc}"}), 500
+    return jsonify({"ok": True, "id": request_id}), 202
 
 
 @app.post("/api/retention/run")
@@ -0,0 +1,509 @@
+# -*- coding: utf-8 -*-
+"""
+Kernel-side capture filtering with classic BPF.
+
+A capture filter is the optional ``[Capture] Filter`` expression (tcpdump
+syntax, compiled with libpcap or ``tcpdump -ddd``) followed by generated
+exclusions for hosts/networks and TCP/UDP/SCTP ports. The program is
+attached to capture sockets with ``SO_ATTACH_FILTER``, so excluded packets
+are dropped before they are copied to user space. Exclusions are built
+here directly, so they work without libpcap and can be regenerated
+cheaply when the trusted list changes.
+
+The exclusions read fixed header offsets: they match untagged Ethernet
+frames, and IPv6 ports only when TCP/UDP/SCTP directly follows the fixed
+header. VLAN-tagged frames and IPv6 packets with extension headers are
+never excluded; they are accepted and reach user space as usual.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ipaddress
+import logging
+import shutil
+import socket
+import struct
+import subprocess
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from packet_processor import DLT_EN10MB
+
+__all__ = [
+    "CaptureFilter",
+    "Program",
+    "accepts",
+    "attach_filter",
+    "chain",
+    "compile_expression",
+    "exclusion_program",
+    "validate_program",
+]
+
+_LOG = logging.getLogger("ids.bpf")
+
+# struct sock_filter: code, jt, jf, k
+Instruction = Tuple[int, int, int, int]
+Program = List[Instruction]
+
+SO_ATTACH_FILTER = 26
+BPF_MAXINSNS = 4096
+# Snap length returned for accepted packets (whole frame)
+ACCEPT_LEN = 0x40000
+
+# Opcodes (<linux/filter.h>)
+_LD_W_ABS = 0x20
+_LD_H_ABS = 0x28
+_LD_B_ABS = 0x30
+_LD_H_IND = 0x48
+_LDX_B_MSH = 0xB1
+_ALU_AND_K = 0x54
+_JMP_JA = 0x05
+_JMP_JEQ_K = 0x15
+_JMP_JSET_K = 0x45
+_RET_K = 0x06
+_RET_A = 0x16
+
+_ETH_IPV4 = 0x0800
+_ETH_IPV6 = 0x86DD
+_PORT_PROTOCOLS = (6, 17, 132)  # TCP, UDP, SCTP
+_FILTER = struct.Struct("=HBBI")
+
+
+class _Assembler:
+    """Emit instructions with symbolic forward jumps, then resolve offsets."""
+
+    def __init__(self) -> None:
+        self._code: List[list] = []
+        self._labels: Dict[str, int] = {}
+        self._n = 0
+
+    def label(self, name: str) -> None:
+        self._labels[name] = len(self._code)
+
+    def fresh(self, prefix: str) -> str:
+        self._n += 1
+        return f"{prefix}{self._n}"
+
+    def emit(
+        self,
+        code: int,
+        k: Union[int, str] = 0,
+        jt: Union[int, str] = 0,
+        jf: Union[int, str] = 0,
+    ) -> None:
+        self._code.append([code, jt, jf, k])
+
+    def goto(self, target: str) -> None:
+        self.emit(_JMP_JA, target)
+
+    def goto_if_eq(self, value: int, target: str) -> None:
+        # jt/jf only reach 255 instructions; `ja` reaches anywhere forward
+        self.emit(_JMP_JEQ_K, value, 0, 1)
+        self.goto(target)
+
+    def goto_if_set(self, mask: int, target: str) -> None:
+        self.emit(_JMP_JSET_K, mask, 0, 1)
+        self.goto(target)
+
+    def program(self) -> Program:
+        out: Program = []
+        for pc, (code, jt, jf, k) in enumerate(self._code):
+            if code == _JMP_JA and isinstance(k, str):
+                k = self._labels[k] - pc - 1
+            if isinstance(jt, str):
+                jt = self._labels[jt] - pc - 1
+            if isinstance(jf, str):
+                jf = self._labels[jf] - pc - 1
+            if not (0 <= jt <= 255 and 0 <= jf <= 255 and k >= 0):
+                raise ValueError("BPF jump out of range")
+            out.append((code, jt, jf, k & 0xFFFFFFFF))
+        return out
+
+
+def _networks(hosts: Iterable[str]) -> Tuple[list, list]:
+    v4: list = []
+    v6: list = []
+    for host in hosts:
+        try:
+            net = ipaddress.ip_network(str(host).strip(), strict=False)
+        except ValueError:
+            _LOG.warning("Ignoring invalid filter exclusion %r", host)
+            continue
+        (v4 if net.version == 4 else v6).append(net)
+    return sorted(set(v4)), sorted(set(v6))
+
+
+def _emit_v4_hosts(asm: _Assembler, nets: list) -> None:
+    by_mask: Dict[int, List[int]] = {}
+    for net in nets:
+        by_mask.setdefault(int(net.netmask), []).append(int(net.network_address))
+    for offset in (26, 30):  # source, destination
+        for mask, values in by_mask.items():
+            asm.emit(_LD_W_ABS, offset)
+            if mask != 0xFFFFFFFF:
+                asm.emit(_ALU_AND_K, mask)
+            for value in values:
+                asm.goto_if_eq(value, "drop")
+
+
+def _emit_v6_hosts(asm: _Assembler, nets: list) -> None:
+    for offset in (22, 38):  # source, destination
+        for net in nets:
+            addr = int(net.network_address)
+            mask = int(net.netmask)
+            words = [
+                ((addr >> s) & 0xFFFFFFFF, (mask >> s) & 0xFFFFFFFF)
+                for s in (96, 64, 32, 0)
+            ]
+            miss = asm.fresh("v6miss")
+            for i, (word, wmask) in enumerate(words):
+                if not wmask:
+                    continue
+                asm.emit(_LD_W_ABS, offset + 4 * i)
+                if wmask != 0xFFFFFFFF:
+                    asm.emit(_ALU_AND_K, wmask)
+                asm.emit(_JMP_JEQ_K, word, 0, miss)
+            asm.goto("drop")
+            asm.label(miss)
+
+
+def _emit_ports(
+    asm: _Assembler, ports: Sequence[int], proto_off: int, v4: bool
+) -> None:
+    has_ports = asm.fresh("ports")
+    # ldb [proto]; any of TCP/UDP/SCTP -> port checks, else accept
+    asm.emit(_LD_B_ABS, proto_off)
+    for proto in _PORT_PROTOCOLS:
+        asm.goto_if_eq(proto, has_ports)
+    asm.goto("accept")
+    asm.label(has_ports)
+    if v4:
+        # Only the first fragment carries ports; x = IPv4 header length
+        asm.emit(_LD_H_ABS, 20)
+        asm.goto_if_set(0x1FFF, "accept")
+        asm.emit(_LDX_B_MSH, 14)
+        for off in (14, 16):  # source, destination port
+            asm.emit(_LD_H_IND, off)
+            for port in ports:
+                asm.goto_if_eq(port, "drop")
+    else:
+        # No extension-header walk: only a TCP/UDP/SCTP next header is checked
+        for off in (54, 56):
+            asm.emit(_LD_H_ABS, off)
+            for port in ports:
+                asm.goto_if_eq(port, "drop")
+
+
+def exclusion_program(hosts: Iterable[str] = (), ports: Iterable[int] = ()) -> Program:
+    """Ethernet BPF that drops IPv4/IPv6 packets to or from `hosts`
+    (addresses or CIDR networks) or with a source/destination port in
+    `ports`, and accepts everything else (including VLAN-tagged frames
+    and IPv6 packets with extension headers, see the module docstring)."""
+    v4, v6 = _networks(hosts)
+    port_list = sorted({int(p) & 0xFFFF for p in ports})
+    asm = _Assembler()
+    if v4 or v6 or port_list:
+        asm.emit(_LD_H_ABS, 12)
+        asm.goto_if_eq(_ETH_IPV4, "ipv4")
+        asm.goto_if_eq(_ETH_IPV6, "ipv6")
+        asm.goto("accept")
+        asm.label("ipv4")
+        _emit_v4_hosts(asm, v4)
+        if port_list:
+            _emit_ports(asm, port_list, 23, v4=True)
+        asm.goto("accept")
+        asm.label("ipv6")
+        _emit_v6_hosts(asm, v6)
+        if port_list:
+            _emit_ports(asm, port_list, 20, v4=False)
+    asm.label("accept")
+    asm.emit(_RET_K, ACCEPT_LEN)
+    asm.label("drop")
+    asm.emit(_RET_K, 0)
+    program = asm.program()
+    if len(program) > BPF_MAXINSNS:
+        raise ValueError(
+            f"capture filter too large ({len(program)} > {BPF_MAXINSNS} instructions); "
+            "exclude networks instead of individual hosts"
+        )
+    return program
+
+
+def compile_expression(expression: str, linktype: int = DLT_EN10MB) -> Program:
+    """Compile a tcpdump-syntax filter with libpcap (via Scapy) or tcpdump.
+
+    Raises ValueError when the expression is invalid or no compiler exists.
+    """
+    errors = []
+    try:
+        from scapy.arch.common import compile_filter  # type: ignore
+
+        bpf = compile_filter(expression, linktype=linktype)
+        insns = ctypes.cast(bpf.bf_insns, ctypes.POINTER(ctypes.c_uint64 * bpf.bf_len))
+        raw = bytes(insns.contents)
+        return [_FILTER.unpack_from(raw, 8 * i) for i in range(bpf.bf_len)]
+    except Exception as e:
+        errors.append(f"libpcap: {e}")
+    tcpdump = shutil.which("tcpdump")
+    if tcpdump:
+        link = "EN10MB" if linktype == DLT_EN10MB else str(linktype)
+        res = subprocess.run(
+            [tcpdump, "-ddd", "-y", link, expression],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+        if res.returncode == 0:
+            lines = res.stdout.split()
+            return [
+                tuple(int(v) for v in lines[1 + 4 * i : 5 + 4 * i])  # type: ignore[misc]
+                for i in range(int(lines[0]))
+            ]
+        errors.append(f"tcpdump: {res.stderr.strip()}")
+    else:
+        errors.append("tcpdump: not installed")
+    raise ValueError(
+        f"cannot compile capture filter {expression!r} ({'; '.join(errors)})"
+    )
+
+
+def chain(first: Program, second: Program) -> Program:
+    """Program accepting what both accept: `first`'s accepting returns
+    become jumps to the start of `second`."""
+    out: Program = []
+    n = len(first)
+    for pc, (code, jt, jf, k) in enumerate(first):
+        if (code == _RET_K and k) or code == _RET_A:
+            out.append((_JMP_JA, 0, 0, n - pc - 1))
+        else:
+            out.append((code, jt, jf, k))
+    return out + list(second)
+
+
+def accepts(program: Program, data: bytes) -> bool:
+    """Run `program` over a frame in Python (tests, offline checks)."""
+    a = x = 0
+    pc = 0
+    size = len(data)
+    while pc < len(program):
+        code, jt, jf, k = program[pc]
+        pc += 1
+        cls = code & 0x07
+        if cls == 0x06:  # RET
+            return bool(a if code & 0x18 == 0x10 else k)
+        if cls in (0x00, 0x01):  # LD / LDX
+            mode, width = code & 0xE0, code & 0x18
+            if cls == 0x01 and mode == 0xA0:  # ldx 4*([k]&0xf)
+                if k >= size:
+                    return False
+                x = (data[k] & 0x0F) * 4
+                continue
+            if cls == 0x01 and mode == 0x00:  # ldx #k
+                x = k
+                continue
+            if mode == 0x00:  # ld #k
+                a = k
+                continue
+            if mode == 0x80:  # ld len
+                a = size
+                continue
+            off = k + (x if mode == 0x40 else 0)
+            n = {0x00: 4, 0x08: 2, 0x10: 1}[width]
+            if off + n > size:
+                return False
+            a = int.from_bytes(data[off : off + n], "big")
+        elif cls == 0x04:  # ALU (and/or/add/rsh/lsh with k)
+            op = code & 0xF0
+            src = x if code & 0x08 else k
+            if op == 0x50:
+                a &= src
+            elif op == 0x40:
+                a |= src
+            elif op == 0x00:
+                a = (a + src) & 0xFFFFFFFF
+            elif op == 0x70:
+                a >>= src
+            elif op == 0x60:
+                a = (a << src) & 0xFFFFFFFF
+        elif cls == 0x05:  # JMP
+            op = code & 0xF0
+            src = x if code & 0x08 else k
+            if op == 0x00:
+                pc += k
+                continue
+            if op == 0x10:
+                hit = a == src
+            elif op == 0x20:
+                hit = a > src
+            elif op == 0x30:
+                hit = a >= src
+            else:
+                hit = bool(a & src)
+            pc += jt if hit else jf
+        elif cls == 0x07:  # MISC: tax / txa
+            if code & 0xF8 == 0x80:
+                a = x
+            else:
+                x = a
+    return False
+
+
+def _fprog(program: Program) -> Tuple[bytes, ctypes.Array]:
+    buf = ctypes.create_string_buffer(b"".join(_FILTER.pack(*insn) for insn in program))
+    # struct sock_fprog { unsigned short len; struct sock_filter *filter; }
+    return struct.pack("HL", len(program), ctypes.addressof(buf)), buf
+
+
+def attach_filter(sock: socket.socket, program: Program) -> None:
+    """Attach (or atomically replace) the socket's kernel filter."""
+    # `buf` must outlive the call; the kernel copies the program
+    fprog, buf = _fprog(program)
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def validate_program(program: Program) -> None:
+    """Have the kernel verify `program` on a throwaway socket (Linux).
+
+    Raises ValueError if it is rejected; a no-op where the kernel check is
+    unavailable.
+    """
+    if not hasattr(socket, "AF_PACKET"):
+        return
+    try:
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    except OSError:
+        return
+    with probe:
+        try:
+            attach_filter(probe, program)
+        except OSError as e:
+            raise ValueError(f"kernel rejected capture filter: {e}") from None
+
+
+class CaptureFilter:
+    """Capture filter from config, kept in sync with a host exclusion source.
+
+    `hosts_source` returns the current hosts/networks to exclude (e.g. the
+    trusted list); :meth:`refresh` rebuilds the program when it changes and
+    re-attaches it to every registered capture socket.
+    """
+
+    def __init__(
+        self,
+        expression: str = "",
+        *,
+        exclude_ports: Iterable[int] = (),
+        hosts_source: Optional[Callable[[], Iterable[str]]] = None,
+        refresh_interval: float = 30.0,
+        linktype: int = DLT_EN10MB,
+    ) -> None:
+        self.expression = (expression or "").strip()
+        self.exclude_ports = sorted({int(p) for p in exclude_ports})
+        self.hosts_source = hosts_source
+        self.refresh_interval = float(refresh_interval)
+        self.linktype = linktype
+        self.hosts: Tuple[str, ...] = ()
+        self.program: Optional[Program] = None
+        self._base: Optional[Program] = None
+        self._sockets: List[socket.socket] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> bool:
+        return bool(self.expression or self.exclude_ports or self.hosts_source)
+
+    def _current_hosts(self) -> Tuple[str, ...]:
+        if self.hosts_source is None:
+            return ()
+        try:
+            return tuple(sorted({str(h) for h in self.hosts_source() if h}))
+        except Exception:
+            _LOG.debug("capture filter host source failed", exc_info=True)
+            return self.hosts
+
+    def build(self) -> Program:
+        """(Re)compile and validate; raises ValueError on a bad filter."""
+        if self._base is None and self.expression:
+            self._base = compile_expression(self.expression, self.linktype)
+        hosts = self._current_hosts()
+        program = exclusion_program(hosts, self.exclude_ports)
+        if self._base is not None:
+            program = chain(self._base, program)
+        validate_program(program)
+        with self._lock:
+            self.hosts = hosts
+            self.program = program
+        return program
+
+    def describe(self) -> str:
+        parts = [f"({self.expression})"] if self.expression else []
+        if self.exclude_ports:
+            parts.append(
+                "not port " + " and not port ".join(map(str, self.exclude_ports))
+            )
+        if self.hosts:
+            parts.append(f"not {len(self.hosts)} excluded host(s)/net(s)")
+        return " and ".join(parts) or "<none>"
+
+    def attach(self, sock: socket.socket) -> None:
+        """Filter `sock` now and on every later rebuild."""
+        if not self.active:
+            return
+        program = self.program if self.program is not None else self.build()
+        attach_filter(sock, program)
+        with self._lock:
+            self._sockets.append(sock)
+
+    def detach(self, sock: socket.socket) -> None:
+        with self._lock:
+            if sock in self._sockets:
+                self._sockets.remove(sock)
+
+    def refresh(self) -> bool:
+        """Rebuild and re-attach if the excluded hosts changed."""
+        if self._current_hosts() == self.hosts:
+            return False
+        program = self.build()
+        with self._lock:
+            # Forget sockets closed without detach()
+            self._sockets = [s for s in self._sockets if s.fileno() != -1]
+            sockets = list(self._sockets)
+        for sock in sockets:
+            try:
+                attach_filter(sock, program)
+            except OSError:
+                _LOG.debug("re-attaching capture filter failed", exc_info=True)
+        _LOG.info("Capture filter regenerated: %s", self.describe())
+        return True
+
+    def start(self) -> None:
+        """Poll the host source from a daemon thread (idempotent)."""
+        if self.hosts_source is None or (
+            self._thread is not None and self._thread.is_alive()
+        ):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="capture-filter"
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception:
+                _LOG.warning(
+                    "Capture filter refresh failed; keeping previous filter",
+                    exc_info=True,
+                )
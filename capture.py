@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+Capture backends that deliver undissected frames to the fast parser.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import mmap
+import select
+import socket
+import struct
+import time
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from packet_processor import DLT_EN10MB, RawFrame
+
+__all__ = ["AfPacketRing", "l2listen_frames", "pcap_frames"]
+
+# <linux/if_packet.h>
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+ETH_P_ALL = 0x0003
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+# <linux/sockios.h>, <linux/if_arp.h>
+SIOCGIFHWADDR = 0x8927
+ARPHRD_ETHER = 1
+ARPHRD_LOOPBACK = 772
+# Device types whose frames start with an Ethernet header (loopback uses a
+# zeroed one); the ring hands out frames as DLT_EN10MB
+_ETHERNET_ARPHRD = (ARPHRD_ETHER, ARPHRD_LOOPBACK)
+
+_REQ3 = struct.Struct("=7I")  # struct tpacket_req3
+_STATS_V3 = struct.Struct("=3I")  # struct tpacket_stats_v3
+# struct tpacket_block_desc: version, offset_to_priv, then tpacket_hdr_v1
+# (block_status, num_pkts, offset_to_first_pkt, ...)
+_BLOCK_HDR = struct.Struct("=5I")
+_BLOCK_STATUS = struct.Struct("=I")
+# struct tpacket3_hdr: next_offset, sec, nsec, snaplen, len, status, mac, net
+_PKT_HDR = struct.Struct("=6I2H")
+
+# pcap / pcapng magic numbers
+_PCAP_USEC = 0xA1B2C3D4
+_PCAP_NSEC = 0xA1B23C4D
+_PCAPNG_SHB = 0x0A0D0D0A
+_PCAPNG_BOM = 0x1A2B3C4D
+_READ_BUFFER = 1 << 20
+
+
+def l2listen_frames(
+    interface: str,
+    count: int = 0,
+    on_open: Optional[Callable[[socket.socket], None]] = None,
+) -> Iterator[RawFrame]:
+    """Yield raw frames from Scapy's PF_PACKET listen socket.
+
+    Uses ``recv_raw`` so Scapy never builds a Packet object; `count` = 0
+    means capture until interrupted. `on_open` receives the underlying
+    socket before the first read (e.g. to attach a BPF filter).
+    """
+    from scapy.all import conf  # type: ignore
+
+    sock = conf.L2listen(iface=interface)
+    if on_open is not None:
+        try:
+            on_open(sock.ins)
+        except Exception:
+            sock.close()
+            raise
+    seen = 0
+    try:
+        while not count or seen < count:
+            cls, data, ts = sock.recv_raw()
+            if data is None:
+                continue
+            linktype = DLT_EN10MB
+            if cls is not None:
+                linktype = conf.l2types.layer2num.get(cls, DLT_EN10MB)
+            yield RawFrame(data, float(ts or time.time()), linktype)
+            seen += 1
+    finally:
+        sock.close()
+
+
+def _hardware_type(sock: socket.socket, interface: str) -> int:
+    """ARPHRD_* device type of `interface` (SIOCGIFHWADDR)."""
+    req = struct.pack("256s", interface.encode("utf-8")[:15])
+    res = fcntl.ioctl(sock.fileno(), SIOCGIFHWADDR, req)
+    # struct ifreq: 16-byte name, then the sockaddr's sa_family
+    return struct.unpack_from("=H", res, 16)[0]
+
+
+class AfPacketRing:
+    """PACKET_MMAP receive ring using TPACKET_V3 block delivery.
+
+    The kernel fills whole blocks of frames in shared memory; we walk each
+    retired block, hand the frames out, then return the block to the kernel.
+    One poll() wakes us per block instead of one syscall per packet.
+    Requires Linux and CAP_NET_RAW. Only Ethernet-framed interfaces are
+    supported (raises ValueError otherwise, e.g. for tun/wg/ppp devices).
+    """
+
+    def __init__(
+        self,
+        interface: str,
+        *,
+        block_size: int = 1 << 20,
+        block_count: int = 64,
+        frame_size: int = 2048,
+        block_timeout_ms: int = 64,
+    ) -> None:
+        page = mmap.PAGESIZE
+        self.block_size = max(page, (int(block_size) // page) * page)
+        self.block_count = max(1, int(block_count))
+        self.interface = interface
+        self._totals = {"packets": 0, "drops": 0, "freeze_q_cnt": 0}
+        self._block = 0  # next block to read
+        self._off = 0  # offset of the next frame in the current block
+        self._remaining = 0  # frames left in the current block
+        self._spent: Optional[int] = None  # fully read block not yet released
+        self._sock = socket.socket(
+            socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL)
+        )
+        try:
+            hwtype = _hardware_type(self._sock, interface)
+            if hwtype not in _ETHERNET_ARPHRD:
+                raise ValueError(
+                    f"AF_PACKET ring needs an Ethernet interface; {interface!r} "
+                    f"has link type ARPHRD {hwtype}. Use Capture.Backend=scapy"
+                )
+            self._sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            req = _REQ3.pack(
+                self.block_size,
+                self.block_count,
+                int(frame_size),
+                (self.block_size // int(frame_size)) * self.block_count,
+                int(block_timeout_ms),
+                0,  # tp_sizeof_priv
+                0,  # tp_feature_req_word
+            )
+            self._sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+            self._map = mmap.mmap(
+                self._sock.fileno(),
+                self.block_size * self.block_count,
+                mmap.MAP_SHARED,
+                mmap.PROT_READ | mmap.PROT_WRITE,
+            )
+            self._sock.bind((interface, ETH_P_ALL))
+        except Exception:
+            self._sock.close()
+            raise
+        self._poll = select.poll()
+        self._poll.register(self._sock.fileno(), select.POLLIN | select.POLLERR)
+
+    def fileno(self) -> int:
+        return self._sock.fileno()
+
+    @property
+    def socket(self) -> socket.socket:
+        return self._sock
+
+    def frames(
+        self, count: int = 0, timeout: Optional[float] = None, copy: bool = True
+    ) -> Iterator[RawFrame]:
+        """Yield frames block by block.
+
+        `count` = 0 reads until interrupted; `timeout` bounds the total wait
+        in seconds. With ``copy=False`` each frame is a memoryview into the
+        ring that is only valid until the generator is resumed past its block.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        seen = 0
+        mm = self._map
+        view = memoryview(mm)
+        while not count or seen < count:
+            if self._spent is not None:
+                # Every frame of this block was handed out; return it to the kernel
+                _BLOCK_STATUS.pack_into(mm, self._spent + 8, TP_STATUS_KERNEL)
+                self._spent = None
+            if not self._remaining:
+                base = self._block * self.block_size
+                _, _, status, num_pkts, first = _BLOCK_HDR.unpack_from(mm, base)
+                if not status & TP_STATUS_USER:
+                    wait_ms = -1
+                    if deadline is not None:
+                        wait_ms = int(max(0.0, deadline - time.monotonic()) * 1000)
+                        if wait_ms == 0:
+                            return
+                    self._poll.poll(wait_ms)
+                    continue
+                self._off = base + first
+                self._remaining = num_pkts
+                self._block = (self._block + 1) % self.block_count
+                if not num_pkts:
+                    self._spent = base
+                    continue
+            nxt, sec, nsec, snaplen, _, _, mac, _ = _PKT_HDR.unpack_from(mm, self._off)
+            start = self._off + mac
+            data = view[start : start + snaplen]
+            frame = RawFrame(bytes(data) if copy else data, sec + nsec * 1e-9)
+            self._remaining -= 1
+            if self._remaining:
+                self._off += nxt
+            else:
+                self._spent = self._off - (self._off % self.block_size)
+            seen += 1
+            yield frame
+
+    def stats(self) -> Dict[str, int]:
+        """Cumulative kernel counters (PACKET_STATISTICS resets on each read)."""
+        raw = self._sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, _STATS_V3.size)
+        packets, drops, freeze = _STATS_V3.unpack(raw)
+        self._totals["packets"] += packets
+        self._totals["drops"] += drops
+        self._totals["freeze_q_cnt"] += freeze
+        return dict(self._totals)
+
+    def close(self) -> None:
+        try:
+            self._map.close()
+        except BufferError:
+            # Zero-copy frames still reference the ring; let GC unmap it
+            pass
+        finally:
+            self._sock.close()
+
+    def __enter__(self) -> "AfPacketRing":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def pcap_frames(
+    path: str, *, realtime: bool = False, speed: float = 1.0
+) -> Iterator[RawFrame]:
+    """Stream frames from a pcap or pcapng file one record at a time.
+
+    Only one record is buffered at a time, so captures of any size can be
+    replayed. With `realtime`, frames are paced to their capture timestamps
+    (scaled by `speed`); otherwise they are yielded as fast as possible.
+    """
+    with open(path, "rb", buffering=_READ_BUFFER) as fh:
+        head = fh.read(4)
+        if len(head) < 4:
+            return
+        frames = (
+            _pcapng_records(fh, head)
+            if struct.unpack("<I", head)[0] == _PCAPNG_SHB
+            else _pcap_records(fh, head)
+        )
+        if not realtime:
+            yield from frames
+            return
+        origin: Optional[Tuple[float, float]] = None
+        for frame in frames:
+            if origin is None:
+                origin = (frame.time, time.monotonic())
+            due = origin[1] + (frame.time - origin[0]) / max(speed, 1e-9)
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            yield frame
+
+
+def _pcap_records(fh: BinaryIO, head: bytes) -> Iterator[RawFrame]:
+    for endian in ("<", ">"):
+        (magic,) = struct.unpack(endian + "I", head)
+        if magic in (_PCAP_USEC, _PCAP_NSEC):
+            break
+    else:
+        raise ValueError("not a pcap/pcapng file")
+    scale = 1e-9 if magic == _PCAP_NSEC else 1e-6
+    rest = fh.read(20)
+    if len(rest) < 20:
+        raise ValueError("truncated pcap header")
+    linktype = struct.unpack(endian + "I", rest[16:20])[0] & 0xFFFF
+    rec = struct.Struct(endian + "4I")
+    while True:
+        hdr = fh.read(rec.size)
+        if len(hdr) < rec.size:
+            return
+        sec, frac, incl, _ = rec.unpack(hdr)
+        data = fh.read(incl)
+        if len(data) < incl:
+            return
+        yield RawFrame(data, sec + frac * scale, linktype)
+
+
+def _pcapng_records(fh: BinaryIO, head: bytes) -> Iterator[RawFrame]:
+    endian = "<"
+    # Per-section interface table: (linktype, seconds per timestamp unit)
+    interfaces: List[Tuple[int, float]] = []
+    block_type_raw = head
+    while True:
+        if len(block_type_raw) < 4:
+            return
+        lenb = fh.read(4)
+        if len(lenb) < 4:
+            return
+        if struct.unpack("<I", block_type_raw)[0] == _PCAPNG_SHB:
+            bom = fh.read(4)
+            endian = "<" if struct.unpack("<I", bom)[0] == _PCAPNG_BOM else ">"
+            total = struct.unpack(endian + "I", lenb)[0]
+            fh.read(total - 12)
+            interfaces = []
+        else:
+            btype = struct.unpack(endian + "I", block_type_raw)[0]
+            total = struct.unpack(endian + "I", lenb)[0]
+            body = fh.read(total - 8)
+            if len(body) < total - 8:
+                return
+            if btype == 1:  # Interface Description Block
+                linktype = struct.unpack_from(endian + "H", body, 0)[0]
+                interfaces.append((linktype, _pcapng_tsresol(body[8:-4], endian)))
+            elif btype == 6:  # Enhanced Packet Block
+                iface, hi, lo, caplen, _ = struct.unpack_from(endian + "5I", body, 0)
+                linktype, unit = (
+                    interfaces[iface] if iface < len(interfaces) else (1, 1e-6)
+                )
+                yield RawFrame(
+                    body[20 : 20 + caplen], ((hi << 32) | lo) * unit, linktype
+                )
+            elif btype == 3:  # Simple Packet Block (no timestamp)
+                (origlen,) = struct.unpack_from(endian + "I", body, 0)
+                linktype = interfaces[0][0] if interfaces else 1
+                yield RawFrame(body[4 : 4 + min(origlen, len(body) - 8)], 0.0, linktype)
+        block_type_raw = fh.read(4)
+
+
+def _pcapng_tsresol(options: bytes, endian: str) -> float:
+    """Seconds per timestamp unit from an IDB's if_tsresol option (default µs)."""
+    off = 0
+    while off + 4 <= len(options):
+        code, length = struct.unpack_from(endian + "2H", options, off)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            v = options[off + 4]
+            return 2.0 ** -(v & 0x7F) if v & 0x80 else 10.0**-v
+        off += 4 + ((length + 3) & ~3)
+    return 1e-6
@@ -3,6 +3,12 @@ from __future__ import annotations
 import configparser
 
 _VALID_LEVELS = {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}
+_VALID_PARSERS = {"fast", "scapy"}
+_VALID_BACKENDS = {"scapy", "afpacket"}
+_VALID_GRANULARITIES = {"packet", "flow"}
+_VALID_SCAN_COUNTERS = {"exact", "sketch"}
+_VALID_QUEUE_POLICIES = {"drop-newest", "drop-oldest", "sample"}
+_VALID_ENGINES = {"iforest", "hst"}
 
 
 def validate_config(cfg: configparser.ConfigParser) -> None:
@@ -24,6 +30,119 @@ def validate_config(cfg: configparser.ConfigParser) -> None:
     if nest < 10:
         errs.append("IsolationForest.NEstimators must be >= 10")
 
+    engine = cfg.get("Detector", "Engine", fallback="iforest").strip().lower()
+    if engine not in _VALID_ENGINES:
+        errs.append(f"Detector.Engine must be one of {sorted(_VALID_ENGINES)}")
+    if cfg.getint("Detector", "HSTTrees", fallback=25) < 1:
+        errs.append("Detector.HSTTrees must be >= 1")
+    if not 1 <= cfg.getint("Detector", "HSTDepth", fallback=10) <= 16:
+        errs.append("Detector.HSTDepth must be between 1 and 16")
+    if cfg.getint("Detector", "HSTWindowSize", fallback=250) < 10:
+        errs.append("Detector.HSTWindowSize must be >= 10")
+
+    if cfg.getint("Training", "NJobs", fallback=-1) == 0:
+        errs.append("Training.NJobs must not be 0 (-1 = all cores)")
+
+    horizon = cfg.getfloat("Features", "ScanHorizonSeconds", fallback=15.0)
+    if horizon <= 0:
+        errs.append("Features.ScanHorizonSeconds must be > 0")
+
+    scan_counter = cfg.get("Features", "ScanCounter", fallback="exact").strip().lower()
+    if scan_counter not in _VALID_SCAN_COUNTERS:
+        errs.append(
+            f"Features.ScanCounter must be one of {sorted(_VALID_SCAN_COUNTERS)}"
+        )
+    if cfg.getfloat("Features", "ScanSketchMemoryMB", fallback=16.0) <= 0:
+        errs.append("Features.ScanSketchMemoryMB must be > 0")
+    if cfg.getfloat("Features", "WindowSeconds", fallback=0.0) < 0:
+        errs.append("Features.WindowSeconds must be >= 0 (0 = DefaultWindowSize rows)")
+    if cfg.getfloat("Features", "WindowMaxMB", fallback=0.0) < 0:
+        errs.append("Features.WindowMaxMB must be >= 0 (0 = unbounded)")
+
+    precision = cfg.getint("Features", "ScanSketchPrecision", fallback=7)
+    if not 4 <= precision <= 16:
+        errs.append("Features.ScanSketchPrecision must be between 4 and 16")
+
+    batch = cfg.getint("Monitoring", "BatchSize", fallback=1)
+    if batch < 1:
+        errs.append("Monitoring.BatchSize must be >= 1")
+
+    latency = cfg.getfloat("Monitoring", "BatchMaxLatencyMs", fallback=50.0)
+    if latency <= 0:
+        errs.append("Monitoring.BatchMaxLatencyMs must be > 0")
+
+    if cfg.getfloat("Monitoring", "HostRefreshSeconds", fallback=30.0) <= 0:
+        errs.append("Monitoring.HostRefreshSeconds must be > 0")
+    if cfg.getfloat("Monitoring", "SamplingTargetLagSeconds", fallback=0.0) < 0:
+        errs.append("Monitoring.SamplingTargetLagSeconds must be >= 0 (0 disables)")
+    min_rate = cfg.getfloat("Monitoring", "SamplingMinRate", fallback=0.05)
+    if not 0 < min_rate <= 1:
+        errs.append("Monitoring.SamplingMinRate must be in (0, 1]")
+
+    if cfg.getfloat("Monitoring", "ModelWatchSeconds", fallback=2.0) < 0:
+        errs.append("Monitoring.ModelWatchSeconds must be >= 0 (0 disables hot reload)")
+    if cfg.getint("Monitoring", "ScoreCacheSize", fallback=0) < 0:
+        errs.append("Monitoring.ScoreCacheSize must be >= 0 (0 disables the cache)")
+    if not 0 <= cfg.getint("Monitoring", "ScoreCacheDecimals", fallback=4) <= 15:
+        errs.append("Monitoring.ScoreCacheDecimals must be between 0 and 15")
+
+    granularity = cfg.get("Monitoring", "ScoringGranularity", fallback="packet")
+    if granularity.strip().lower() not in _VALID_GRANULARITIES:
+        errs.append(
+            f"Monitoring.ScoringGranularity must be one of {sorted(_VALID_GRANULARITIES)}"
+        )
+
+    for key in ("IdleTimeoutSeconds", "ActiveTimeoutSeconds"):
+        if cfg.getfloat("Flows", key, fallback=1.0) <= 0:
+            errs.append(f"Flows.{key} must be > 0")
+    if cfg.getint("Flows", "MaxFlows", fallback=65536) < 1:
+        errs.append("Flows.MaxFlows must be >= 1")
+
+    if cfg.getint("Sharding", "Workers", fallback=0) < 0:
+        errs.append("Sharding.Workers must be >= 0")
+    for key in ("BatchSize", "QueueBatches"):
+        if cfg.getint("Sharding", key, fallback=1) < 1:
+            errs.append(f"Sharding.{key} must be >= 1")
+    cpu_list = cfg.get("Sharding", "CpuList", fallback="").strip()
+    if cpu_list and not all(
+        p.strip().replace("-", "", 1).isdigit()
+        for p in cpu_list.split(",")
+        if p.strip()
+    ):
+        errs.append("Sharding.CpuList must look like '2,4-7'")
+
+    parser = cfg.get("Capture", "Parser", fallback="fast").strip().lower()
+    if parser not in _VALID_PARSERS:
+        errs.append(f"Capture.Parser must be one of {sorted(_VALID_PARSERS)}")
+
+    backend = cfg.get("Capture", "Backend", fallback="scapy").strip().lower()
+    if backend not in _VALID_BACKENDS:
+        errs.append(f"Capture.Backend must be one of {sorted(_VALID_BACKENDS)}")
+
+    for key, minimum in (("RingBlockSizeKB", 4), ("RingBlocks", 1)):
+        if cfg.getint("Capture", key, fallback=minimum) < minimum:
+            errs.append(f"Capture.{key} must be >= {minimum}")
+
+    if cfg.getint("Capture", "QueueSize", fallback=0) < 0:
+        errs.append(
+            "Capture.QueueSize must be >= 0 (0 = analyse in the capture thread)"
+        )
+    policy = cfg.get("Capture", "QueuePolicy", fallback="drop-newest").strip().lower()
+    if policy not in _VALID_QUEUE_POLICIES:
+        errs.append(
+            f"Capture.QueuePolicy must be one of {sorted(_VALID_QUEUE_POLICIES)}"
+        )
+
+    for part in cfg.get("Capture", "ExcludePorts", fallback="").split(","):
+        part = part.strip()
+        if part and not (part.isdigit() and int(part) <= 65535):
+            errs.append(
+                "Capture.ExcludePorts must be a comma-separated list of ports (0-65535)"
+            )
+            break
+    if cfg.getfloat("Capture", "FilterRefreshSeconds", fallback=30.0) <= 0:
+        errs.append("Capture.FilterRefreshSeconds must be > 0")
+
     lvl = cfg.get("Logging", "LogLevel", fallback="INFO").upper()
     if lvl not in _VALID_LEVELS:
         errs.append(f"Logging.LogLevel must be one of {sorted(_VALID_LEVELS)}")
@@ -38,5 +157,20 @@ def validate_config(cfg: configparser.ConfigParser) -> None:
     except Exception:
         errs.append("Monitoring.AlertThresholds must be two floats like '-0.10, -0.05'")
 
+    pct = cfg.get("Monitoring", "AlertPercentiles", fallback="").strip()
+    if pct:
+        try:
+            hi, med = [float(p.strip()) for p in pct.split(",")[:2]]
+            if not (0 < hi < med < 100):
+                errs.append(
+                    "Monitoring.AlertPercentiles must be 'high,medium' with 0 < high < medium < 100"
+                )
+        except Exception:
+            errs.append(
+                "Monitoring.AlertPercentiles must be empty or two percentages like '0.5, 2'"
+            )
+    if cfg.getint("Monitoring", "AlertPercentileWindow", fallback=100000) < 1:
+        errs.append("Monitoring.AlertPercentileWindow must be >= 1")
+
     if errs:
         raise ValueError("Invalid config:\n - " + "\n - ".join(errs))
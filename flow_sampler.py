@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Flow-consistent adaptive sampling for model scoring under overload.
+
+Every packet is still featurized and checked by signatures; only the model
+call is sampled. A flow is kept when the hash of its (direction-independent)
+5-tuple falls under ``rate``, so a flow is scored in full or not at all, and
+lowering the rate only ever removes flows from the kept set.
+
+The rate follows the processing lag: how far packet timestamps trail the
+wall clock, relative to the smallest offset seen (so clock skew and replayed
+captures are measured from their own baseline).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Optional
+
+__all__ = ["FlowSampler", "flow_hash"]
+
+_M64 = (1 << 64) - 1
+_SCALE = float(1 << 64)
+
+
+def flow_hash(src: int, dst: int, protocol: int, sport: int, dport: int) -> int:
+    """64-bit hash of a flow, identical for both directions and all processes."""
+    a = (src, sport)
+    b = (dst, dport)
+    if b < a:
+        a, b = b, a
+    # Integer tuple hashes are not salted per process, so shards agree
+    x = hash((a, b, protocol)) & _M64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _M64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _M64
+    return x ^ (x >> 31)
+
+
+class FlowSampler:
+    """Keep/skip decisions per flow with a lag-driven sampling rate.
+
+    The rate is halved when the lag exceeds `target_lag` and is not already
+    shrinking, and grows by a quarter once the lag is below half the target,
+    at most once per `adjust_interval` seconds. `target_lag <= 0` disables
+    sampling (the rate stays 1.0).
+    """
+
+    def __init__(
+        self,
+        target_lag: float = 0.0,
+        *,
+        min_rate: float = 0.05,
+        adjust_interval: float = 1.0,
+    ) -> None:
+        self.target_lag = float(target_lag)
+        self.min_rate = min(max(float(min_rate), 1e-6), 1.0)
+        self.adjust_interval = float(adjust_interval)
+        self.enabled = self.target_lag > 0
+        self.rate = 1.0
+        self._threshold = _M64 + 1
+        self.lag = 0.0
+        self._prev_lag = 0.0
+        self._base: Optional[float] = None
+        self._next_adjust = 0.0
+        self.kept = 0
+        self.skipped = 0
+        self.adjustments = 0
+        self._lock = threading.Lock()
+
+    @property
+    def sampling(self) -> bool:
+        return self.rate < 1.0
+
+    def _set_rate(self, rate: float) -> None:
+        self.rate = rate
+        self._threshold = int(rate * _SCALE)
+        self.adjustments += 1
+
+    def keep(self, src: int, dst: int, protocol: int, sport: int, dport: int) -> bool:
+        """True when the flow of this packet should be scored by the model."""
+        if self.rate >= 1.0:
+            self.kept += 1
+            return True
+        if flow_hash(src, dst, protocol, sport, dport) < self._threshold:
+            self.kept += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def keep_row(self, row: Dict) -> bool:
+        return self.keep(
+            row["src_ip"], row["dest_ip"], row["protocol"], row["sport"], row["dport"]
+        )
+
+    def observe(self, ts: float, now: Optional[float] = None) -> bool:
+        """Record the lag of a packet stamped `ts`; True when the rate changed."""
+        if not self.enabled:
+            return False
+        if now is None:
+            now = time.time()
+        offset = now - ts
+        base = self._base
+        if base is None or offset < base:
+            self._base = base = offset
+        self.lag = offset - base
+        if now < self._next_adjust:
+            return False
+        with self._lock:
+            if now < self._next_adjust:
+                return False
+            self._next_adjust = now + self.adjust_interval
+            return self._adjust()
+
+    def _adjust(self) -> bool:
+        lag, prev = self.lag, self._prev_lag
+        self._prev_lag = lag
+        rate = self.rate
+        if lag > self.target_lag:
+            # A draining backlog needs time, not fewer flows
+            if lag >= prev and rate > self.min_rate:
+                self._set_rate(max(self.min_rate, rate * 0.5))
+                return True
+        elif lag < 0.5 * self.target_lag and rate < 1.0:
+            self._set_rate(min(1.0, rate * 1.25))
+            return True
+        return False
+
+    def reset(self) -> None:
+        """Back to full rate with a fresh lag baseline (e.g. a new capture)."""
+        with self._lock:
+            if self.rate < 1.0:
+                self._set_rate(1.0)
+            self._base = None
+            self.lag = self._prev_lag = 0.0
+            self._next_adjust = 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "enabled": self.enabled,
+            "rate": self.rate,
+            "lag_seconds": self.lag,
+            "target_lag_seconds": self.target_lag,
+            "min_rate": self.min_rate,
+            "kept": self.kept,
+            "skipped": self.skipped,
+            "adjustments": self.adjustments,
+        }
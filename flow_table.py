@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Bidirectional flow tracking for flow-level anomaly scoring.
+"""
+
+from __future__ import annotations
+
+import math
+from collections import OrderedDict
+from typing import AbstractSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+__all__ = ["FlowRecord", "FlowTable", "FLOW_FEATURES", "flow_features"]
+
+FLOW_FEATURES = [
+    "protocol",
+    "dport",
+    "duration",
+    "packets_log",
+    "bytes_log",
+    "mean_packet_size",
+    "iat_mean",
+    "iat_std",
+    "fwd_packet_ratio",
+    "direction",
+]
+
+# (protocol, low ip, low port, high ip, high port): both directions share it
+FlowKey = Tuple[int, int, int, int, int]
+
+
+class FlowRecord:
+    """Aggregated counters for one flow, oriented by its first packet.
+
+    ``src``/``sport`` is the initiator, ``dst``/``dport`` the responder.
+    Inter-arrival statistics use Welford's running mean/variance.
+    """
+
+    __slots__ = (
+        "protocol",
+        "src",
+        "dst",
+        "sport",
+        "dport",
+        "first_ts",
+        "last_ts",
+        "packets",
+        "bytes",
+        "fwd_packets",
+        "fwd_bytes",
+        "iat_mean",
+        "iat_m2",
+        "iat_max",
+        "reason",
+    )
+
+    def __init__(
+        self, ts: float, src: int, dst: int, protocol: int, sport: int, dport: int
+    ) -> None:
+        self.protocol = protocol
+        self.src = src
+        self.dst = dst
+        self.sport = sport
+        self.dport = dport
+        self.first_ts = ts
+        self.last_ts = ts
+        self.packets = 0
+        self.bytes = 0
+        self.fwd_packets = 0
+        self.fwd_bytes = 0
+        self.iat_mean = 0.0
+        self.iat_m2 = 0.0
+        self.iat_max = 0.0
+        self.reason = ""
+
+    def add(self, ts: float, size: int, forward: bool) -> None:
+        if self.packets:
+            iat = max(0.0, ts - self.last_ts)
+            n = self.packets  # number of gaps after this one
+            delta = iat - self.iat_mean
+            self.iat_mean += delta / n
+            self.iat_m2 += delta * (iat - self.iat_mean)
+            if iat > self.iat_max:
+                self.iat_max = iat
+        if ts > self.last_ts:
+            self.last_ts = ts
+        self.packets += 1
+        self.bytes += size
+        if forward:
+            self.fwd_packets += 1
+            self.fwd_bytes += size
+
+    @property
+    def duration(self) -> float:
+        return self.last_ts - self.first_ts
+
+    @property
+    def iat_std(self) -> float:
+        gaps = self.packets - 1
+        return math.sqrt(self.iat_m2 / gaps) if gaps > 1 else 0.0
+
+    def features(self, local_ips: AbstractSet[int]) -> List[float]:
+        """Feature values in `FLOW_FEATURES` order."""
+        packets = max(self.packets, 1)
+        return [
+            float(self.protocol),
+            float(self.dport),
+            float(self.duration),
+            math.log1p(self.packets),
+            math.log1p(self.bytes),
+            self.bytes / packets,
+            self.iat_mean,
+            self.iat_std,
+            self.fwd_packets / packets,
+            float(self.src in local_ips),
+        ]
+
+    def __repr__(self) -> str:
+        return (
+            f"FlowRecord(proto={self.protocol} {self.src}:{self.sport} -> "
+            f"{self.dst}:{self.dport} packets={self.packets} bytes={self.bytes} "
+            f"reason={self.reason!r})"
+        )
+
+
+class FlowTable:
+    """5-tuple flow table with idle/active timeouts and LRU eviction.
+
+    Both directions of a conversation map to the same entry. :meth:`update`
+    returns the flows that finished as a side effect of that packet:
+
+    - ``idle``: no packet for `idle_timeout` seconds;
+    - ``active``: the flow has lasted `active_timeout` seconds; it is
+      exported and a fresh record continues counting (NetFlow style);
+    - ``evicted``: the table is full and this was the least recently used.
+
+    Time comes from packet timestamps, so replayed captures behave like
+    live traffic. Memory is bounded by `max_flows`.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = 30.0,
+        active_timeout: float = 300.0,
+        max_flows: int = 65536,
+    ) -> None:
+        self.idle_timeout = float(idle_timeout)
+        self.active_timeout = float(active_timeout)
+        self.max_flows = max(1, int(max_flows))
+        # Least recently updated first
+        self._flows: "OrderedDict[FlowKey, FlowRecord]" = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._flows)
+
+    @staticmethod
+    def _key(src: int, dst: int, protocol: int, sport: int, dport: int) -> FlowKey:
+        if (src, sport) <= (dst, dport):
+            return (protocol, src, sport, dst, dport)
+        return (protocol, dst, dport, src, sport)
+
+    def update(
+        self,
+        ts: float,
+        src: int,
+        dst: int,
+        protocol: int,
+        size: int,
+        sport: int = 0,
+        dport: int = 0,
+    ) -> List[FlowRecord]:
+        """Account one packet; return flows exported along the way."""
+        done = self.expire(ts)
+        key = self._key(src, dst, protocol, sport, dport)
+        flows = self._flows
+        rec = flows.get(key)
+        if rec is not None and ts - rec.first_ts >= self.active_timeout:
+            del flows[key]
+            rec.reason = "active"
+            done.append(rec)
+            # Keep the original orientation for the continuation record
+            rec = FlowRecord(ts, rec.src, rec.dst, protocol, rec.sport, rec.dport)
+            flows[key] = rec
+        elif rec is None:
+            if len(flows) >= self.max_flows:
+                _, old = flows.popitem(last=False)
+                old.reason = "evicted"
+                self.evictions += 1
+                done.append(old)
+            rec = FlowRecord(ts, src, dst, protocol, sport, dport)
+            flows[key] = rec
+        else:
+            flows.move_to_end(key)
+        rec.add(ts, size, src == rec.src and sport == rec.sport)
+        return done
+
+    def expire(self, now: float) -> List[FlowRecord]:
+        """Export flows idle since before ``now - idle_timeout``."""
+        done: List[FlowRecord] = []
+        cutoff = now - self.idle_timeout
+        flows = self._flows
+        while flows:
+            key = next(iter(flows))
+            rec = flows[key]
+            if rec.last_ts >= cutoff:
+                break
+            del flows[key]
+            rec.reason = "idle"
+            done.append(rec)
+        return done
+
+    def flush(self) -> List[FlowRecord]:
+        """Export every remaining flow (e.g. at shutdown)."""
+        done = list(self._flows.values())
+        for rec in done:
+            rec.reason = "flush"
+        self._flows.clear()
+        return done
+
+    def get(
+        self, src: int, dst: int, protocol: int, sport: int = 0, dport: int = 0
+    ) -> Optional[FlowRecord]:
+        return self._flows.get(self._key(src, dst, protocol, sport, dport))
+
+
+def flow_features(
+    records: Iterable[FlowRecord], local_ips: AbstractSet[int]
+) -> pd.DataFrame:
+    """Model input for a group of flow records, in `FLOW_FEATURES` order."""
+    rows = [rec.features(local_ips) for rec in records]
+    return pd.DataFrame(
+        np.asarray(rows, dtype=float).reshape(len(rows), len(FLOW_FEATURES)),
+        columns=FLOW_FEATURES,
+    )
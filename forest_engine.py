@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Flat-array inference for a trained IsolationForest and its StandardScaler.
+
+sklearn's ``decision_function`` validates its input and walks each tree from
+Python, a fixed cost that dominates one-row calls. :class:`CompiledForest`
+packs every tree into shared NumPy arrays (split feature, threshold, child
+pair, leaf path length) and walks all trees of a batch together, one level
+per step.
+
+The scaler is folded into the split thresholds. sklearn compares the scaled
+value, cast to float32, against each threshold; the folded threshold is the
+largest raw float64 value that comparison still sends left, so every split
+decision (and therefore every score) matches sklearn.
+"""
+
+from __future__ import annotations
+
+import numbers
+from typing import Any, Dict
+
+import numpy as np
+
+__all__ = ["CompiledForest", "average_path_length"]
+
+_SIGN = np.int64(np.iinfo(np.int64).min)
+_MAGNITUDE = np.int64(np.iinfo(np.int64).max)
+# Rows x trees per traversal block: keeps the index arrays in cache
+_BLOCK_CELLS = 1 << 15
+# Node indices: forests are far below 2**31 nodes, and narrower gathers
+# are measurably faster
+_INDEX = np.int32
+
+
+def average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """Expected isolation depth of an unsuccessful BST search over n samples
+    (the same formula sklearn uses for leaves holding several samples)."""
+    n = np.asarray(n_samples, dtype=float)
+    out = np.zeros(n.shape, dtype=float)
+    mask_2 = n == 2
+    rest = n > 2
+    out[mask_2] = 1.0
+    out[rest] = (
+        2.0 * (np.log(n[rest] - 1.0) + np.euler_gamma) - 2.0 * (n[rest] - 1.0) / n[rest]
+    )
+    return out
+
+
+def _to_ordered(x: np.ndarray) -> np.ndarray:
+    """float64 -> int64 keys with the same ordering (-0.0 and 0.0 tie)."""
+    bits = x.view(np.int64)
+    return np.where(bits < 0, -(bits & _MAGNITUDE), bits)
+
+
+def _from_ordered(keys: np.ndarray) -> np.ndarray:
+    bits = np.where(keys < 0, (-keys) | _SIGN, keys)
+    return bits.view(np.float64)
+
+
+def _fold_thresholds(
+    threshold: np.ndarray, mean: np.ndarray, scale: np.ndarray
+) -> np.ndarray:
+    """Largest raw x with ``float32((x - mean) / scale) <= threshold``, per split.
+
+    The predicate is monotone in x, so a bisection over the ordered float64
+    bit patterns finds the exact cutoff in 64 vectorized steps.
+    """
+
+    def goes_left(x: np.ndarray) -> np.ndarray:
+        with np.errstate(over="ignore", invalid="ignore"):
+            return ((x - mean) / scale).astype(np.float32) <= threshold
+
+    big = np.finfo(np.float64).max
+    lo = np.full(threshold.shape, _to_ordered(np.array([-big]))[0], dtype=np.int64)
+    hi = np.full(threshold.shape, _to_ordered(np.array([big]))[0], dtype=np.int64)
+    all_left = goes_left(_from_ordered(hi))
+    none_left = ~goes_left(_from_ordered(lo))
+    for _ in range(64):
+        mid = (lo >> 1) + (hi >> 1) + (lo & hi & 1)
+        left = goes_left(_from_ordered(mid))
+        lo = np.where(left, mid, lo)
+        hi = np.where(left, hi, mid)
+    out = _from_ordered(lo)
+    out[all_left] = np.inf
+    out[none_left] = -np.inf
+    return out
+
+
+def _max_features(model: Any, n_features: int) -> int:
+    value = model.max_features
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    return max(1, int(value * n_features))
+
+
+class CompiledForest:
+    """IsolationForest scoring over packed node arrays.
+
+    Node arrays are shared by all trees (``roots[t]`` is tree t's first
+    node). Leaves point back at themselves with an infinite threshold, so a
+    fixed number of steps (the deepest tree) reaches every leaf without
+    masking. :meth:`decision_function` takes raw, unscaled features in the
+    detector's feature order.
+    """
+
+    ARRAYS = ("feature", "threshold", "children", "leaf_value", "roots")
+
+    def __init__(
+        self,
+        *,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        children: np.ndarray,
+        leaf_value: np.ndarray,
+        roots: np.ndarray,
+        n_features: int,
+        depth: int,
+        denominator: float,
+        offset: float,
+    ) -> None:
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.n_features = int(n_features)
+        self.depth = int(depth)
+        self.denominator = float(denominator)
+        self.offset = float(offset)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+
+    @classmethod
+    def from_detector(cls, detector: Any) -> "CompiledForest":
+        if detector.model is None or detector.scaler is None:
+            raise RuntimeError("Model not trained or loaded.")
+        return cls.from_model(detector.model, detector.scaler)
+
+    @classmethod
+    def from_model(cls, model: Any, scaler: Any = None) -> "CompiledForest":
+        """Compile a fitted ``IsolationForest`` (fed scaled input by `scaler`)."""
+        n_features = int(model.n_features_in_)
+        # sklearn only maps through estimators_features_ when it subsamples
+        subsample = _max_features(model, n_features) != n_features
+        mean = getattr(scaler, "mean_", None)
+        scale = getattr(scaler, "scale_", None)
+        mean = np.zeros(n_features) if mean is None else np.asarray(mean, dtype=float)
+        scale = np.ones(n_features) if scale is None else np.asarray(scale, dtype=float)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        depth = 0
+        base = 0
+        for est, est_features in zip(
+            model.estimators_, model.estimators_features_, strict=True
+        ):
+            tree = est.tree_
+            n = tree.node_count
+            left = tree.children_left.astype(_INDEX)
+            right = tree.children_right.astype(_INDEX)
+            leaf = left == -1
+            node_depth = np.zeros(n, dtype=np.intp)
+            # Children always follow their parent in sklearn's node order
+            for i in np.flatnonzero(~leaf):
+                node_depth[left[i]] = node_depth[right[i]] = node_depth[i] + 1
+            depth = max(depth, int(node_depth.max()))
+
+            feat = np.where(leaf, 0, tree.feature).astype(_INDEX)
+            if subsample:
+                mapped = np.asarray(est_features, dtype=_INDEX)[feat]
+                feat = np.where(leaf, 0, mapped).astype(_INDEX)
+            own = np.arange(n, dtype=_INDEX)
+            # Path length: nodes on the path, plus the expected depth of the
+            # samples left in the leaf, minus one (sklearn's definition)
+            value = np.where(
+                leaf,
+                (node_depth + 1.0) + average_path_length(tree.n_node_samples) - 1.0,
+                0.0,
+            )
+            features.append(feat)
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            lefts.append(np.where(leaf, own, left) + base)
+            rights.append(np.where(leaf, own, right) + base)
+            values.append(value)
+            roots.append(base)
+            base += n
+
+        feature = np.concatenate(features)
+        threshold = np.concatenate(thresholds)
+        inner = np.isfinite(threshold)
+        threshold[inner] = _fold_thresholds(
+            threshold[inner], mean[feature[inner]], scale[feature[inner]]
+        )
+        children = np.empty((base, 2), dtype=_INDEX)
+        children[:, 0] = np.concatenate(lefts)
+        children[:, 1] = np.concatenate(rights)
+        max_samples = getattr(model, "max_samples_", None) or model._max_samples
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            children=children,
+            leaf_value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=_INDEX),
+            n_features=n_features,
+            depth=depth,
+            denominator=len(model.estimators_)
+            * float(average_path_length(np.array([max_samples]))[0]),
+            offset=float(model.offset_),
+        )
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    def params(self) -> Dict[str, Any]:
+        return {
+            "n_features": self.n_features,
+            "depth": self.depth,
+            "denominator": self.denominator,
+            "offset": self.offset,
+        }
+
+    def path_lengths(self, X: np.ndarray) -> np.ndarray:
+        """Sum over trees of the path length of each row of `X`."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(
+                f"Expected {self.n_features} feature columns, got {X.shape[1]}"
+            )
+        n, d = X.shape
+        out = np.empty(n, dtype=float)
+        flat_x = X.ravel()
+        children = self.children.ravel()
+        block = max(1, _BLOCK_CELLS // max(self.n_trees, 1))
+        offsets = (np.arange(block, dtype=_INDEX) * d)[:, None]
+        for start in range(0, n, block):
+            stop = min(n, start + block)
+            rows = flat_x[start * d : stop * d]
+            row_offsets = offsets[: stop - start]
+            idx = np.broadcast_to(self.roots, (stop - start, self.n_trees)).copy()
+            for _ in range(self.depth):
+                x = rows.take(row_offsets + self.feature.take(idx))
+                right = x > self.threshold.take(idx)
+                idx = children.take(2 * idx + right)
+            out[start:stop] = self.leaf_value.take(idx).sum(axis=1)
+        return out
+
+    def score_samples(self, X: np.ndarray) -> np.ndarray:
+        """Same as ``IsolationForest.score_samples`` on the scaled `X`."""
+        depths = self.path_lengths(X)
+        if self.denominator == 0:
+            return -np.ones_like(depths)
+        return -(2.0 ** (-depths / self.denominator))
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        """Same as ``IsolationForest.decision_function``: < 0 is an outlier."""
+        return self.score_samples(X) - self.offset
+
+    @classmethod
+    def from_arrays(
+        cls, arrays: Dict[str, np.ndarray], params: Dict[str, Any]
+    ) -> "CompiledForest":
+        return cls(
+            feature=arrays["feature"],
+            threshold=arrays["threshold"],
+            children=arrays["children"],
+            leaf_value=arrays["leaf_value"],
+            roots=arrays["roots"],
+            n_features=int(params["n_features"]),
+            depth=int(params["depth"]),
+            denominator=float(params["denominator"]),
+            offset=float(params["offset"]),
+        )
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of this host's own IPv4/IPv6 addresses.
+
+One snapshot, owned by the monitor, answers "is this address local?" for the
+packet processor (direction feature) and the monitor (alert direction,
+auto-block guard). Lookups are a frozenset membership test on
+:mod:`ip_codec` integers; the snapshot is rebuilt on netlink address events
+(Linux) or every `refresh_interval` seconds otherwise.
+"""
+
+from __future__ import annotations
+
+import logging
+import select
+import socket
+import threading
+import time
+from typing import Callable, FrozenSet, Iterable, List, Optional, Set, Union
+
+from ip_codec import as_ip_int, int_to_ip, ip_to_int
+
+try:
+    import netifaces  # type: ignore
+except Exception:  # pragma: no cover
+    netifaces = None
+
+__all__ = ["HostRegistry", "gather_local_addresses"]
+
+_LOG = logging.getLogger("ids.hosts")
+
+# <linux/rtnetlink.h>
+_NETLINK_ROUTE = 0
+_RTMGRP_LINK = 0x1
+_RTMGRP_IPV4_IFADDR = 0x10
+_RTMGRP_IPV6_IFADDR = 0x100
+# Address changes arrive in bursts (DHCP renew, interface up); coalesce them
+_EVENT_DEBOUNCE = 0.2
+
+
+def gather_local_addresses() -> FrozenSet[int]:
+    """Enumerate interface addresses (IPv4 and IPv6) as ip_codec integers."""
+    values: Set[int] = set()
+    if netifaces is None:
+        return frozenset(values)
+    families = [netifaces.AF_INET]
+    if hasattr(netifaces, "AF_INET6"):
+        families.append(netifaces.AF_INET6)
+    try:
+        for iface in netifaces.interfaces():
+            addrs = netifaces.ifaddresses(iface)
+            for family in families:
+                for a in addrs.get(family, []):
+                    # Link-local IPv6 comes back as "fe80::1%eth0"
+                    ip = str(a.get("addr") or "").split("%", 1)[0]
+                    if not ip:
+                        continue
+                    try:
+                        values.add(ip_to_int(ip))
+                    except ValueError:
+                        continue
+    except Exception:
+        _LOG.debug("interface enumeration failed", exc_info=True)
+    return frozenset(values)
+
+
+class HostRegistry:
+    """Refreshable snapshot of local addresses with O(1) integer lookups.
+
+    Readers never lock: each refresh swaps in a new frozenset. Pass
+    `addresses` for a fixed set (no enumeration, no refresh).
+    """
+
+    def __init__(
+        self,
+        refresh_interval: float = 30.0,
+        *,
+        use_netlink: bool = True,
+        addresses: Optional[Iterable[Union[int, str]]] = None,
+    ) -> None:
+        self.refresh_interval = float(refresh_interval)
+        self.use_netlink = bool(use_netlink)
+        self.static = addresses is not None
+        self._listeners: List[Callable[[FrozenSet[int]], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.refreshed_at = 0.0
+        self.refreshes = 0
+        self._set(
+            frozenset(self._coerce(addresses))
+            if addresses is not None
+            else gather_local_addresses()
+        )
+
+    @classmethod
+    def fixed(cls, addresses: Iterable[Union[int, str]]) -> "HostRegistry":
+        return cls(addresses=addresses)
+
+    @staticmethod
+    def _coerce(addresses: Iterable[Union[int, str]]) -> List[int]:
+        values = []
+        for ip in addresses:
+            try:
+                values.append(as_ip_int(ip))
+            except ValueError:
+                continue
+        return values
+
+    def _set(self, values: FrozenSet[int]) -> None:
+        self.addresses = values
+        self.texts = frozenset(int_to_ip(v) for v in values)
+        self.refreshed_at = time.time()
+
+    def is_local(self, ip: Union[int, str]) -> bool:
+        if isinstance(ip, int):
+            return ip in self.addresses
+        try:
+            return as_ip_int(ip) in self.addresses
+        except ValueError:
+            return False
+
+    def __contains__(self, ip: Union[int, str]) -> bool:
+        return self.is_local(ip)
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def add_listener(self, callback: Callable[[FrozenSet[int]], None]) -> None:
+        """Call `callback(addresses)` after every refresh that changes them."""
+        self._listeners.append(callback)
+
+    def refresh(self) -> bool:
+        """Re-enumerate interfaces; returns True when the set changed."""
+        if self.static:
+            return False
+        values = gather_local_addresses()
+        with self._lock:
+            self.refreshes += 1
+            if values == self.addresses:
+                self.refreshed_at = time.time()
+                return False
+            added = len(values - self.addresses)
+            removed = len(self.addresses - values)
+            self._set(values)
+        _LOG.info(
+            "Local addresses changed (+%d/-%d): %s", added, removed, sorted(self.texts)
+        )
+        for callback in list(self._listeners):
+            try:
+                callback(values)
+            except Exception:
+                _LOG.debug("host registry listener failed", exc_info=True)
+        return True
+
+    # ---- background refresh -------------------------------------------------
+
+    def start(self) -> None:
+        """Keep the snapshot current from a daemon thread (idempotent)."""
+        if self.static or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="host-registry"
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def _open_netlink(self) -> Optional[socket.socket]:
+        if not self.use_netlink or not hasattr(socket, "AF_NETLINK"):
+            return None
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, _NETLINK_ROUTE)
+            sock.bind((0, _RTMGRP_LINK | _RTMGRP_IPV4_IFADDR | _RTMGRP_IPV6_IFADDR))
+            sock.setblocking(False)
+            return sock
+        except OSError:
+            _LOG.debug(
+                "netlink unavailable; polling every %.0fs", self.refresh_interval
+            )
+            return None
+
+    def _run(self) -> None:
+        sock = self._open_netlink()
+        try:
+            while not self._stop.is_set():
+                if sock is None:
+                    if self._stop.wait(self.refresh_interval):
+                        return
+                else:
+                    ready, _, _ = select.select([sock], [], [], self.refresh_interval)
+                    if ready:
+                        self._drain(sock)
+                        # Let the rest of a burst land, then read it all
+                        if self._stop.wait(_EVENT_DEBOUNCE):
+                            return
+                        self._drain(sock)
+                try:
+                    self.refresh()
+                except Exception:
+                    _LOG.debug("host registry refresh failed", exc_info=True)
+        finally:
+            if sock is not None:
+                sock.close()
+
+    @staticmethod
+    def _drain(sock: socket.socket) -> None:
+        try:
+            while sock.recv(65536):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            # ENOBUFS: events were dropped; the refresh re-enumerates anyway
+            pass
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming Half-Space Trees anomaly detector (Tan, Ting & Liu, 2011).
+
+Each tree halves a randomly perturbed copy of the feature workspace at every
+level, on a random feature. A sample is scored by the mass the *reference*
+window left in the cells it falls into; the *latest* window counts masses as
+samples stream past and replaces the reference every ``window_size``
+samples. Learning and scoring cost O(trees x depth) per sample and memory is
+fixed by the tree shape, so the model follows drift without batch refits.
+"""
+
+from __future__ import annotations
+
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from anomaly_detector import (
+    MODEL_BUNDLE_VERSION,
+    AnomalyDetector,
+    align_columns,
+    atomic_dump,
+    write_bundle_metadata,
+)
+
+# Rows per traversal block: bounds the (rows, trees, depth) path array
+_BLOCK_ROWS = 4096
+
+
+class HalfSpaceTreesDetector:
+    """Half-Space Trees with the :class:`AnomalyDetector` interface.
+
+    Trees are complete binary trees stored level by level (node i has
+    children 2i+1 and 2i+2), so an inner node is just a split feature and a
+    split value. Features are min-max normalized with the training ranges;
+    values outside them still land in a cell. Scores follow the
+    IsolationForest convention: ``decision_scores < 0`` is an anomaly, with
+    the offset re-fitted to the `contamination` quantile on every window.
+    """
+
+    engine = "hst"
+    streaming = True
+
+    def __init__(
+        self,
+        contamination: float = 0.05,
+        n_estimators: int = 25,
+        random_state: int = 42,
+        depth: int = 10,
+        window_size: int = 250,
+    ) -> None:
+        self.feature_names: Optional[List[str]] = None
+        self.meta: Dict[str, object] = {}
+
+        self.contamination = float(contamination)
+        self.n_estimators = int(n_estimators)
+        self.random_state = int(random_state)
+        self.depth = int(depth)
+        self.window_size = int(window_size)
+        # Descend only while the reference cell holds this much mass
+        self.size_limit = 0.1 * self.window_size
+
+        self.low: Optional[np.ndarray] = None
+        self.span: Optional[np.ndarray] = None
+        self.split_feature: Optional[np.ndarray] = None
+        self.split_value: Optional[np.ndarray] = None
+        self.reference: Optional[np.ndarray] = None
+        self.latest: Optional[np.ndarray] = None
+        self.offset = 0.0
+        # Normalized rows of the latest window, for re-fitting the offset
+        self._window: Optional[np.ndarray] = None
+        self._seen = 0
+        self.swaps = 0
+        self._column_index: Dict[Tuple[str, ...], Optional[np.ndarray]] = {}
+
+    @property
+    def n_nodes(self) -> int:
+        return (1 << (self.depth + 1)) - 1
+
+    @property
+    def compiled(self) -> "HalfSpaceTreesDetector":
+        """Already array-based; kept for interface parity."""
+        return self
+
+    def _check(self) -> None:
+        if self.reference is None or self.feature_names is None:
+            raise RuntimeError("Model not trained or loaded.")
+
+    def _build_trees(self, n_features: int) -> None:
+        T, inner = self.n_estimators, (1 << self.depth) - 1
+        rng = np.random.default_rng(self.random_state)
+        feature = rng.integers(0, n_features, size=(T, inner))
+        value = np.empty((T, inner))
+        # Per-tree workspace: [s - r, s + r] with s ~ U(0, 1), r = 2 max(s, 1 - s)
+        s = rng.random((T, n_features))
+        r = 2.0 * np.maximum(s, 1.0 - s)
+        low, high = (s - r)[:, None, :], (s + r)[:, None, :]
+        for level in range(self.depth):
+            first, count = (1 << level) - 1, 1 << level
+            f = feature[:, first : first + count, None]
+            mid = (np.take_along_axis(low, f, 2) + np.take_along_axis(high, f, 2)) / 2.0
+            value[:, first : first + count] = mid[..., 0]
+            # Children of consecutive nodes are consecutive: left, right, ...
+            low, high = np.repeat(low, 2, axis=1), np.repeat(high, 2, axis=1)
+            f, mid = np.repeat(f, 2, axis=1), np.repeat(mid, 2, axis=1)
+            right = np.tile([False, True], count)[None, :, None]
+            np.put_along_axis(
+                high, f, np.where(right, np.take_along_axis(high, f, 2), mid), 2
+            )
+            np.put_along_axis(
+                low, f, np.where(right, mid, np.take_along_axis(low, f, 2)), 2
+            )
+        self.split_feature = feature.astype(np.int32)
+        self.split_value = value
+
+    def train(self, df_features: pd.DataFrame) -> None:
+        if df_features is None or df_features.empty:
+            raise ValueError("No features provided for training.")
+        self.feature_names = list(df_features.columns)
+        A = df_features.values.astype(float)
+        self.low = A.min(axis=0)
+        span = A.max(axis=0) - self.low
+        self.span = np.where(span > 0, span, 1.0)
+        self._build_trees(A.shape[1])
+        Z = self._normalize(A)
+
+        # Reference = mass profile of all training rows, in window units
+        counts = np.zeros(self.n_estimators * self.n_nodes)
+        self._count(counts, Z)
+        self.reference = (counts * (self.window_size / len(Z))).reshape(
+            self.n_estimators, self.n_nodes
+        )
+        self.latest = np.zeros_like(self.reference)
+        self._window = np.zeros((self.window_size, A.shape[1]))
+        self._seen = 0
+        self.swaps = 0
+        self._column_index = {}
+        self.offset = float(np.quantile(self._score_samples(Z), self.contamination))
+
+    def _normalize(self, A: np.ndarray) -> np.ndarray:
+        return (A - self.low) / self.span
+
+    def _paths(self, Z: np.ndarray) -> np.ndarray:
+        """Flat node index (into the ``trees x nodes`` masses) of every level
+        of every tree for each row: shape ``(rows, trees, depth + 1)``."""
+        assert self.split_feature is not None and self.split_value is not None
+        n, T = len(Z), self.n_estimators
+        rows = np.arange(n)[:, None]
+        trees = np.arange(T)[None, :]
+        node = np.zeros((n, T), dtype=np.intp)
+        path = np.empty((n, T, self.depth + 1), dtype=np.intp)
+        path[:, :, 0] = 0
+        for level in range(self.depth):
+            f = self.split_feature[trees, node]
+            right = Z[rows, f] > self.split_value[trees, node]
+            node = 2 * node + 1 + right
+            path[:, :, level + 1] = node
+        return path + (np.arange(T) * self.n_nodes)[None, :, None]
+
+    def _count(self, masses: np.ndarray, Z: np.ndarray) -> None:
+        """Add every row of `Z` to the flat `masses` along its paths."""
+        for start in range(0, len(Z), _BLOCK_ROWS):
+            path = self._paths(Z[start : start + _BLOCK_ROWS])
+            masses += np.bincount(path.ravel(), minlength=masses.size)
+
+    def _score_samples(self, Z: np.ndarray) -> np.ndarray:
+        """``-2 ** -m`` in [-1, -0.5], like IsolationForest.score_samples:
+        m is the reference mass met along the paths (mass x 2**level at the
+        cell where descent stops) over its maximum, trees x window x
+        2**depth. Near -1 is anomalous."""
+        assert self.reference is not None
+        flat = self.reference.ravel()
+        scale = 2.0 ** np.arange(self.depth + 1)
+        out = np.empty(len(Z))
+        for start in range(0, len(Z), _BLOCK_ROWS):
+            mass = flat.take(self._paths(Z[start : start + _BLOCK_ROWS]))
+            small = mass < self.size_limit
+            stop = np.where(small.any(axis=2), small.argmax(axis=2), self.depth)
+            cell = np.take_along_axis(mass, stop[..., None], 2)[..., 0]
+            out[start : start + len(mass)] = (cell * scale[stop]).sum(axis=1)
+        m = out / (self.n_estimators * self.window_size * 2.0**self.depth)
+        return -(2.0**-m)
+
+    def _matrix(
+        self,
+        X: Union[np.ndarray, pd.DataFrame],
+        columns: Optional[Sequence[str]] = None,
+    ) -> np.ndarray:
+        assert self.feature_names is not None
+        if isinstance(X, pd.DataFrame):
+            return (
+                X.reindex(columns=self.feature_names).fillna(0.0).values.astype(float)
+            )
+        A = np.asarray(X, dtype=float)
+        if A.ndim == 1:
+            A = A.reshape(1, -1)
+        if columns is not None:
+            A = align_columns(A, columns, self.feature_names, self._column_index)
+        elif A.shape[1] != len(self.feature_names):
+            raise ValueError(
+                f"Expected {len(self.feature_names)} feature columns, got {A.shape[1]}"
+            )
+        return np.nan_to_num(A, nan=0.0)
+
+    def predict(self, df_features: pd.DataFrame):
+        _, flags = self.score_batch(df_features)
+        return ["Anomaly" if f else "Normal" for f in flags]
+
+    def decision_scores(self, df_features: pd.DataFrame):
+        return self.score_batch(df_features)[0]
+
+    def score_batch(
+        self,
+        X: Union[np.ndarray, pd.DataFrame],
+        columns: Optional[Sequence[str]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """``(scores, is_anomaly)`` as in :meth:`AnomalyDetector.score_batch`.
+        Scoring does not learn; call :meth:`learn` with the same rows."""
+        self._check()
+        scores = (
+            self._score_samples(self._normalize(self._matrix(X, columns))) - self.offset
+        )
+        return scores, scores < 0
+
+    def learn(
+        self,
+        X: Union[np.ndarray, pd.DataFrame],
+        columns: Optional[Sequence[str]] = None,
+    ) -> None:
+        """Count rows into the latest window, swapping windows as they fill."""
+        self._check()
+        assert self.latest is not None and self._window is not None
+        Z = self._normalize(self._matrix(X, columns))
+        start = 0
+        while start < len(Z):
+            chunk = Z[start : start + self.window_size - self._seen]
+            self._count(self.latest.ravel(), chunk)
+            self._window[self._seen : self._seen + len(chunk)] = chunk
+            self._seen += len(chunk)
+            start += len(chunk)
+            if self._seen >= self.window_size:
+                self._swap()
+
+    def _swap(self) -> None:
+        """The full latest window becomes the reference; the offset is
+        re-fitted on that window's rows."""
+        assert self.latest is not None and self._window is not None
+        self.reference, self.latest = self.latest, self.reference
+        self.latest.fill(0.0)
+        self._seen = 0
+        self.swaps += 1
+        self.offset = float(
+            np.quantile(self._score_samples(self._window), self.contamination)
+        )
+
+    def warm_up(self) -> None:
+        """Run one row through :meth:`score_batch` (interface parity)."""
+        self.score_batch(np.zeros((1, len(self.feature_names or []))))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "engine": self.engine,
+            "windows": self.swaps,
+            "window_fill": self._seen,
+            "offset": self.offset,
+        }
+
+    def save_model(self, path: str) -> None:
+        """Write the bundle (trees and both windows) to `path` atomically,
+        plus the metadata sidecar."""
+        self._check()
+        meta: Dict[str, Any] = {
+            "engine": self.engine,
+            "contamination": self.contamination,
+            "n_estimators": self.n_estimators,
+            "random_state": self.random_state,
+            "depth": self.depth,
+            "window_size": self.window_size,
+            "offset": self.offset,
+            "seen": self._seen,
+            "swaps": self.swaps,
+            "version": MODEL_BUNDLE_VERSION,
+            "trained_at": datetime.now(timezone.utc).isoformat(),
+            "feature_checksum": AnomalyDetector._feature_checksum(self.feature_names),
+        }
+        payload = {
+            "feature_names": self.feature_names,
+            "arrays": {
+                "low": self.low,
+                "span": self.span,
+                "split_feature": self.split_feature,
+                "split_value": self.split_value,
+                "reference": self.reference,
+                "latest": self.latest,
+                "window": self._window,
+            },
+            "meta": meta,
+        }
+        atomic_dump(payload, path)
+        write_bundle_metadata(path, self.engine, self.feature_names, meta)
+
+    def load_model(self, path: str, *, payload: Optional[Dict] = None) -> None:
+        """Load the bundle at `path` (or `payload`, already unpickled from it)."""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file does not exist: {path}")
+        if payload is None:
+            payload = joblib.load(path)
+        meta = dict(payload.get("meta", {}))
+        engine = meta.get("engine", "iforest")
+        if engine != self.engine:
+            raise RuntimeError(
+                f"Model bundle uses the {engine!r} engine; set Detector.Engine = {engine}"
+            )
+        arrays = payload.get("arrays") or {}
+        self.feature_names = payload.get("feature_names", None)
+        if self.feature_names is None or "reference" not in arrays:
+            raise RuntimeError("Loaded model bundle is incomplete.")
+        self.meta = meta
+        self.contamination = float(meta["contamination"])
+        self.n_estimators = int(meta["n_estimators"])
+        self.random_state = int(meta["random_state"])
+        self.depth = int(meta["depth"])
+        self.window_size = int(meta["window_size"])
+        self.size_limit = 0.1 * self.window_size
+        self.offset = float(meta["offset"])
+        self._seen = int(meta.get("seen", 0))
+        self.swaps = int(meta.get("swaps", 0))
+        self.low = arrays["low"]
+        self.span = arrays["span"]
+        self.split_feature = arrays["split_feature"]
+        self.split_value = arrays["split_value"]
+        self.reference = arrays["reference"]
+        self.latest = arrays["latest"]
+        self._window = arrays["window"]
+        self._column_index = {}
+
+    def bundle_metadata(self) -> Dict[str, object]:
+        """Return lightweight, human-readable bundle info."""
+        return {
+            "version": MODEL_BUNDLE_VERSION,
+            "trained_at": self.meta.get("trained_at", ""),
+            "engine": self.engine,
+            "feature_names": list(self.feature_names or []),
+            "feature_count": len(self.feature_names or []),
+            "feature_checksum": AnomalyDetector._feature_checksum(self.feature_names),
+            "params": {
+                "contamination": self.contamination,
+                "n_estimators": self.n_estimators,
+                "random_state": self.random_state,
+                "depth": self.depth,
+                "window_size": self.window_size,
+            },
+        }
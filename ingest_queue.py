@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded hand-off between packet capture and analysis.
+
+The capture thread only parses headers and enqueues; an analysis thread
+drains the queue. When analysis falls behind, the overflow policy decides
+what is lost, and every loss is counted instead of disappearing into kernel
+buffer overruns.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+__all__ = ["IngestQueue", "INGEST_POLICIES"]
+
+# drop-newest: reject arrivals while full (keeps the backlog intact)
+# drop-oldest: displace the oldest queued packet (favours fresh traffic)
+# sample:      above half full, admit arrivals with a probability that falls
+#              linearly to 0 at full, thinning the stream instead of cutting it
+INGEST_POLICIES = ("drop-newest", "drop-oldest", "sample")
+
+
+class IngestQueue:
+    """Thread-safe bounded FIFO with an overflow policy and counters.
+
+    Invariant: ``offered == processed + dropped + depth`` once the consumer
+    has acknowledged each item it took with :meth:`task_done`.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        policy: str = "drop-newest",
+        *,
+        seed: Optional[int] = None,
+    ) -> None:
+        policy = (policy or "drop-newest").strip().lower()
+        if policy not in INGEST_POLICIES:
+            raise ValueError(f"unknown ingest policy: {policy!r}")
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self._items: Deque[Any] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._rng = random.Random(seed)
+        self._sample_floor = self.maxsize // 2
+        self.offered = 0
+        self.enqueued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.high_water = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def _admit(self, depth: int) -> bool:
+        if self.policy == "sample" and depth >= self._sample_floor:
+            span = self.maxsize - self._sample_floor
+            return self._rng.random() * span < self.maxsize - depth
+        return depth < self.maxsize
+
+    def put(self, item: Any) -> bool:
+        """Offer `item`; returns False when it was dropped. Never blocks."""
+        with self._cond:
+            self.offered += 1
+            if self._closed:
+                self.dropped += 1
+                return False
+            items = self._items
+            depth = len(items)
+            if depth >= self.maxsize and self.policy == "drop-oldest":
+                items.popleft()
+                self.dropped += 1
+            elif not self._admit(depth):
+                self.dropped += 1
+                return False
+            items.append(item)
+            self.enqueued += 1
+            if len(items) > self.high_water:
+                self.high_water = len(items)
+            self._cond.notify()
+            return True
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """Next item, or None on timeout or once closed and drained."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._items:
+                if self._closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._items.popleft()
+
+    def task_done(self) -> None:
+        """Acknowledge one item taken with :meth:`get` as analysed."""
+        with self._cond:
+            self.processed += 1
+
+    def close(self) -> None:
+        """Stop accepting work; :meth:`get` drains what is left, then ends."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "maxsize": self.maxsize,
+                "depth": len(self._items),
+                "high_water": self.high_water,
+                "offered": self.offered,
+                "enqueued": self.enqueued,
+                "processed": self.processed,
+                "dropped": self.dropped,
+            }
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Integer IP addresses for the packet pipeline.
+
+IPv4 and IPv6 share one 128-bit integer space: IPv6 addresses are their
+natural value and IPv4 addresses use the IPv4-mapped form (``::ffff:a.b.c.d``).
+Text is only rendered at the edges (alerts, WebDB, API, DataFrames).
+"""
+
+from __future__ import annotations
+
+import socket
+from typing import Union
+
+__all__ = [
+    "V4_MAPPED",
+    "ip_to_int",
+    "int_to_ip",
+    "as_ip_int",
+    "is_v4",
+    "is_loopback",
+]
+
+V4_MAPPED = 0xFFFF << 32
+_V4_MASK = 0xFFFFFFFF
+_V6_LOOPBACK = 1
+
+
+def ip_to_int(ip: str) -> int:
+    """Parse dotted-quad or IPv6 text; raises ValueError on bad input."""
+    text = str(ip).strip()
+    try:
+        if ":" in text:
+            return int.from_bytes(socket.inet_pton(socket.AF_INET6, text), "big")
+        return V4_MAPPED | int.from_bytes(socket.inet_pton(socket.AF_INET, text), "big")
+    except OSError:
+        raise ValueError(f"invalid IP address: {ip!r}") from None
+
+
+def int_to_ip(value: int) -> str:
+    """Render an address from :func:`ip_to_int` back to canonical text."""
+    value = int(value)
+    if value >> 32 == 0xFFFF:
+        return socket.inet_ntoa((value & _V4_MASK).to_bytes(4, "big"))
+    return socket.inet_ntop(socket.AF_INET6, value.to_bytes(16, "big"))
+
+
+def as_ip_int(ip: Union[int, str]) -> int:
+    """Accept either representation and return the integer form."""
+    return int(ip) if isinstance(ip, int) else ip_to_int(ip)
+
+
+def is_v4(value: int) -> bool:
+    return int(value) >> 32 == 0xFFFF
+
+
+def is_loopback(value: int) -> bool:
+    value = int(value)
+    if value >> 32 == 0xFFFF:
+        return (value >> 24) & 0xFF == 127
+    return value == _V6_LOOPBACK
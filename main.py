@@ -9,9 +9,11 @@ import os
 import socket
 import sys
 import threading
+import time
 from network_monitor import NetworkMonitor
-from anomaly_detector import AnomalyDetector
+from anomaly_detector import load_detector
 from config_validation import validate_config
+from training import current_rss_bytes
 from typing import Any, Dict, List, cast
 
 _API_THREAD: threading.Thread | None = None
@@ -63,10 +65,30 @@ def _load_config(config_path: str) -> configparser.ConfigParser:
     return cfg
 
 
+def _add_capture_backend(parser: argparse.ArgumentParser, default: str) -> None:
+    parser.add_argument(
+        "--capture-backend",
+        choices=["scapy", "afpacket"],
+        default=default,
+        help="Packet capture backend (afpacket = TPACKET_V3 mmap ring, Linux only).",
+    )
+
+
+def _add_workers(parser: argparse.ArgumentParser, default: int) -> None:
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=default,
+        help="Analysis worker processes (0 = single process).",
+    )
+
+
 def build_arg_parser(cfg: configparser.ConfigParser) -> argparse.ArgumentParser:
     default_iface = cfg.get("DEFAULT", "DefaultInterface", fallback="eth0")
     default_count = cfg.getint("DEFAULT", "DefaultPacketCount", fallback=1000)
     default_model = cfg.get("DEFAULT", "ModelPath", fallback="models/iforest.joblib")
+    default_backend = cfg.get("Capture", "Backend", fallback="scapy").strip().lower()
+    default_workers = cfg.getint("Sharding", "Workers", fallback=0)
     p = argparse.ArgumentParser(
         description="AI-Powered IDS: Train or monitor network traffic using Isolation Forest."
     )
@@ -88,6 +110,30 @@ def build_arg_parser(cfg: configparser.ConfigParser) -> argparse.ArgumentParser:
         default=default_model,
         help="Path to save the trained model (joblib).",
     )
+    source = pt.add_mutually_exclusive_group()
+    source.add_argument(
+        "--pcap",
+        default=None,
+        help="Train from a pcap/pcapng file instead of live capture "
+        "(--count is then the training sample size).",
+    )
+    source.add_argument(
+        "--from-parquet",
+        dest="from_parquet",
+        default=None,
+        metavar="PATH",
+        help="Train from engineered feature history (a Parquet file such as "
+        "Training.RollingParquetPath, or a directory of them), streamed in "
+        "row-group chunks (--count is then the training sample size).",
+    )
+    pt.add_argument(
+        "--n-jobs",
+        dest="n_jobs",
+        type=int,
+        default=None,
+        help="CPU cores for fitting the forest (-1 = all; default Training.NJobs).",
+    )
+    _add_capture_backend(pt, default_backend)
     pm = sub.add_parser("monitor", help="Start live monitoring with a trained model.")
     pm.add_argument(
         "--interface", "-i", default=default_iface, help="Network interface to use."
@@ -98,6 +144,8 @@ def build_arg_parser(cfg: configparser.ConfigParser) -> argparse.ArgumentParser:
         default=default_model,
         help="Path to the trained model (joblib).",
     )
+    _add_capture_backend(pm, default_backend)
+    _add_workers(pm, default_workers)
     fw_default = cfg.getboolean("Monitoring", "FirewallBlocking", fallback=False)
     pm.add_argument(
         "--firewall-blocking",
@@ -127,6 +175,28 @@ def build_arg_parser(cfg: configparser.ConfigParser) -> argparse.ArgumentParser:
         help="Capture live packets from the selected interface.",
     )
     pm.set_defaults(simulate_traffic=sim_default)
+    pr = sub.add_parser(
+        "replay", help="Score a pcap/pcapng file through the monitoring pipeline."
+    )
+    pr.add_argument("--pcap", required=True, help="Capture file to replay.")
+    pr.add_argument(
+        "--model",
+        "-m",
+        default=default_model,
+        help="Path to the trained model (joblib).",
+    )
+    pr.add_argument(
+        "--realtime",
+        action="store_true",
+        help="Pace packets to their capture timestamps instead of max speed.",
+    )
+    pr.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Playback speed multiplier for --realtime.",
+    )
+    _add_workers(pr, default_workers)
     pv = sub.add_parser("verify-model", help="Inspect a trained model bundle.")
     pv.add_argument(
         "--model",
@@ -145,10 +215,38 @@ def main(argv=None) -> int:
     cfg = _load_config("config.ini")
     args = build_arg_parser(cfg).parse_args(argv)
     monitor = NetworkMonitor(cfg)
+    if getattr(args, "capture_backend", None):
+        monitor.capture_backend = args.capture_backend
+    if getattr(args, "workers", None) is not None:
+        monitor.shard_workers = max(0, args.workers)
     try:
         if args.mode == "train":
-            monitor.capture_and_train(
-                interface=args.interface, packet_count=args.count, model_path=args.model
+            if args.n_jobs is not None:
+                monitor.detector.n_jobs = args.n_jobs
+            if args.from_parquet:
+                stats = monitor.train_from_parquet(
+                    args.from_parquet, args.count, args.model
+                )
+                print(
+                    f"Training complete: rows={stats['rows']:.0f} sample={stats['sample']:.0f} "
+                    f"rows_per_sec={stats['rows_per_sec']:.0f} fit_seconds={stats['fit_seconds']:.2f} "
+                    f"peak_rss_mb={stats['peak_rss_mb']:.0f}"
+                )
+            elif args.pcap:
+                monitor.train_from_pcap(args.pcap, args.count, args.model)
+            else:
+                monitor.capture_and_train(
+                    interface=args.interface,
+                    packet_count=args.count,
+                    model_path=args.model,
+                )
+        elif args.mode == "replay":
+            stats = monitor.replay_pcap(
+                args.pcap, args.model, realtime=args.realtime, speed=args.speed
+            )
+            print(
+                f"Replay complete: frames={stats['frames']} packets={stats['packets']} "
+                f"seconds={stats['seconds']:.3f} pps={stats['pps']:.0f}"
             )
         elif args.mode == "monitor":
             _start_api_server_in_background()
@@ -159,15 +257,12 @@ def main(argv=None) -> int:
                 simulate=getattr(args, "simulate_traffic", False),
             )
         elif args.mode == "verify-model":
-            # Create a detector aligned with config, load bundle, and print details
-            det = AnomalyDetector(
-                contamination=cfg.getfloat(
-                    "IsolationForest", "Contamination", fallback=0.05
-                ),
-                n_estimators=cfg.getint("IsolationForest", "NEstimators", fallback=200),
-                random_state=cfg.getint("IsolationForest", "RandomState", fallback=42),
-            )
-            det.load_model(args.model)
+            # Load the bundle with the engine that wrote it and print details
+            rss_before = current_rss_bytes()
+            started = time.perf_counter()
+            det = load_detector(args.model)
+            load_ms = (time.perf_counter() - started) * 1000.0
+            rss_after = current_rss_bytes()
 
             info = cast(Dict[str, Any], det.bundle_metadata())
 
@@ -178,16 +273,37 @@ def main(argv=None) -> int:
 
             params = cast(Dict[str, Any], info.get("params", {}) or {})
 
-            print(
-                f"IF params:        contamination={params.get('contamination')}  "
-                f"n_estimators={params.get('n_estimators')}  random_state={params.get('random_state')}"
-            )
+            print(f"Engine:           {info.get('engine', 'iforest')}")
+            if info.get("engine") == "hst":
+                print(
+                    f"HST params:       contamination={params.get('contamination')}  "
+                    f"trees={params.get('n_estimators')}  depth={params.get('depth')}  "
+                    f"window_size={params.get('window_size')}  random_state={params.get('random_state')}"
+                )
+            else:
+                print(
+                    f"IF params:        contamination={params.get('contamination')}  "
+                    f"n_estimators={params.get('n_estimators')}  random_state={params.get('random_state')}"
+                )
             print(f"Feature count:    {info.get('feature_count', 0)}")
             print(f"Feature checksum: {info.get('feature_checksum', '')}")
 
             names = cast(List[str], info.get("feature_names", []) or [])
 
             print("Feature order:    " + (", ".join(names) if names else "<none>"))
+            if getattr(det, "lazy", False):
+                how = (
+                    "metadata + memory-mapped forest"
+                    if det.forest_mapped
+                    else "metadata only"
+                )
+            else:
+                how = "full bundle"
+            print(f"Load time:        {load_ms:.1f} ms ({how})")
+            print(
+                f"Resident memory:  {rss_after / 2**20:.1f} MiB "
+                f"(+{max(0, rss_after - rss_before) / 2**20:.1f} MiB for the load)"
+            )
             return 0
 
         elif args.mode == "config-validate":  # NEW
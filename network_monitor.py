@@ -8,17 +8,29 @@ import os
 import logging
 import math
 import random
+import threading
 import time
 import uuid
 from datetime import datetime, timezone
 import webdb
-from typing import Any, Dict, List, Set, cast
-import ipaddress
-from anomaly_detector import AnomalyDetector
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, cast
+import numpy as np
+from anomaly_detector import META_SUFFIX, feature_checksum, make_detector
+from bpf import CaptureFilter
+from capture import AfPacketRing, l2listen_frames, pcap_frames
+from flow_sampler import FlowSampler
+from flow_table import FLOW_FEATURES, FlowRecord, FlowTable, flow_features
+from ingest_queue import IngestQueue
+from host_registry import HostRegistry
+from ip_codec import int_to_ip, is_loopback
 from firewall import capabilities as firewall_capabilities
 from firewall import ensure_block as firewall_ensure_block
 from packet_processor import IP, TCP, UDP, PacketProcessor
+from scan_counters import make_scan_counter
+from score_cache import ScoreCache
+from score_quantiles import ScoreQuantiles
 from signature_engine import default_engine
+from training import FeatureReservoir, FeatureRing, iter_parquet_batches, peak_rss_bytes
 
 
 def _utcnow() -> datetime:
@@ -42,6 +54,10 @@ except Exception as e:  # pragma: no cover
     raise RuntimeError("Scapy is required for packet capture: pip install scapy") from e
 
 
+# Seconds between capture drop / window occupancy statistics log lines
+_CAPTURE_STATS_EVERY = 30.0
+
+
 class _FakeLayer:
     def __init__(self, **attrs: Any) -> None:
         self.__dict__.update(attrs)
@@ -106,13 +122,59 @@ def _as_float(value: Any, default: float = 0.0) -> float:
         return default
 
 
+def _ip_text(value: Any) -> str:
+    """Render an integer IP for output; text passes through unchanged."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        try:
+            return int_to_ip(value)
+        except Exception:
+            return str(value)
+    return str(value if value is not None else "")
+
+
+def _parse_ports(text: str) -> List[int]:
+    """'5000, 8080' -> [5000, 8080] (invalid entries are ignored)."""
+    ports = []
+    for part in str(text or "").split(","):
+        part = part.strip()
+        if part.isdigit() and 0 <= int(part) <= 0xFFFF:
+            ports.append(int(part))
+    return ports
+
+
 class NetworkMonitor:
     """Glue code that wires up capture, processing, and the detector."""
 
     def __init__(self, config) -> None:
         self.config = config
         window_size = self.config.getint("DEFAULT", "DefaultWindowSize", fallback=500)
-        self.processor = PacketProcessor(window_size=window_size)
+        scan_horizon = self.config.getfloat(
+            "Features", "ScanHorizonSeconds", fallback=15.0
+        )
+        # One local-address registry shared by processor and monitor; it is
+        # kept current (netlink / polling thread) only while live monitoring
+        self.hosts = HostRegistry(
+            refresh_interval=self.config.getfloat(
+                "Monitoring", "HostRefreshSeconds", fallback=30.0
+            )
+        )
+        scan_counter = make_scan_counter(
+            self.config.get("Features", "ScanCounter", fallback="exact"),
+            scan_horizon,
+            memory_mb=self.config.getfloat("Features", "ScanSketchMemoryMB", fallback=16.0),
+            precision=self.config.getint("Features", "ScanSketchPrecision", fallback=7),
+        )
+        # WindowSeconds > 0: the window spans a time horizon, not a row count
+        window_seconds = self.config.getfloat("Features", "WindowSeconds", fallback=0.0)
+        window_max_mb = self.config.getfloat("Features", "WindowMaxMB", fallback=0.0)
+        self.processor = PacketProcessor(
+            window_size=window_size,
+            scan_horizon=scan_horizon,
+            hosts=self.hosts,
+            scan_counter=scan_counter,
+            window_horizon=window_seconds if window_seconds > 0 else None,
+            window_max_bytes=int(window_max_mb * (1 << 20)) if window_max_mb > 0 else None,
+        )
 
         contamination = self.config.getfloat(
             "IsolationForest", "Contamination", fallback=0.05
@@ -121,10 +183,17 @@ class NetworkMonitor:
             "IsolationForest", "NEstimators", fallback=200
         )
         random_state = self.config.getint("IsolationForest", "RandomState", fallback=42)
-        self.detector = AnomalyDetector(
+        engine = self.config.get("Detector", "Engine", fallback="iforest")
+        if engine.strip().lower() == "hst":
+            n_estimators = self.config.getint("Detector", "HSTTrees", fallback=25)
+        self.detector = make_detector(
+            engine,
             contamination=contamination,
             n_estimators=n_estimators,
             random_state=random_state,
+            depth=self.config.getint("Detector", "HSTDepth", fallback=10),
+            window_size=self.config.getint("Detector", "HSTWindowSize", fallback=250),
+            n_jobs=self.config.getint("Training", "NJobs", fallback=-1),
         )
 
         self.logger = logging.getLogger("ids.monitor")
@@ -139,6 +208,138 @@ class NetworkMonitor:
             "Monitoring", "OnlineRetrainInterval", fallback=0
         )
         self._packet_counter = 0
+        self._rolling_pending = 0
+        # Online retraining runs on a background thread over a copy of the
+        # most recent feature rows; the packet path only appends to the ring.
+        self._recent = FeatureRing(window_size, PacketProcessor.FEATURES)
+        self._retrain_thread: Optional[threading.Thread] = None
+        self._retrain_stats: Dict[str, Any] = {
+            "retrains": 0,
+            "skipped": 0,
+            "failures": 0,
+            "last_rows": 0,
+            "last_duration_s": 0.0,
+            "last_staleness_s": 0.0,
+            "last_packets_behind": 0,
+            "last_swap_ts": 0.0,
+            "superseded": 0,
+        }
+
+        # Hot reload: the live bundle (and API reload requests) are polled
+        # every ModelWatchSeconds; a valid new bundle is swapped in between
+        # packets without restarting capture.
+        self.model_watch_seconds = self.config.getfloat(
+            "Monitoring", "ModelWatchSeconds", fallback=2.0
+        )
+        self._model_component = "model"
+        self._model_path: Optional[str] = None
+        self._model_signature: Optional[Tuple] = None
+        self._reload_command: Optional[str] = None
+        self._reload_lock = threading.Lock()
+        self._model_stats: Dict[str, Any] = {
+            "path": None,
+            "engine": None,
+            "trained_at": None,
+            "feature_checksum": None,
+            "loaded_ts": None,
+            "reloads": 0,
+            "failures": 0,
+            "last_reload_ts": None,
+            "last_reload_reason": None,
+            "last_reload_ms": None,
+            "last_error": None,
+        }
+
+        # Capture parser: "fast" reads raw frames and decodes headers with
+        # struct offsets; "scapy" dissects every packet with sniff().
+        self.capture_parser = (
+            self.config.get("Capture", "Parser", fallback="fast").strip().lower()
+        )
+
+        # Capture backend: "scapy" (socket per packet, see Parser) or
+        # "afpacket" (TPACKET_V3 mmap ring, Linux only).
+        self.capture_backend = (
+            self.config.get("Capture", "Backend", fallback="scapy").strip().lower()
+        )
+        self._capture_stats: Dict[str, int] = {}
+        self._window_stats: Dict[str, float] = {}
+        self._ingest_stats: Dict[str, Any] = {}
+        self._next_stats = time.monotonic() + _CAPTURE_STATS_EVERY
+
+        # Ingest queue: QueueSize > 0 decouples live capture from analysis
+        # with a bounded queue; QueuePolicy picks what to drop when it fills.
+        self.ingest_queue_size = max(
+            0, self.config.getint("Capture", "QueueSize", fallback=0)
+        )
+        self.ingest_policy = (
+            self.config.get("Capture", "QueuePolicy", fallback="drop-newest")
+            .strip()
+            .lower()
+        )
+        self.ingest: Optional[IngestQueue] = None
+
+        # Kernel capture filter: Capture.Filter plus generated exclusions
+        # (trusted IPs, ExcludePorts), attached to capture sockets as BPF
+        self.capture_filter = CaptureFilter(
+            self.config.get("Capture", "Filter", fallback=""),
+            exclude_ports=_parse_ports(
+                self.config.get("Capture", "ExcludePorts", fallback="")
+            ),
+            hosts_source=(
+                self._trusted_hosts
+                if self.config.getboolean("Capture", "ExcludeTrusted", fallback=False)
+                else None
+            ),
+            refresh_interval=self.config.getfloat(
+                "Capture", "FilterRefreshSeconds", fallback=30.0
+            ),
+        )
+
+        # Micro-batching: score up to BatchSize packets per model call, holding
+        # a packet at most BatchMaxLatencyMs. BatchSize=1 keeps per-packet mode.
+        self.batch_size = max(
+            1, self.config.getint("Monitoring", "BatchSize", fallback=1)
+        )
+        self.batch_max_latency_ms = self.config.getfloat(
+            "Monitoring", "BatchMaxLatencyMs", fallback=50.0
+        )
+        self._batch: List[Tuple[Optional[np.ndarray], Dict[str, Any]]] = []
+        self._batch_started = 0.0
+        self._batch_lock = threading.Lock()
+
+        # Scoring granularity: "packet" scores every packet (optionally in
+        # micro-batches); "flow" scores each exported bidirectional flow.
+        self.scoring_granularity = (
+            self.config.get("Monitoring", "ScoringGranularity", fallback="packet")
+            .strip()
+            .lower()
+        )
+        self.flow_table = self._new_flow_table()
+
+        # Adaptive sampling: once packets trail the wall clock by more than
+        # SamplingTargetLagSeconds, only a hash-selected subset of flows is
+        # scored by the model. Features and signatures still see every packet.
+        self.sampler = FlowSampler(
+            self.config.getfloat("Monitoring", "SamplingTargetLagSeconds", fallback=0.0),
+            min_rate=self.config.getfloat("Monitoring", "SamplingMinRate", fallback=0.05),
+        )
+        # ScoreCacheSize > 0: repeated feature rows are answered from an LRU
+        # cache instead of the forest (batch engines only, see score_cache.py)
+        cache_size = self.config.getint("Monitoring", "ScoreCacheSize", fallback=0)
+        self.score_cache: Optional[ScoreCache] = (
+            ScoreCache(
+                cache_size,
+                decimals=self.config.getint("Monitoring", "ScoreCacheDecimals", fallback=4),
+            )
+            if cache_size > 0
+            else None
+        )
+
+        # Sharding: Workers > 0 runs analysis in that many worker processes,
+        # with packets hashed to them by source IP (see sharded.py).
+        self.shard_workers = max(
+            0, self.config.getint("Sharding", "Workers", fallback=0)
+        )
 
         # Rolling features capture (for quick repros/ad-hoc retraining)
         self.save_rolling = self.config.getboolean(
@@ -156,6 +357,25 @@ class NetworkMonitor:
                 self._thr_high, self._thr_med = float(parts[0]), float(parts[1])
             except Exception:
                 pass
+        # AlertPercentiles "high, medium" (in %): the severity cutoffs follow
+        # those percentiles of recent scores instead (streaming estimate, see
+        # score_quantiles.py); AlertThresholds apply until it has warmed up
+        self.score_quantiles: Optional[ScoreQuantiles] = None
+        pct = self.config.get("Monitoring", "AlertPercentiles", fallback="")
+        parts = [p.strip() for p in pct.split(",") if p.strip()]
+        if len(parts) >= 2:
+            try:
+                self.score_quantiles = ScoreQuantiles(
+                    [float(parts[0]) / 100.0, float(parts[1]) / 100.0],
+                    window=self.config.getint(
+                        "Monitoring", "AlertPercentileWindow", fallback=100000
+                    ),
+                )
+            except ValueError as e:
+                self.logger.warning(
+                    "Ignoring AlertPercentiles %r (%s); using AlertThresholds", pct, e
+                )
+        self._thresholds_component = "thresholds"
 
         # Signature engine toggle
         self.enable_sigs = self.config.getboolean("Signatures", "Enable", fallback=True)
@@ -164,7 +384,7 @@ class NetworkMonitor:
         # Runtime firewall + simulation knobs
         self.firewall_capabilities = firewall_capabilities()
         self.firewall_runtime_enabled = False
-        self._runtime_blocked: Set[str] = set()
+        self._runtime_blocked: Set[int] = set()
         self._simulate_mode = False
         
         # Ensure the Web UI database exists for alert inserts
@@ -175,6 +395,26 @@ class NetworkMonitor:
             self.logger = logging.getLogger("ids.monitor")
             self.logger.debug("webdb.init() failed", exc_info=True)
 
+    def _new_flow_table(self) -> FlowTable:
+        return FlowTable(
+            idle_timeout=self.config.getfloat(
+                "Flows", "IdleTimeoutSeconds", fallback=30.0
+            ),
+            active_timeout=self.config.getfloat(
+                "Flows", "ActiveTimeoutSeconds", fallback=300.0
+            ),
+            max_flows=self.config.getint("Flows", "MaxFlows", fallback=65536),
+        )
+
+    @property
+    def flow_mode(self) -> bool:
+        return self.scoring_granularity == "flow"
+
+    @property
+    def model_features(self) -> List[str]:
+        """Feature columns the detector is trained on for this granularity."""
+        return list(FLOW_FEATURES) if self.flow_mode else list(PacketProcessor.FEATURES)
+
     @staticmethod
     def _parse_log_level(level_str: str) -> int:
         return getattr(logging, str(level_str).upper(), logging.INFO)
@@ -222,27 +462,371 @@ class NetworkMonitor:
         packet_count = int(packet_count)
         if packet_count <= 0:
             raise ValueError("packet_count must be > 0 for training.")
-        self.processor.set_window_size(max(self.processor._window_size, packet_count))
         self.logger.info(
             f"Capturing {packet_count} packets on '{interface}' for training..."
         )
-        sniff(
-            iface=interface,
-            prn=self.processor.process_packet,
-            count=packet_count,
-            store=0,
-        )
-        df = self.processor.get_dataframe()
-        if df.empty:
-            raise RuntimeError("No packets captured for training.")
-        features, _ = self.processor.engineer_features(df)
-        if features.empty:
-            raise RuntimeError("Failed to engineer features from captured packets.")
+        if self.flow_mode:
+            flows: List[FlowRecord] = []
+            self._capture(
+                interface,
+                lambda pkt: flows.extend(self._track_flow(pkt) or []),
+                count=packet_count,
+            )
+            flows.extend(self.flow_table.flush())
+            if not flows:
+                raise RuntimeError("No packets captured for training.")
+            features = flow_features(flows, self.processor.hosts.addresses)
+            self.logger.info("Aggregated %d flows for training", len(flows))
+        else:
+            # Featurize on arrival, as during monitoring: a time-based window
+            # would otherwise expire the start of a slow capture.
+            rows = FeatureReservoir(
+                packet_count, self.model_features, self.detector.random_state
+            )
+
+            def _collect(pkt) -> None:
+                feat_vec = self.processor.process_and_featurize(pkt)
+                if feat_vec is not None:
+                    rows.add(feat_vec)
+
+            self._capture(interface, _collect, count=packet_count)
+            if not len(rows):
+                raise RuntimeError("No packets captured for training.")
+            features = rows.to_frame()
         self.logger.info("Training Isolation Forest...")
         self.detector.train(features)
         self.detector.save_model(model_path)
         self.logger.info(f"Model trained and saved to: {model_path}")
 
+    def train_from_pcap(self, pcap_path: str, sample_size: int, model_path: str) -> None:
+        """Stream a capture file through the feature pipeline and train on a sample.
+
+        Packets are featurized incrementally, exactly as during monitoring,
+        and a uniform reservoir of `sample_size` rows is kept, so captures
+        larger than memory can be used.
+        """
+        if not os.path.exists(pcap_path):
+            raise FileNotFoundError(f"Capture file does not exist: {pcap_path}")
+        sample_size = int(sample_size)
+        if sample_size <= 0:
+            raise ValueError("packet_count must be > 0 for training.")
+        reservoir = FeatureReservoir(
+            sample_size, self.model_features, self.detector.random_state
+        )
+        self.logger.info(
+            "Streaming '%s' for training (sample of %d rows)...", pcap_path, sample_size
+        )
+        local_ips = self.processor.hosts.addresses
+        frames = 0
+        started = time.perf_counter()
+        for frame in pcap_frames(pcap_path):
+            frames += 1
+            if self.flow_mode:
+                for rec in self._track_flow(frame) or []:
+                    reservoir.add(rec.features(local_ips))
+                continue
+            feat_vec = self.processor.process_and_featurize(frame)
+            if feat_vec is not None:
+                reservoir.add(feat_vec)
+        if self.flow_mode:
+            for rec in self.flow_table.flush():
+                reservoir.add(rec.features(local_ips))
+        elapsed = time.perf_counter() - started
+        if not len(reservoir):
+            raise RuntimeError("No IP packets found in capture for training.")
+        self.logger.info(
+            "Featurized %d frames into %d %s rows in %.2fs (%.0f pps); training on %d",
+            frames,
+            reservoir.seen,
+            self.scoring_granularity,
+            elapsed,
+            frames / max(elapsed, 1e-9),
+            len(reservoir),
+        )
+        self.logger.info("Training Isolation Forest...")
+        self.detector.train(reservoir.to_frame())
+        self.detector.save_model(model_path)
+        self.logger.info(f"Model trained and saved to: {model_path}")
+
+    def train_from_parquet(
+        self,
+        parquet_path: str,
+        sample_size: int,
+        model_path: str,
+        *,
+        batch_rows: int = 65536,
+    ) -> Dict[str, float]:
+        """Train on engineered feature history larger than memory.
+
+        `parquet_path` (a file such as ``Training.RollingParquetPath``, or a
+        directory of ``*.parquet`` files) is read in row-group chunks. Every
+        row updates the scaler through ``partial_fit``, so its mean/variance
+        cover the whole history; a uniform reservoir of `sample_size` rows
+        is what the forest is fitted on.
+        """
+        from sklearn.preprocessing import StandardScaler
+
+        if self.flow_mode:
+            raise ValueError(
+                "Parquet history holds packet features; train flow models with --pcap"
+            )
+        sample_size = int(sample_size)
+        if sample_size <= 0:
+            raise ValueError("packet_count must be > 0 for training.")
+        columns = self.model_features
+        reservoir = FeatureReservoir(sample_size, columns, self.detector.random_state)
+        # Only the forest standardizes its inputs
+        scaler = StandardScaler() if self.detector.engine == "iforest" else None
+        self.logger.info(
+            "Streaming '%s' for training (sample of %d rows)...", parquet_path, sample_size
+        )
+        started = time.perf_counter()
+        chunks = 0
+        for rows in iter_parquet_batches(parquet_path, columns, batch_rows):
+            if scaler is not None:
+                scaler.partial_fit(rows)
+            reservoir.add_batch(rows)
+            chunks += 1
+        read_s = time.perf_counter() - started
+        if not len(reservoir):
+            raise RuntimeError(f"No feature rows found in: {parquet_path}")
+        fit_started = time.perf_counter()
+        if scaler is not None:
+            self.detector.train(reservoir.to_frame(), scaler=scaler)
+        else:
+            self.detector.train(reservoir.to_frame())
+        fit_s = time.perf_counter() - fit_started
+        self.detector.save_model(model_path)
+        stats = {
+            "rows": float(reservoir.seen),
+            "chunks": float(chunks),
+            "sample": float(len(reservoir)),
+            "read_seconds": read_s,
+            "fit_seconds": fit_s,
+            "rows_per_sec": reservoir.seen / max(read_s, 1e-9),
+            "peak_rss_mb": peak_rss_bytes() / 2**20,
+        }
+        self.logger.info(
+            "Read %d rows in %d chunks in %.2fs (%.0f rows/s); fit on %d rows in %.2fs "
+            "(n_jobs=%s); peak RSS %.0f MiB",
+            reservoir.seen,
+            chunks,
+            read_s,
+            stats["rows_per_sec"],
+            len(reservoir),
+            fit_s,
+            getattr(self.detector, "n_jobs", None),
+            stats["peak_rss_mb"],
+        )
+        self.logger.info(f"Model trained and saved to: {model_path}")
+        return stats
+
+    def replay_pcap(
+        self,
+        pcap_path: str,
+        model_path: str,
+        *,
+        realtime: bool = False,
+        speed: float = 1.0,
+    ) -> Dict[str, float]:
+        """Score a capture file through the monitoring pipeline.
+
+        Frames go through the same processor -> detector -> signature path as
+        live traffic (including micro-batching). Returns throughput stats.
+        """
+        if not os.path.exists(pcap_path):
+            raise FileNotFoundError(f"Capture file does not exist: {pcap_path}")
+        self.detector.load_model(model_path)
+        self._check_model_granularity()
+        self.logger.info(
+            "Replaying '%s' with model %s (%s)",
+            pcap_path,
+            model_path,
+            f"real-time x{speed:g}" if realtime else "as fast as possible",
+        )
+        frames = 0
+        scored_before = self._packet_counter
+        # Only a paced replay can fall behind its own clock; a flat-out one
+        # is meant to score everything.
+        sampling = self.sampler.enabled
+        self.sampler.enabled = sampling and realtime
+        self.sampler.reset()
+        started = time.perf_counter()
+        if self.shard_workers > 0:
+            pipeline = self._sharded_pipeline(model_path)
+            with pipeline:
+                try:
+                    for frame in pcap_frames(pcap_path, realtime=realtime, speed=speed):
+                        frames += 1
+                        pipeline.submit(frame)
+                except KeyboardInterrupt:
+                    self.logger.info("Replay stopped by user.")
+            self._packet_counter += pipeline.scored
+        else:
+            try:
+                for frame in pcap_frames(pcap_path, realtime=realtime, speed=speed):
+                    frames += 1
+                    self._on_packet(frame)
+            except KeyboardInterrupt:
+                self.logger.info("Replay stopped by user.")
+            finally:
+                self._flush_batch()
+                self._flush_flows()
+                self._wait_retrain()
+                self._report_stats()
+        self.sampler.enabled = sampling
+        elapsed = time.perf_counter() - started
+        stats = {
+            "frames": frames,
+            "packets": self._packet_counter - scored_before,
+            "seconds": elapsed,
+            "pps": frames / max(elapsed, 1e-9),
+        }
+        self.logger.info(
+            "Replay finished: frames=%d packets=%d seconds=%.3f pps=%.0f",
+            stats["frames"],
+            stats["packets"],
+            stats["seconds"],
+            stats["pps"],
+        )
+        return stats
+
+    def _open_ring(self, interface: str) -> AfPacketRing:
+        return AfPacketRing(
+            interface,
+            block_size=self.config.getint("Capture", "RingBlockSizeKB", fallback=1024)
+            * 1024,
+            block_count=self.config.getint("Capture", "RingBlocks", fallback=64),
+            block_timeout_ms=self.config.getint(
+                "Capture", "RingBlockTimeoutMs", fallback=64
+            ),
+        )
+
+    def _publish_stats(self, component: str, stats: Dict[str, Any]) -> None:
+        """Store the latest counters for the API (`/api/runtime`)."""
+        try:
+            webdb.set_runtime_stats(component, stats)
+        except Exception:
+            self.logger.debug("webdb.set_runtime_stats failed", exc_info=True)
+
+    def _log_capture_stats(self, stats: Dict[str, int]) -> None:
+        previous = self._capture_stats.get("drops", 0)
+        self._capture_stats = dict(stats)
+        self._publish_stats("capture", self._capture_stats)
+        log = self.logger.warning if stats.get("drops", 0) > previous else self.logger.info
+        log(
+            "Capture stats (afpacket): packets=%d drops=%d freeze_q=%d",
+            stats.get("packets", 0),
+            stats.get("drops", 0),
+            stats.get("freeze_q_cnt", 0),
+        )
+
+    def _report_stats(self) -> None:
+        """Log and publish window (and ingest queue) counters."""
+        self._log_window_stats()
+        if self.sampler.enabled:
+            self._publish_stats("sampling", self.sampler.stats())
+        if self.score_cache is not None:
+            self._publish_stats("score_cache", self.score_cache.stats())
+        self._publish_stats(self._thresholds_component, self.threshold_stats())
+        if self.detector.streaming:
+            self._publish_stats("detector", self.detector.stats())
+        elif self.online_retrain_interval > 0:
+            self._publish_stats("retrain", self.retrain_stats())
+        if self.ingest is not None:
+            self._log_ingest_stats(self.ingest.stats())
+
+    def _log_ingest_stats(self, stats: Dict[str, Any]) -> None:
+        previous = self._ingest_stats.get("dropped", 0)
+        self._ingest_stats = stats
+        self._publish_stats("ingest", stats)
+        log = self.logger.warning if stats["dropped"] > previous else self.logger.info
+        log(
+            "Ingest stats (%s): offered=%d processed=%d dropped=%d depth=%d/%d high_water=%d",
+            stats["policy"],
+            stats["offered"],
+            stats["processed"],
+            stats["dropped"],
+            stats["depth"],
+            stats["maxsize"],
+            stats["high_water"],
+        )
+
+    def _log_window_stats(self) -> None:
+        stats = self.processor.window_stats()
+        previous = self._window_stats.get("evicted", 0)
+        self._window_stats = stats
+        self._publish_stats("window", stats)
+        # In time mode an eviction means the byte budget cut the horizon short
+        truncated = self.processor.window.horizon is not None and stats["evicted"] > previous
+        log = self.logger.warning if truncated else self.logger.info
+        log(
+            "Window stats: rows=%d span=%.1fs capacity=%d bytes=%d/%d expired=%d evicted=%d",
+            stats["rows"],
+            stats["span_seconds"],
+            stats["capacity"],
+            stats["bytes"],
+            stats["max_bytes"],
+            stats["expired"],
+            stats["evicted"],
+        )
+
+    @staticmethod
+    def _trusted_hosts() -> List[str]:
+        return [str(r.get("ip") or "") for r in webdb.list_trusted_ips()]
+
+    def _capture(self, interface: str, handler, count: int = 0) -> None:
+        """Feed packets from `interface` to `handler` (count=0: until stopped)."""
+        bpf = self.capture_filter
+        if bpf.active:
+            # Compile/validate before opening anything; raises ValueError
+            bpf.build()
+            self.logger.info("Capture filter (kernel BPF): %s", bpf.describe())
+            bpf.start()
+        try:
+            self._capture_from(interface, handler, count)
+        finally:
+            bpf.stop()
+
+    def _capture_from(self, interface: str, handler, count: int) -> None:
+        bpf = self.capture_filter
+        if self.capture_backend == "afpacket":
+            ring = self._open_ring(interface)
+            self.logger.info(
+                "AF_PACKET ring: %d blocks x %d KiB",
+                ring.block_count,
+                ring.block_size // 1024,
+            )
+            next_stats = time.monotonic() + _CAPTURE_STATS_EVERY
+            try:
+                bpf.attach(ring.socket)
+                # Handlers copy header fields out synchronously, so frames can
+                # stay zero-copy views into the ring.
+                for frame in ring.frames(count, copy=False):
+                    handler(frame)
+                    if time.monotonic() >= next_stats:
+                        next_stats += _CAPTURE_STATS_EVERY
+                        self._log_capture_stats(ring.stats())
+            finally:
+                bpf.detach(ring.socket)
+                self._log_capture_stats(ring.stats())
+                ring.close()
+        elif self.capture_parser == "fast":
+            for frame in l2listen_frames(interface, count, on_open=bpf.attach):
+                handler(frame)
+        elif bpf.active:
+            from scapy.all import conf  # type: ignore
+
+            sock = conf.L2listen(iface=interface)
+            try:
+                bpf.attach(sock.ins)
+                sniff(opened_socket=sock, prn=handler, count=count, store=0)
+            finally:
+                bpf.detach(sock.ins)
+                sock.close()
+        else:
+            sniff(iface=interface, prn=handler, count=count, store=0)
+
     def start_monitoring(
         self,
         interface: str,
@@ -256,6 +840,7 @@ class NetworkMonitor:
             self._validate_interface(interface)
         self.detector.load_model(model_path)
         self.logger.info(f"Loaded model: {model_path}")
+        self._check_model_granularity()
         self.firewall_runtime_enabled = bool(firewall_blocking) and bool(
             self.firewall_capabilities.get("supported")
         )
@@ -284,12 +869,22 @@ class NetworkMonitor:
                 info.get("feature_count", 0),
                 str(info.get("feature_checksum", ""))[:12] + "…",
             )
-            self.logger.info(
-                "IF params: contamination=%s n_estimators=%s random_state=%s",
-                params.get("contamination"),
-                params.get("n_estimators"),
-                params.get("random_state"),
-            )
+            if info.get("engine") == "hst":
+                self.logger.info(
+                    "HST params: contamination=%s trees=%s depth=%s window_size=%s random_state=%s",
+                    params.get("contamination"),
+                    params.get("n_estimators"),
+                    params.get("depth"),
+                    params.get("window_size"),
+                    params.get("random_state"),
+                )
+            else:
+                self.logger.info(
+                    "IF params: contamination=%s n_estimators=%s random_state=%s",
+                    params.get("contamination"),
+                    params.get("n_estimators"),
+                    params.get("random_state"),
+                )
 
             fnames = cast(List[str], info.get("feature_names", []) or [])
 
@@ -304,231 +899,843 @@ class NetworkMonitor:
             self._thr_med,
             self.online_retrain_interval,
         )
-        if self._simulate_mode:
+        if self.score_quantiles is not None:
             self.logger.info(
-                "Starting synthetic monitoring loop (interface hint: %s)", interface
+                "Adaptive alert thresholds: high/medium at the %s percentiles of the last %d scores",
+                "/".join(f"{p * 100:g}" for p in self.score_quantiles.probs),
+                self.score_quantiles.window,
+            )
+        if self.shard_workers > 0 and not self._simulate_mode:
+            self.logger.info(
+                f"Starting sharded monitoring on '{interface}' with "
+                f"{self.shard_workers} workers. Press Ctrl+C to stop."
+            )
+            pipeline = self._sharded_pipeline(model_path)
+            with pipeline:
+                try:
+                    self._capture(interface, pipeline.submit)
+                except KeyboardInterrupt:
+                    self.logger.info("Monitoring stopped by user.")
+            self._packet_counter += pipeline.scored
+            return
+        stop_flusher = threading.Event()
+        self._start_background(stop_flusher)
+        self._start_model_watch(model_path, stop_flusher)
+        self.hosts.start()
+        try:
+            if self._simulate_mode:
+                self.logger.info(
+                    "Starting synthetic monitoring loop (interface hint: %s)", interface
+                )
+                try:
+                    self._simulate_loop()
+                except KeyboardInterrupt:
+                    self.logger.info("Simulation stopped by user.")
+                return
+            self.logger.info(
+                f"Starting live monitoring on '{interface}'. Press Ctrl+C to stop."
             )
             try:
-                self._simulate_loop()
+                if self.ingest_queue_size > 0:
+                    self._capture_queued(interface)
+                else:
+                    self._capture(interface, self._on_packet)
             except KeyboardInterrupt:
-                self.logger.info("Simulation stopped by user.")
+                self.logger.info("Monitoring stopped by user.")
+        finally:
+            stop_flusher.set()
+            self.hosts.stop()
+            self._flush_batch()
+            self._flush_flows()
+            self._wait_retrain()
+            self._save_streaming_model(model_path)
+            self._report_stats()
+
+    def _save_streaming_model(self, model_path: str) -> None:
+        """Keep what a streaming engine learned across restarts."""
+        if not self.detector.streaming:
             return
+        try:
+            self.detector.save_model(model_path)
+            self.logger.info("Saved streaming model state: %s", model_path)
+        except Exception as e:
+            self.logger.error(f"Saving streaming model failed: {e}", exc_info=False)
+
+    def _capture_queued(self, interface: str) -> None:
+        """Capture on this thread; analyse on another via a bounded queue.
+
+        Only header fields are queued (frames may be views into a capture
+        ring), so the capture thread does no more than parse and enqueue.
+        """
+        queue = self.ingest = IngestQueue(self.ingest_queue_size, self.ingest_policy)
         self.logger.info(
-            f"Starting live monitoring on '{interface}'. Press Ctrl+C to stop."
+            "Ingest queue: size=%d policy=%s", queue.maxsize, queue.policy
         )
-        try:
-            sniff(iface=interface, prn=self._analyze_packet, store=0)
-        except KeyboardInterrupt:
-            self.logger.info("Monitoring stopped by user.")
+        worker = threading.Thread(
+            target=self._ingest_worker, args=(queue,), daemon=True, name="ingest"
+        )
+        worker.start()
 
-    def _analyze_packet(self, packet) -> None:
-        """Callback for each captured packet during live monitoring."""
-        try:
-            self.processor.process_packet(packet)
-            window_df = self.processor.get_dataframe()
-            if window_df.empty:
+        def _enqueue(packet) -> None:
+            try:
+                parsed = PacketProcessor.extract(packet)
+            except Exception:
+                self.logger.debug("header extraction failed", exc_info=True)
                 return
-            features_df, processed_df = self.processor.engineer_features(window_df)
-            if features_df.empty:
+            if parsed is not None:
+                queue.put(parsed)
+
+        try:
+            self._capture(interface, _enqueue)
+        finally:
+            queue.close()
+            worker.join()
+
+    def _ingest_worker(self, queue: IngestQueue) -> None:
+        """Drain `queue` through the normal analysis path until it is closed."""
+        while True:
+            packet = queue.get()
+            if packet is None:
                 return
+            try:
+                self._on_packet(packet)
+            finally:
+                queue.task_done()
 
-            # Persist engineered rows to a rolling Parquet file (best effort)
-            if self.save_rolling and not processed_df.empty:
-                os.makedirs(os.path.dirname(self.rolling_path) or ".", exist_ok=True)
-                try:
-                    # Prefer append (supported by some pandas/pyarrow combos)
-                    processed_df.to_parquet(
-                        self.rolling_path,
-                        engine="pyarrow",
-                        append=True,  # type: ignore[arg-type]
-                    )
-                except Exception:
-                    # Fallback: overwrite if append isn't supported
-                    try:
-                        processed_df.to_parquet(self.rolling_path, engine="pyarrow")
-                    except Exception:
-                        pass
-
-            # --- NEW: record devices seen on the network (private IPs only) ---
+    def _persist_rolling(self) -> None:
+        """Write the engineered window to the rolling Parquet file (best effort).
+
+        Runs once per window's worth of packets rather than per packet, so the
+        file still holds the most recent window at amortized O(1) cost.
+        """
+        if not self.save_rolling:
+            return
+        self._rolling_pending += 1
+        if self._rolling_pending < self.processor._window_size:
+            return
+        self._rolling_pending = 0
+        _, processed_df = self.processor.engineer_features(
+            self.processor.get_dataframe()
+        )
+        if processed_df.empty:
+            return
+        os.makedirs(os.path.dirname(self.rolling_path) or ".", exist_ok=True)
+        try:
+            # Prefer append (supported by some pandas/pyarrow combos)
+            processed_df.to_parquet(
+                self.rolling_path,
+                engine="pyarrow",
+                append=True,  # type: ignore[arg-type]
+            )
+        except Exception:
+            # Fallback: overwrite if append isn't supported
             try:
-                last_row_dev = processed_df.tail(1).iloc[0]
-                sip = str(last_row_dev.get("src_ip"))
-                dip = str(last_row_dev.get("dest_ip"))
-
-            # --- Works for all valid IPs    
-                seen_ips = []
-                for candidate in (sip, dip):
-                    if not candidate:
-                        continue
-                    try:
-                        ipaddress.ip_address(candidate)
-                    except ValueError:
-                        continue
-                    seen_ips.append(candidate)
-                for candidate in dict.fromkeys(seen_ips):
-                    webdb.record_device(candidate)
+                processed_df.to_parquet(self.rolling_path, engine="pyarrow")
+            except Exception:
+                pass
+
+    def _ingest(self, packet) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+        """Featurize one packet; returns (feature_vector, engineered_row)."""
+        feat_vec = self.processor.process_and_featurize(packet)
+        if feat_vec is None:
+            return None
+        last_row = self.processor.last_processed_row()
+        if self.online_retrain_interval > 0 and not self.detector.streaming:
+            self._recent.add(feat_vec)
+        self._persist_rolling()
+        return feat_vec, last_row
+
+    def _sample(self, row: Dict[str, Any]) -> bool:
+        """Track processing lag from `row`; True when the model should score it."""
+        sampler = self.sampler
+        if sampler.observe(row["timestamp"]):
+            log = self.logger.warning if sampler.sampling else self.logger.info
+            log(
+                "Adaptive sampling: scoring %.1f%% of flows (lag=%.2fs target=%.2fs)",
+                sampler.rate * 100.0,
+                sampler.lag,
+                sampler.target_lag,
+            )
+        return sampler.keep_row(row)
 
+    def _record_devices(self, rows: List[Dict[str, Any]]) -> None:
+        """Record devices seen on the network (all valid IPs)."""
+        try:
+            # Rows carry integer IPs, so they are valid by construction;
+            # dedupe before rendering text for the sink.
+            seen: Dict[int, None] = {}
+            for row in rows:
+                seen[row["src_ip"]] = None
+                seen[row["dest_ip"]] = None
             # --- Works for private IPs only
             #                if sip and ipaddress.ip_address(sip).is_private:
             #                    webdb.record_device(sip)
-            #                if dip and ipaddress.ip_address(dip).is_private:
-            #                    webdb.record_device(dip)
+            self._sink_devices([_ip_text(ip) for ip in seen])
+        except Exception:
+            self.logger.debug("record_device failed", exc_info=True)
 
+    def _sink_devices(self, ips: List[str]) -> None:
+        """Upsert last-seen for device IPs (already rendered as text)."""
+        if not ips:
+            return
+        try:
+            webdb.record_devices(ips)
+        except Exception:
+            self.logger.debug("webdb.record_devices failed", exc_info=True)
 
-            except Exception:
-                self.logger.debug("record_device failed", exc_info=True)
+    def _sink_alerts(self, alerts: List[Dict[str, Any]]) -> None:
+        """Write anomaly/signature alerts to WebDB so the GUI can see them."""
+        if not alerts:
+            return
+        try:
+            webdb.insert_alerts(alerts)
+        except Exception:
+            self.logger.debug("webdb.insert_alerts failed", exc_info=True)
+
+    def _on_packet(self, packet) -> None:
+        """Capture callback: per-packet, micro-batch or flow-level analysis."""
+        now = time.monotonic()
+        if now >= self._next_stats:
+            self._next_stats = now + _CAPTURE_STATS_EVERY
+            self._report_stats()
+        if self.flow_mode:
+            self._analyze_flow(packet)
+        elif self.batch_size > 1:
+            self._analyze_batched(packet)
+        else:
+            self._analyze_packet(packet)
+
+    def _score(
+        self, X: np.ndarray, columns: Sequence[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """``detector.score_batch`` (through the score cache, if enabled); a
+        streaming engine then learns the rows it just scored (test-then-train)."""
+        detector = self.detector
+        if detector.streaming:
+            scores, flags = detector.score_batch(X, columns)
+            detector.learn(X, columns)
+        elif self.score_cache is not None:
+            scores, flags = self.score_cache.score(detector, X, columns)
+        else:
+            scores, flags = detector.score_batch(X, columns)
+        if self.score_quantiles is not None:
+            self.score_quantiles.update(scores)
+        return scores, flags
 
-            last_feat = features_df.tail(1)
-            pred = self.detector.predict(last_feat)[0]
-            self._packet_counter += 1
-            if pred == "Anomaly":
-                # Compute feature-like context for logging (robust even if processor hasn't added them yet)
-                last_row = processed_df.tail(1).iloc[0]
+    def _analyze_packet(self, packet) -> None:
+        """Callback for each captured packet during live monitoring."""
+        try:
+            ingested = self._ingest(packet)
+            if ingested is None:
+                return
+            feat_vec, last_row = ingested
+            self._record_devices([last_row])
 
-                # 1) decision score (more negative => more anomalous)
-                try:
-                    score = float(self.detector.decision_scores(last_feat)[0])
-                except Exception:
-                    score = float("nan")
+            alerts: List[Dict[str, Any]] = []
+            if self._sample(last_row):
+                # One forest pass: decision score (more negative => more
+                # anomalous) and the anomaly flag derived from it
+                scores, flags = self._score(feat_vec, self.processor.FEATURES)
+                previous_count = self._packet_counter
+                self._packet_counter += 1
+                if flags[0]:
+                    alerts.append(self._handle_anomaly(last_row, float(scores[0])))
 
-                # 2) ephemeral source port flag (>= 49152)
-                try:
-                    eph = _as_int(last_row.get("sport")) >= 49152
-                except Exception:
-                    eph = False
+                self._maybe_retrain(previous_count)
 
-                # 3) unique destination ports by source in the last 15 seconds
-                try:
-                    cutoff = _as_float(last_row.get("timestamp")) - 15.0
-                    recent = window_df[window_df["timestamp"] >= cutoff]
-                    uniq_d = int(
-                        recent[recent["src_ip"] == last_row["src_ip"]][
-                            "dport"
-                        ].nunique()
-                    )
-                except Exception:
-                    uniq_d = 0
+            # NEW: signature evaluation on the engineered row
+            alerts.extend(self._evaluate_signatures(last_row))
+            self._sink_alerts(alerts)
 
-                # 4) direction: outbound if src_ip is local; fallback to inbound
-                dir_flag = 0  # 0=inbound, 1=outbound
-                try:
-                    if netifaces is not None:
-                        local_ips = set()
-                        for iface in netifaces.interfaces():
-                            addrs = netifaces.ifaddresses(iface).get(
-                                netifaces.AF_INET, []
-                            )
-                            for a in addrs:
-                                ip = a.get("addr")
-                                if ip:
-                                    local_ips.add(str(ip))
-                        dir_flag = 1 if str(last_row["src_ip"]) in local_ips else 0
-                except Exception:
-                    dir_flag = 0
-
-                # New, feature-aligned log line (keep overall shape similar)
-                sev = self._severity_from_score(score) if score == score else "unknown"
-                ts_val = _as_float(last_row.get("timestamp"))
-                src_ip = str(last_row.get("src_ip", ""))
-                dest_ip = str(last_row.get("dest_ip", ""))
-                msg = (
-                    f"ANOMALY: ts={ts_val:.6f} "
-                    f"{src_ip} -> {dest_ip} "
-                    f"proto={_as_int(last_row.get('protocol'))} "
-                    f"size={_as_int(last_row.get('packet_size'))} "
-                    f"dport={_as_int(last_row.get('dport'))} eph_sport={int(eph)} "
-                    f"unique_dports_15s={uniq_d} direction={'out' if dir_flag else 'in'} "
-                    f"score={score:.3f} severity={sev}"
-                )
+        except Exception as e:
+            self.logger.error(f"Error during packet analysis: {e}", exc_info=False)
 
-                self._emit(msg, sev)  # severity-aware logger
+    def _analyze_batched(self, packet) -> None:
+        """Featurize now; score once the batch is full or too old."""
+        try:
+            with self._batch_lock:
+                ingested: Optional[Tuple[Optional[np.ndarray], Dict[str, Any]]]
+                ingested = self._ingest(packet)
+                if ingested is None:
+                    return
+                if not self._sample(ingested[1]):
+                    # Unsampled: signatures and devices only, at flush time
+                    ingested = (None, ingested[1])
+                if not self._batch:
+                    self._batch_started = time.monotonic()
+                self._batch.append(ingested)
+                if len(self._batch) >= self.batch_size or self._batch_expired():
+                    self._flush_batch_locked()
+        except Exception as e:
+            self.logger.error(f"Error during packet analysis: {e}", exc_info=False)
 
-                if self.firewall_runtime_enabled and (sev or "").lower() == "high":
-                    self._maybe_firewall_block(
-                        str(last_row.get("src_ip", "")),
-                        sev,
-                        f"{dest_ip}:{_as_int(last_row.get('dport'))}",
-                    )
+    def _batch_expired(self) -> bool:
+        age_ms = (time.monotonic() - self._batch_started) * 1000.0
+        return bool(self._batch) and age_ms >= self.batch_max_latency_ms
 
-                # NEW: sink anomaly to WebDB so the GUI can see it
-                try:
-                    webdb.insert_alert(
-                        {
-                            "id": str(uuid.uuid4()),
-                            "ts": _iso_utc(_utcnow()),
-                            "src_ip": str(last_row["src_ip"]),
-                            "label": (
-                                f"{dest_ip}:{_as_int(last_row.get('dport'))} "
-                                f"score={score:.3f}"
-                            ),
-                            "severity": str(sev).upper(),  # LOW/MEDIUM/HIGH
-                            "kind": "ANOMALY",
-                        }
-                    )
-                except Exception:
-                    self.logger.debug(
-                        "webdb.insert_alert failed (anomaly)", exc_info=True
-                    )
+    def _flush_batch(self) -> None:
+        with self._batch_lock:
+            self._flush_batch_locked()
 
-                print(
-                    "\n--- ANOMALY DETECTED ---\n"
-                    + msg
-                    + "\n------------------------\n"
+    def _flush_batch_locked(self) -> None:
+        """Score the pending batch with one model call and sink results in bulk."""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        try:
+            self._record_devices([row for _, row in batch])
+            vectors = [vec for vec, _ in batch if vec is not None]
+            scores, flags = (
+                self._score(np.vstack(vectors), self.processor.FEATURES)
+                if vectors
+                else (np.empty(0), np.empty(0, dtype=bool))
+            )
+            previous_count = self._packet_counter
+            self._packet_counter += len(vectors)
+            results = zip(scores, flags, strict=True)
+            alerts: List[Dict[str, Any]] = []
+            for vec, row in batch:
+                if vec is not None:
+                    score, flag = next(results)
+                    if flag:
+                        alerts.append(self._handle_anomaly(row, float(score)))
+                alerts.extend(self._evaluate_signatures(row))
+            self._sink_alerts(alerts)
+            self._maybe_retrain(previous_count)
+        except Exception as e:
+            self.logger.error(f"Error during batch analysis: {e}", exc_info=False)
+
+    def _batch_flusher(self, stop: threading.Event) -> None:
+        """Bound added latency when traffic is too sparse to fill a batch."""
+        period = max(self.batch_max_latency_ms / 2000.0, 0.001)
+        while not stop.wait(period):
+            with self._batch_lock:
+                if self._batch_expired():
+                    self._flush_batch_locked()
+
+    def _start_background(self, stop: threading.Event) -> None:
+        """Start the flow sweeper or batch flusher thread, if the mode needs one."""
+        if self.flow_mode:
+            self.logger.info(
+                "Flow scoring: idle_timeout=%.1fs active_timeout=%.1fs max_flows=%d",
+                self.flow_table.idle_timeout,
+                self.flow_table.active_timeout,
+                self.flow_table.max_flows,
+            )
+            if self.online_retrain_interval > 0:
+                self.logger.warning(
+                    "Online retraining uses packet features; disabled for flow scoring"
                 )
+            threading.Thread(
+                target=self._flow_sweeper,
+                args=(stop,),
+                daemon=True,
+                name="flow-sweeper",
+            ).start()
+        elif self.batch_size > 1:
+            self.logger.info(
+                "Micro-batch mode: batch_size=%d max_latency_ms=%.1f",
+                self.batch_size,
+                self.batch_max_latency_ms,
+            )
+            threading.Thread(
+                target=self._batch_flusher,
+                args=(stop,),
+                daemon=True,
+                name="batch-flusher",
+            ).start()
+
+    def _sharded_pipeline(self, model_path: str):
+        """Build the multi-process pipeline configured under [Sharding]."""
+        from sharded import ShardedPipeline, parse_cpu_list
+
+        capture_cpu = self.config.getint("Sharding", "CaptureCpu", fallback=-1)
+        return ShardedPipeline(
+            self.config,
+            model_path,
+            self.shard_workers,
+            cpus=parse_cpu_list(self.config.get("Sharding", "CpuList", fallback="")),
+            capture_cpu=capture_cpu if capture_cpu >= 0 else None,
+            batch_size=self.config.getint("Sharding", "BatchSize", fallback=256),
+            max_latency_ms=self.batch_max_latency_ms,
+            queue_batches=self.config.getint("Sharding", "QueueBatches", fallback=64),
+            firewall_blocking=self.firewall_runtime_enabled,
+            sampling=self.sampler.enabled,
+            by_flow=self.flow_mode,
+            on_alerts=self._sink_alerts,
+            on_devices=self._sink_devices,
+            logger=self.logger,
+        )
 
-            if self.online_retrain_interval > 0 and (
-                self._packet_counter % self.online_retrain_interval == 0
-            ):
-                if len(window_df) >= 50:
-                    self.logger.info("Online retraining on current window...")
-                    win_features, _ = self.processor.engineer_features(window_df)
-                    if not win_features.empty:
-                        self.detector.train(win_features)
-                        model_path = self.config.get(
-                            "DEFAULT", "ModelPath", fallback="models/iforest.joblib"
-                        )
-                        self.detector.save_model(model_path)
-                        self.logger.info("Online retraining complete and model saved.")
-
-            # NEW: signature evaluation (best after we have processed_df/window_df)
-            if self.sig_engine is not None and not processed_df.empty:
-                last_row_dict = processed_df.tail(1).iloc[0].to_dict()
-                for hit in self.sig_engine.evaluate(last_row_dict, window_df):
-                    s_msg = (
-                        f"SIGNATURE: {hit.name} severity={hit.severity} | "
-                        f"{last_row_dict.get('src_ip')} -> {last_row_dict.get('dest_ip')} "
-                        f'dport={_as_int(last_row_dict.get("dport"))} desc="{hit.description}"'
-                    )
-                    self._emit(s_msg, hit.severity)
-
-                    # NEW: sink signature hit to WebDB (also visible in Log History)
-                    try:
-                        webdb.insert_alert(
-                            {
-                                "id": str(uuid.uuid4()),
-                                "ts": _iso_utc(_utcnow()),
-                                "src_ip": str(last_row_dict.get("src_ip")),
-                                "label": (
-                                    f"{hit.name} {last_row_dict.get('dest_ip')}:"
-                                    f"{_as_int(last_row_dict.get('dport'))}"
-                                ),
-                                "severity": str(hit.severity or "").upper(),
-                                "kind": "SIGNATURE",
-                            }
-                        )
-                    except Exception:
-                        self.logger.debug(
-                            "webdb.insert_alert failed (signature)", exc_info=True
-                        )
+    def _check_model_granularity(self) -> None:
+        names = list(self.detector.feature_names or [])
+        if names and names != self.model_features:
+            self.logger.warning(
+                "Model features %s do not match %s scoring (%s); retrain with "
+                "Monitoring.ScoringGranularity=%s",
+                names,
+                self.scoring_granularity,
+                self.model_features,
+                self.scoring_granularity,
+            )
 
+    def _track_flow(self, packet) -> Optional[List[FlowRecord]]:
+        """Featurize `packet`, account it in the flow table and return the
+        flows that finished; None when the packet was not ingested."""
+        feat_vec = self.processor.process_and_featurize(packet)
+        if feat_vec is None:
+            return None
+        row = self.processor.last_processed_row()
+        if not self._sample(row):
+            return []
+        return self.flow_table.update(
+            row["timestamp"],
+            row["src_ip"],
+            row["dest_ip"],
+            row["protocol"],
+            row["packet_size"],
+            row["sport"],
+            row["dport"],
+        )
+
+    def _analyze_flow(self, packet) -> None:
+        """Signatures per packet; the model scores flows as they are exported."""
+        try:
+            with self._batch_lock:
+                done = self._track_flow(packet)
+                if done is None:
+                    return
+                self._persist_rolling()
+                alerts = self._score_flows(done)
+                alerts.extend(
+                    self._evaluate_signatures(self.processor.last_processed_row())
+                )
+                self._sink_alerts(alerts)
         except Exception as e:
-            self.logger.error(f"Error during packet analysis: {e}", exc_info=False)
+            self.logger.error(f"Error during flow analysis: {e}", exc_info=False)
+
+    def _score_flows(self, flows: List[FlowRecord]) -> List[Dict[str, Any]]:
+        """Score exported flows with one model call and return their alerts."""
+        if not flows:
+            return []
+        self._record_devices(
+            [{"src_ip": rec.src, "dest_ip": rec.dst} for rec in flows]
+        )
+        feats = flow_features(flows, self.processor.hosts.addresses)
+        scores, flags = self._score(feats.to_numpy(), FLOW_FEATURES)
+        self._packet_counter += len(flows)
+        return [
+            self._handle_flow_anomaly(rec, float(score))
+            for rec, score, flag in zip(flows, scores, flags, strict=True)
+            if flag
+        ]
+
+    def _flush_flows(self) -> None:
+        if not self.flow_mode:
+            return
+        try:
+            with self._batch_lock:
+                self._sink_alerts(self._score_flows(self.flow_table.flush()))
+        except Exception as e:
+            self.logger.error(f"Error during flow analysis: {e}", exc_info=False)
+
+    def _flow_sweeper(self, stop: threading.Event) -> None:
+        """Export idle flows when traffic is too sparse to expire them."""
+        period = min(max(self.flow_table.idle_timeout / 4.0, 0.1), 1.0)
+        while not stop.wait(period):
+            try:
+                with self._batch_lock:
+                    done = self.flow_table.expire(time.time())
+                    self._sink_alerts(self._score_flows(done))
+            except Exception as e:
+                self.logger.error(f"Error during flow analysis: {e}", exc_info=False)
+
+    def _handle_flow_anomaly(self, rec: FlowRecord, score: float) -> Dict[str, Any]:
+        """Log/print one anomalous flow, apply auto-blocking, return its alert."""
+        sev = self._severity_from_score(score) if score == score else "unknown"
+        src_ip = _ip_text(rec.src)
+        dest_ip = _ip_text(rec.dst)
+        local = self.processor.hosts.is_local(rec.src)
+        msg = (
+            f"ANOMALY: flow ts={rec.first_ts:.6f} "
+            f"{src_ip}:{rec.sport} -> {dest_ip}:{rec.dport} "
+            f"proto={rec.protocol} packets={rec.packets} bytes={rec.bytes} "
+            f"duration={rec.duration:.3f} end={rec.reason} "
+            f"direction={'out' if local else 'in'} "
+            f"score={score:.3f} severity={sev}"
+        )
+        self._emit(msg, sev)
+
+        if self.firewall_runtime_enabled and (sev or "").lower() == "high":
+            self._maybe_firewall_block(rec.src, sev, f"flow {dest_ip}:{rec.dport}")
+
+        print("\n--- ANOMALY DETECTED ---\n" + msg + "\n------------------------\n")
+
+        return {
+            "id": str(uuid.uuid4()),
+            "ts": _iso_utc(_utcnow()),
+            "src_ip": src_ip,
+            "label": (
+                f"{dest_ip}:{rec.dport} flow packets={rec.packets} score={score:.3f}"
+            ),
+            "severity": str(sev).upper(),
+            "kind": "ANOMALY",
+            "sample_rate": self.sampler.rate,
+        }
+
+    def _handle_anomaly(self, last_row: Dict[str, Any], score: float) -> Dict[str, Any]:
+        """Log/print one anomaly, apply auto-blocking, and return its alert row."""
+        # ephemeral source port flag (>= 49152)
+        try:
+            eph = _as_int(last_row.get("sport")) >= 49152
+        except Exception:
+            eph = False
+
+        # unique destination ports by source in the last 15 seconds
+        uniq_d = _as_int(last_row.get("unique_dports_15s"))
+        uniq_ips = _as_int(last_row.get("unique_dips_15s"))
+
+        # direction: outbound if src_ip is local; fallback to inbound
+        dir_flag = int(self.processor.hosts.is_local(last_row.get("src_ip", "")))
+
+        # New, feature-aligned log line (keep overall shape similar)
+        sev = self._severity_from_score(score) if score == score else "unknown"
+        ts_val = _as_float(last_row.get("timestamp"))
+        src_ip = _ip_text(last_row.get("src_ip", ""))
+        dest_ip = _ip_text(last_row.get("dest_ip", ""))
+        msg = (
+            f"ANOMALY: ts={ts_val:.6f} "
+            f"{src_ip} -> {dest_ip} "
+            f"proto={_as_int(last_row.get('protocol'))} "
+            f"size={_as_int(last_row.get('packet_size'))} "
+            f"dport={_as_int(last_row.get('dport'))} eph_sport={int(eph)} "
+            f"unique_dports_15s={uniq_d} unique_dips_15s={uniq_ips} direction={'out' if dir_flag else 'in'} "
+            f"score={score:.3f} severity={sev}"
+        )
+
+        self._emit(msg, sev)  # severity-aware logger
+
+        if self.firewall_runtime_enabled and (sev or "").lower() == "high":
+            self._maybe_firewall_block(
+                last_row.get("src_ip"),
+                sev,
+                f"{dest_ip}:{_as_int(last_row.get('dport'))}",
+            )
+
+        print("\n--- ANOMALY DETECTED ---\n" + msg + "\n------------------------\n")
+
+        return {
+            "id": str(uuid.uuid4()),
+            "ts": _iso_utc(_utcnow()),
+            "src_ip": src_ip,
+            "label": f"{dest_ip}:{_as_int(last_row.get('dport'))} score={score:.3f}",
+            "severity": str(sev).upper(),  # LOW/MEDIUM/HIGH
+            "kind": "ANOMALY",
+            "sample_rate": self.sampler.rate,
+        }
+
+    def _maybe_retrain(self, previous_count: int) -> None:
+        """Start a background retrain whenever the packet counter crosses the
+        interval; never waits for training (a busy trainer skips the round)."""
+        interval = self.online_retrain_interval
+        if interval <= 0 or self.detector.streaming:
+            return
+        if previous_count // interval == self._packet_counter // interval:
+            return
+        if len(self._recent) < 50:
+            return
+        if self._retrain_thread is not None and self._retrain_thread.is_alive():
+            self._retrain_stats["skipped"] += 1
+            return
+        self._retrain_thread = threading.Thread(
+            target=self._retrain,
+            args=(self._recent.to_frame(), time.time(), self._packet_counter),
+            daemon=True,
+            name="retrain",
+        )
+        self._retrain_thread.start()
+
+    def _retrain(self, features, snapshot_ts: float, snapshot_count: int) -> None:
+        """Fit a fresh detector on `features`, swap it in, then save it."""
+        stats = self._retrain_stats
+        current = self.detector
+        started = time.perf_counter()
+        try:
+            detector = make_detector(
+                current.engine,
+                contamination=current.contamination,
+                n_estimators=current.n_estimators,
+                random_state=current.random_state,
+            )
+            detector.train(features)
+            # Compile and score one row here so the first scoring call after
+            # the swap is fast
+            detector.warm_up()
+        except Exception as e:
+            stats["failures"] += 1
+            self.logger.error(f"Online retraining failed: {e}", exc_info=False)
+            return
+        if self.detector is not current:
+            # A hot reload swapped in another model meanwhile; it wins
+            stats["superseded"] += 1
+            self.logger.info("Online retraining result dropped: model was reloaded")
+            return
+        # Atomic: scoring threads read self.detector once per call
+        self.detector = detector
+        now = time.time()
+        stats["retrains"] += 1
+        stats["last_rows"] = len(features)
+        stats["last_duration_s"] = time.perf_counter() - started
+        stats["last_staleness_s"] = now - snapshot_ts
+        stats["last_packets_behind"] = self._packet_counter - snapshot_count
+        stats["last_swap_ts"] = now
+        # The bundle being served (--model, hot reload), else the configured one
+        model_path = self._model_path or self.config.get(
+            "DEFAULT", "ModelPath", fallback="models/iforest.joblib"
+        )
+        try:
+            detector.save_model(model_path)
+            if model_path == self._model_path:
+                # Our own save: not a new bundle for the watcher to reload
+                self._note_model_loaded(model_path)
+        except Exception as e:
+            stats["failures"] += 1
+            self.logger.error(f"Saving retrained model failed: {e}", exc_info=False)
+        self.logger.info(
+            "Online retraining: rows=%d train=%.3fs staleness=%.3fs packets_behind=%d saved=%s",
+            stats["last_rows"],
+            stats["last_duration_s"],
+            stats["last_staleness_s"],
+            stats["last_packets_behind"],
+            model_path,
+        )
+        self._publish_stats("retrain", self.retrain_stats())
+
+    @staticmethod
+    def _bundle_signature(path: str) -> Tuple:
+        """(mtime, size, inode) of the bundle and its metadata sidecar."""
+        sig: List[Optional[Tuple[int, int, int]]] = []
+        for name in (path, path + META_SUFFIX):
+            try:
+                st = os.stat(name)
+                sig.append((st.st_mtime_ns, st.st_size, st.st_ino))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def _note_model_loaded(self, path: str) -> None:
+        """Remember the bundle now scoring and publish its identity."""
+        self._model_path = path
+        self._model_signature = self._bundle_signature(path)
+        info = self.detector.bundle_metadata()
+        self._model_stats.update(
+            path=path,
+            engine=info.get("engine"),
+            trained_at=info.get("trained_at"),
+            feature_checksum=info.get("feature_checksum"),
+            loaded_ts=time.time(),
+        )
+        self._publish_stats(self._model_component, self.model_stats())
+
+    def model_stats(self) -> Dict[str, Any]:
+        return dict(self._model_stats)
+
+    def _validate_bundle(self, detector) -> None:
+        """Reject a bundle whose features are not the ones this monitor scores."""
+        names = list(detector.feature_names or [])
+        checksum = feature_checksum(names)
+        stored = detector.meta.get("feature_checksum") or checksum
+        if stored != checksum:
+            raise ValueError("bundle feature_checksum does not match its feature names")
+        if checksum != feature_checksum(self.model_features):
+            raise ValueError(
+                f"bundle features {names} do not match {self.scoring_granularity} "
+                f"scoring features {self.model_features}"
+            )
+
+    def reload_model(self, path: Optional[str] = None, reason: str = "manual") -> bool:
+        """Load, validate and warm up the bundle at `path` (default: the one
+        being watched), then swap it in with one assignment, so scoring never
+        pauses. On any failure the current model stays in place."""
+        path = path or self._model_path
+        stats = self._model_stats
+        with self._reload_lock:
+            current = self.detector
+            started = time.perf_counter()
+            try:
+                if not path:
+                    raise ValueError("no model path to reload")
+                detector = make_detector(
+                    current.engine,
+                    contamination=current.contamination,
+                    n_estimators=current.n_estimators,
+                    random_state=current.random_state,
+                )
+                detector.load_model(path)
+                self._validate_bundle(detector)
+                detector.warm_up()
+            except Exception as e:
+                stats["failures"] += 1
+                stats["last_error"] = f"{type(e).__name__}: {e}"
+                self.logger.error(
+                    "Model reload (%s) from %s failed, keeping the current model: %s",
+                    reason,
+                    path,
+                    e,
+                )
+                self._publish_stats(self._model_component, self.model_stats())
+                return False
+            # Atomic: scoring threads read self.detector once per call
+            self.detector = detector
+            stats["reloads"] += 1
+            stats["last_reload_ts"] = time.time()
+            stats["last_reload_reason"] = reason
+            stats["last_reload_ms"] = (time.perf_counter() - started) * 1000.0
+            stats["last_error"] = None
+            self._note_model_loaded(path)
+        self.logger.info(
+            "Model reloaded (%s): path=%s trained_at=%s checksum=%s load+warmup=%.1fms",
+            reason,
+            path,
+            stats["trained_at"],
+            str(stats["feature_checksum"])[:12] + "…",
+            stats["last_reload_ms"],
+        )
+        return True
+
+    def _pending_reload(self) -> Optional[str]:
+        """Id of the latest API reload request, if any."""
+        try:
+            command = webdb.get_command("model_reload")
+        except Exception:
+            self.logger.debug("webdb.get_command failed", exc_info=True)
+            return None
+        return command["id"] if command else None
+
+    def _start_model_watch(self, model_path: str, stop: threading.Event) -> None:
+        """Track `model_path` and start the reload watcher (if enabled)."""
+        self._note_model_loaded(model_path)
+        # Requests made before this run started are not replayed
+        self._reload_command = self._pending_reload()
+        if self.model_watch_seconds <= 0:
+            return
+        threading.Thread(
+            target=self._model_watcher, args=(stop,), daemon=True, name="model-watch"
+        ).start()
+
+    def _model_watcher(self, stop: threading.Event) -> None:
+        """Reload on API requests, and when the bundle on disk changes and
+        then stays unchanged for one poll (so a file still being copied is
+        never read)."""
+        pending: Optional[Tuple] = None
+        while not stop.wait(self.model_watch_seconds):
+            try:
+                command = self._pending_reload()
+                if command is not None and command != self._reload_command:
+                    self._reload_command = command
+                    pending = None
+                    self.reload_model(reason="api")
+                    continue
+                if self._model_path is None:
+                    continue
+                sig = self._bundle_signature(self._model_path)
+                if sig == self._model_signature:
+                    pending = None
+                elif sig != pending:
+                    pending = sig
+                else:
+                    # Even if it fails: retry only once the file changes again
+                    self._model_signature = sig
+                    pending = None
+                    self.reload_model(reason="file")
+            except Exception:
+                self.logger.debug("model watch failed", exc_info=True)
+
+    def retrain_stats(self) -> Dict[str, Any]:
+        stats = dict(self._retrain_stats)
+        stats["running"] = bool(
+            self._retrain_thread is not None and self._retrain_thread.is_alive()
+        )
+        swap = stats["last_swap_ts"]
+        stats["model_age_s"] = time.time() - swap if swap else None
+        return stats
+
+    def _wait_retrain(self, timeout: float = 60.0) -> None:
+        """Let an in-flight retrain finish (and save) before shutdown."""
+        thread = self._retrain_thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def _evaluate_signatures(self, last_row_dict: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Emit signature hits for one row and return their alert rows."""
+        if self.sig_engine is None:
+            return []
+        # Only materialize the window for rules that actually inspect it
+        window_df = (
+            self.processor.get_dataframe() if self.sig_engine.needs_window else None
+        )
+        alerts: List[Dict[str, Any]] = []
+        for hit in self.sig_engine.evaluate(last_row_dict, window_df):
+            src_ip = _ip_text(last_row_dict.get("src_ip"))
+            dest_ip = _ip_text(last_row_dict.get("dest_ip"))
+            s_msg = (
+                f"SIGNATURE: {hit.name} severity={hit.severity} | "
+                f"{src_ip} -> {dest_ip} "
+                f'dport={_as_int(last_row_dict.get("dport"))} desc="{hit.description}"'
+            )
+            self._emit(s_msg, hit.severity)
+
+            # NEW: sink signature hit to WebDB (also visible in Log History)
+            alerts.append(
+                {
+                    "id": str(uuid.uuid4()),
+                    "ts": _iso_utc(_utcnow()),
+                    "src_ip": src_ip,
+                    "label": (
+                        f"{hit.name} {dest_ip}:"
+                        f"{_as_int(last_row_dict.get('dport'))}"
+                    ),
+                    "severity": str(hit.severity or "").upper(),
+                    "kind": "SIGNATURE",
+                    "sample_rate": self.sampler.rate,
+                }
+            )
+        return alerts
+
+    def alert_thresholds(self) -> Tuple[float, float]:
+        """Current (high, medium) severity cutoffs: the tracked percentiles
+        once warmed up, else ``Monitoring.AlertThresholds``."""
+        if self.score_quantiles is not None:
+            values = self.score_quantiles.values()
+            if values is not None:
+                return values[0], values[1]
+        return self._thr_high, self._thr_med
+
+    def threshold_stats(self) -> Dict[str, Any]:
+        """Severity cutoffs in effect and how they were derived, for the API."""
+        quantiles = self.score_quantiles
+        values = quantiles.values() if quantiles is not None else None
+        high, medium = values if values is not None else (self._thr_high, self._thr_med)
+        stats: Dict[str, Any] = {
+            "mode": "percentile" if quantiles is not None else "fixed",
+            # "fixed" while the percentile estimate is still warming up
+            "source": "percentile" if values is not None else "fixed",
+            "high": high,
+            "medium": medium,
+            "fixed_high": self._thr_high,
+            "fixed_medium": self._thr_med,
+        }
+        if quantiles is not None:
+            stats["percentiles"] = [p * 100.0 for p in quantiles.probs]
+            stats.update(quantiles.stats())
+        return stats
 
     def _severity_from_score(self, score: float) -> str:
         try:
-            if score <= self._thr_high:
+            high, medium = self.alert_thresholds()
+            if score <= high:
                 return "high"
-            if score <= self._thr_med:
+            if score <= medium:
                 return "medium"
             return "low"
         except Exception:
@@ -544,21 +1751,13 @@ class NetworkMonitor:
         else:
             self.logger.info(msg)
 
-    def _maybe_firewall_block(self, ip: str, severity: str, detail: str) -> None:
-        ip = (ip or "").strip()
-        if not ip or ip in self._runtime_blocked:
+    def _maybe_firewall_block(self, ip_value: Any, severity: str, detail: str) -> None:
+        """Auto-block a source given as an :mod:`ip_codec` integer."""
+        if not isinstance(ip_value, int) or ip_value in self._runtime_blocked:
             return
-        try:
-            if ip in getattr(self.processor, "_local_ips", set()):
-                return
-        except Exception:
-            pass
-        try:
-            parsed = ipaddress.ip_address(ip)
-            if parsed.is_loopback:
-                return
-        except Exception:
+        if self.processor.hosts.is_local(ip_value) or is_loopback(ip_value):
             return
+        ip = int_to_ip(ip_value)
         # Skip trusted hosts when possible
         if hasattr(webdb, "is_trusted"):
             try:
@@ -569,7 +1768,7 @@ class NetworkMonitor:
                 pass
         ok, err = firewall_ensure_block(ip, f"auto-{severity}")
         if ok:
-            self._runtime_blocked.add(ip)
+            self._runtime_blocked.add(ip_value)
             self.logger.warning("Auto-blocked %s via firewall (%s)", ip, detail)
             try:
                 webdb.delete_action_by_ip(ip, "unblock")
@@ -590,7 +1789,9 @@ class NetworkMonitor:
             self.logger.error("Firewall auto-block failed for %s: %s", ip, err)
 
     def _simulate_loop(self) -> None:
-        local_ips = list(getattr(self.processor, "_local_ips", [])) or ["192.168.1.10"]
+        local_ips = [
+            ip for ip in getattr(self.processor, "_local_ips", []) if ":" not in ip
+        ] or ["192.168.1.10"]
         remote_pool = [
             "45.83.12.5",
             "91.210.44.19",
@@ -617,7 +1818,7 @@ class NetworkMonitor:
                         sport=rng.randint(1024, 65535),
                         dport=dport,
                     )
-                    self._analyze_packet(pkt)
+                    self._on_packet(pkt)
                     time.sleep(rng.uniform(0.03, 0.07))
                 continue
 
@@ -641,5 +1842,5 @@ class NetworkMonitor:
                 sport=sport,
                 dport=dport,
             )
-            self._analyze_packet(pkt)
+            self._on_packet(pkt)
             time.sleep(rng.uniform(0.05, 0.25))
\ No newline at end of file
@@ -5,22 +5,556 @@ Packet processing and feature engineering for the AI-Powered IDS.
 
 from __future__ import annotations
 
-from collections import deque
-from typing import Deque, Dict, Tuple
+import struct
+from typing import (
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 import pandas as pd
 import numpy as np
 
-try:
-    import netifaces  # type: ignore
-except Exception:  # pragma: no cover
-    netifaces = None
+from host_registry import HostRegistry
+from ip_codec import V4_MAPPED, as_ip_int, int_to_ip
+from scan_counters import ExactScanCounter
 
 try:
     from scapy.all import IP, TCP, UDP  # type: ignore
 except Exception:  # pragma: no cover
     IP = TCP = UDP = object
 
-__all__ = ["PacketProcessor", "IP", "TCP", "UDP"]
+try:
+    from scapy.all import IPv6  # type: ignore
+except Exception:  # pragma: no cover
+    IPv6 = None
+
+__all__ = [
+    "PacketProcessor",
+    "PacketWindow",
+    "ParsedPacket",
+    "RawFrame",
+    "parse_frame",
+    "DLT_EN10MB",
+    "DLT_RAW",
+    "DLT_LINUX_SLL",
+    "IP",
+    "TCP",
+    "UDP",
+]
+
+# pcap link-layer types understood by the fast parser
+DLT_EN10MB = 1
+DLT_RAW = 101
+DLT_LINUX_SLL = 113
+_RAW_LINKTYPES = (DLT_RAW, 12, 14)
+
+_ETH_P_IP = 0x0800
+_ETH_P_IPV6 = 0x86DD
+_VLAN_TPIDS = (0x8100, 0x88A8, 0x9100)
+# Encapsulations the fast parser hands to Scapy instead of decoding itself
+_FALLBACK_ETHERTYPES = (0x8847, 0x8848, 0x8864)  # MPLS, PPPoE session
+_FALLBACK_IP_PROTOS = (4, 41, 47)  # IP-in-IP, IPv6-in-IP, GRE
+_FALLBACK_UDP_PORTS = (4789,)  # VXLAN
+# IPv6 extension headers that sit between the fixed header and transport
+_V6_EXT_HEADERS = (0, 43, 44, 51, 60, 135, 139, 140, 253, 254)
+
+_U16 = struct.Struct("!H")
+_U32 = struct.Struct("!I")
+_PORTS = struct.Struct("!HH")
+
+# Sentinel returned by parse_frame when Scapy dissection is required
+FALLBACK = object()
+
+FrameFields = Tuple[int, int, int, int, int]
+
+
+class RawFrame:
+    """Undissected link-layer frame plus capture metadata."""
+
+    __slots__ = ("data", "time", "linktype")
+
+    def __init__(
+        self, data: Union[bytes, memoryview], time: float, linktype: int = DLT_EN10MB
+    ) -> None:
+        self.data = data
+        self.time = time
+        self.linktype = linktype
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+class ParsedPacket(NamedTuple):
+    """Header fields of one IP packet, in `PacketWindow.COLUMNS` order."""
+
+    timestamp: float
+    src_ip: int
+    dest_ip: int
+    protocol: int
+    packet_size: int
+    sport: int
+    dport: int
+
+
+def parse_frame(
+    data: Union[bytes, memoryview], linktype: int = DLT_EN10MB
+) -> Union[FrameFields, None, object]:
+    """Pull (src, dst, proto, sport, dport) out of a raw frame with struct offsets.
+
+    Addresses are integers in the :mod:`ip_codec` space. Returns None for
+    non-IP traffic (what the Scapy path skips) and `FALLBACK` for
+    encapsulations that need full dissection to match it.
+    """
+    n = len(data)
+    if linktype == DLT_EN10MB:
+        if n < 14:
+            return None
+        (etype,) = _U16.unpack_from(data, 12)
+        off = 14
+        while etype in _VLAN_TPIDS:
+            if n < off + 4:
+                return None
+            (etype,) = _U16.unpack_from(data, off + 2)
+            off += 4
+    elif linktype == DLT_LINUX_SLL:
+        if n < 16:
+            return None
+        (etype,) = _U16.unpack_from(data, 14)
+        off = 16
+    elif linktype in _RAW_LINKTYPES:
+        if n < 1:
+            return None
+        version = data[0] >> 4
+        etype = _ETH_P_IP if version == 4 else _ETH_P_IPV6 if version == 6 else 0
+        off = 0
+    else:
+        return FALLBACK
+
+    if etype == _ETH_P_IPV6:
+        return _parse_ipv6(data, off)
+    if etype != _ETH_P_IP:
+        return FALLBACK if etype in _FALLBACK_ETHERTYPES else None
+    if n < off + 20:
+        return None
+    vihl = data[off]
+    ihl = (vihl & 0x0F) * 4
+    if vihl >> 4 != 4 or ihl < 20:
+        return None
+    (frag,) = _U16.unpack_from(data, off + 6)
+    proto = data[off + 9]
+    if proto in _FALLBACK_IP_PROTOS:
+        return FALLBACK
+    src = V4_MAPPED | _U32.unpack_from(data, off + 12)[0]
+    dst = V4_MAPPED | _U32.unpack_from(data, off + 16)[0]
+    # Non-first fragments carry no transport header
+    if frag & 0x1FFF:
+        return src, dst, proto, 0, 0
+    return _with_ports(data, off + ihl, src, dst, proto)
+
+
+def _parse_ipv6(
+    data: Union[bytes, memoryview], off: int
+) -> Union[FrameFields, None, object]:
+    if len(data) < off + 40 or data[off] >> 4 != 6:
+        return None
+    proto = data[off + 6]
+    if proto in _V6_EXT_HEADERS or proto in _FALLBACK_IP_PROTOS:
+        return FALLBACK
+    src = int.from_bytes(data[off + 8 : off + 24], "big")
+    dst = int.from_bytes(data[off + 24 : off + 40], "big")
+    return _with_ports(data, off + 40, src, dst, proto)
+
+
+def _with_ports(
+    data: Union[bytes, memoryview], l4: int, src: int, dst: int, proto: int
+) -> Union[FrameFields, object]:
+    sport = dport = 0
+    if proto in (6, 17) and len(data) >= l4 + 4:
+        sport, dport = _PORTS.unpack_from(data, l4)
+        if proto == 17 and (
+            dport in _FALLBACK_UDP_PORTS or sport in _FALLBACK_UDP_PORTS
+        ):
+            return FALLBACK
+    return src, dst, proto, sport, dport
+
+
+class _IpIntern:
+    """Reference-counted address <-> small-int table for window IP columns.
+
+    Keys are :mod:`ip_codec` integers, so IPv4 and IPv6 both fit a uint32
+    column. Ids are recycled once no row in the window refers to them, so
+    the table never grows beyond twice the window capacity. Text is
+    rendered lazily and cached per id.
+    """
+
+    def __init__(self) -> None:
+        self._ids: Dict[int, int] = {}
+        self._values: List[int] = []
+        self._texts: List[Optional[str]] = []
+        self._refs: List[int] = []
+        self._free: List[int] = []
+
+    def acquire(self, value: int) -> int:
+        idx = self._ids.get(value)
+        if idx is None:
+            if self._free:
+                idx = self._free.pop()
+                self._values[idx] = value
+                self._texts[idx] = None
+                self._refs[idx] = 0
+            else:
+                idx = len(self._values)
+                self._values.append(value)
+                self._texts.append(None)
+                self._refs.append(0)
+            self._ids[value] = idx
+        self._refs[idx] += 1
+        return idx
+
+    def release(self, idx: int) -> None:
+        self._refs[idx] -= 1
+        if self._refs[idx] <= 0:
+            self._ids.pop(self._values[idx], None)
+            self._free.append(idx)
+
+    def lookup(self, value: int) -> int:
+        """Return the id for `value` or -1 when it is not in the window."""
+        return self._ids.get(value, -1)
+
+    def value(self, idx: int) -> int:
+        return self._values[idx]
+
+    def text(self, idx: int) -> str:
+        text = self._texts[idx]
+        if text is None:
+            text = self._texts[idx] = int_to_ip(self._values[idx])
+        return text
+
+    def texts(self, ids: np.ndarray) -> np.ndarray:
+        if not len(ids):
+            return np.empty(0, dtype=object)
+        uniq, inverse = np.unique(ids, return_inverse=True)
+        rendered = np.array([self.text(int(i)) for i in uniq], dtype=object)
+        return rendered[inverse]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class PacketWindow:
+    """Columnar ring buffer of packet header fields.
+
+    Every column is a preallocated NumPy array of twice the capacity and each
+    row is written at slot ``i`` and ``i + capacity``, so the live window is
+    always one contiguous slice. Appends are amortized O(1) and
+    :meth:`column` returns zero-copy, oldest-first views (valid until the
+    next append).
+
+    By default the window holds the last `capacity` rows. With `horizon` it
+    holds the rows from the last `horizon` seconds instead, growing and
+    shrinking its arrays with the packet rate. `max_bytes` caps the rows
+    either way; once reached, the oldest rows are evicted early.
+    """
+
+    COLUMNS: Tuple[Tuple[str, type], ...] = (
+        ("timestamp", np.float64),
+        ("src_ip", np.uint32),
+        ("dest_ip", np.uint32),
+        ("protocol", np.uint8),
+        ("packet_size", np.uint16),
+        ("sport", np.uint16),
+        ("dport", np.uint16),
+    )
+    _INT_COLUMNS = ("protocol", "packet_size", "sport", "dport")
+    # Worst-case interning cost per distinct address (dict slot, int, text)
+    _IP_BYTES = 160
+
+    def __init__(
+        self,
+        capacity: int = 500,
+        *,
+        horizon: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        self.horizon = float(horizon) if horizon else None
+        self.max_bytes = int(max_bytes) if max_bytes else None
+        self.max_rows = (
+            max(1, self.max_bytes // self.row_bytes()) if self.max_bytes else None
+        )
+        self._min_capacity = self._bounded(capacity)
+        self._capacity = self._min_capacity
+        self._ips = _IpIntern()
+        self._alloc(self._capacity)
+        self._head = 0  # next physical slot to write, in [0, capacity)
+        self._len = 0
+        self.seq = 0  # total rows ever appended
+        self.expired = 0  # rows dropped for leaving the time horizon
+        self.evicted = 0  # rows dropped because the window was full
+
+    @classmethod
+    def row_bytes(cls) -> int:
+        """Upper bound on memory per row: both column copies plus two new IPs."""
+        width = sum(np.dtype(dtype).itemsize for _, dtype in cls.COLUMNS)
+        return 2 * width + 2 * cls._IP_BYTES
+
+    def _bounded(self, capacity: int) -> int:
+        capacity = max(1, int(capacity))
+        return min(capacity, self.max_rows) if self.max_rows else capacity
+
+    def _alloc(self, capacity: int) -> None:
+        self._cols: Dict[str, np.ndarray] = {
+            name: np.zeros(2 * capacity, dtype=dtype) for name, dtype in self.COLUMNS
+        }
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest row still in the window."""
+        return self.seq - self._len
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def _start(self) -> int:
+        return (self._head - self._len) % self._capacity
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held: column arrays plus interned addresses."""
+        cols = sum(arr.nbytes for arr in self._cols.values())
+        return cols + len(self._ips._values) * self._IP_BYTES
+
+    @property
+    def span(self) -> float:
+        """Seconds between the oldest and newest row."""
+        if self._len < 2:
+            return 0.0
+        ts = self._cols["timestamp"]
+        s = self._start()
+        return float(ts[s + self._len - 1] - ts[s])
+
+    def stats(self) -> Dict[str, float]:
+        """Occupancy and eviction counters for metrics/logging."""
+        return {
+            "rows": self._len,
+            "capacity": self._capacity,
+            "span_seconds": self.span,
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes or 0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+    def _drop_oldest(self, n: int) -> None:
+        """Remove the `n` oldest rows, releasing their IP references."""
+        src = self._cols["src_ip"]
+        dst = self._cols["dest_ip"]
+        s = self._start()
+        for i in range(s, s + n):
+            self._ips.release(int(src[i]))
+            self._ips.release(int(dst[i]))
+        self._len -= n
+
+    def _expire(self, cutoff: float) -> None:
+        # Each row expires once, so this loop is amortized O(1) per append.
+        # Out-of-order rows stay until every row before them has expired.
+        ts = self._cols["timestamp"]
+        s = self._start()
+        n = 0
+        while n < self._len and ts[s + n] < cutoff:
+            n += 1
+        if not n:
+            return
+        self._drop_oldest(n)
+        self.expired += n
+        # Give memory back after a burst (amortized: halve at 1/4 occupancy)
+        target = self._capacity
+        while self._len <= target // 4 and target // 2 >= self._min_capacity:
+            target //= 2
+        if target != self._capacity:
+            self._realloc(target)
+
+    def _make_room(self) -> None:
+        """Called when full: grow in time mode, else evict the oldest row."""
+        if self.horizon is not None and (
+            self.max_rows is None or self._capacity < self.max_rows
+        ):
+            self._realloc(self._bounded(self._capacity * 2))
+            return
+        self._drop_oldest(1)
+        self.evicted += 1
+
+    def append(
+        self,
+        timestamp: float,
+        src_ip: Union[int, str],
+        dest_ip: Union[int, str],
+        protocol: int,
+        packet_size: int,
+        sport: int,
+        dport: int,
+    ) -> None:
+        """Add one row; IPs may be :mod:`ip_codec` integers or text."""
+        src = as_ip_int(src_ip)
+        dst = as_ip_int(dest_ip)
+        if self.horizon is not None:
+            self._expire(float(timestamp) - self.horizon)
+        if self._len == self._capacity:
+            self._make_room()
+        cap = self._capacity
+        h = self._head
+        cols = self._cols
+        self._len += 1
+        row = (
+            float(timestamp),
+            self._ips.acquire(src),
+            self._ips.acquire(dst),
+            int(protocol) & 0xFF,
+            min(max(int(packet_size), 0), 0xFFFF),
+            int(sport) & 0xFFFF,
+            int(dport) & 0xFFFF,
+        )
+        for (name, _), value in zip(self.COLUMNS, row, strict=True):
+            arr = cols[name]
+            arr[h] = value
+            arr[h + cap] = value
+        self._head = (h + 1) % cap
+        self.seq += 1
+
+    def append_record(self, record: Dict) -> None:
+        self.append(
+            record.get("timestamp", 0.0),
+            str(record.get("src_ip", "")),
+            str(record.get("dest_ip", "")),
+            record.get("protocol", 0),
+            record.get("packet_size", 0),
+            record.get("sport", 0),
+            record.get("dport", 0),
+        )
+
+    def extend(self, records: Iterable[Dict]) -> None:
+        for record in records:
+            self.append_record(record)
+
+    def column(self, name: str) -> np.ndarray:
+        """Zero-copy view of one column, oldest row first."""
+        s = self._start()
+        return self._cols[name][s : s + self._len]
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        s = self._start()
+        return {name: arr[s : s + self._len] for name, arr in self._cols.items()}
+
+    def ip_text(self, ip_id: int) -> str:
+        return self._ips.text(int(ip_id))
+
+    def ip_value(self, ip_id: int) -> int:
+        return self._ips.value(int(ip_id))
+
+    def ip_id(self, ip: Union[int, str]) -> int:
+        """Interned id of `ip`, or -1 when no row in the window uses it."""
+        try:
+            return self._ips.lookup(as_ip_int(ip))
+        except ValueError:
+            return -1
+
+    def last_record(self) -> Dict:
+        if not self._len:
+            raise IndexError("window is empty")
+        idx = (self._head - 1) % self._capacity
+        return self._record_at(idx)
+
+    def last_row(self) -> Tuple[float, int, int, int, int, int, int]:
+        """Newest row as a tuple in `COLUMNS` order, IPs as interned ids."""
+        if not self._len:
+            raise IndexError("window is empty")
+        idx = (self._head - 1) % self._capacity
+        cols = self._cols
+        return (
+            float(cols["timestamp"][idx]),
+            int(cols["src_ip"][idx]),
+            int(cols["dest_ip"][idx]),
+            int(cols["protocol"][idx]),
+            int(cols["packet_size"][idx]),
+            int(cols["sport"][idx]),
+            int(cols["dport"][idx]),
+        )
+
+    def _record_at(self, idx: int) -> Dict:
+        cols = self._cols
+        return {
+            "timestamp": float(cols["timestamp"][idx]),
+            "src_ip": self._ips.text(int(cols["src_ip"][idx])),
+            "dest_ip": self._ips.text(int(cols["dest_ip"][idx])),
+            "protocol": int(cols["protocol"][idx]),
+            "packet_size": int(cols["packet_size"][idx]),
+            "sport": int(cols["sport"][idx]),
+            "dport": int(cols["dport"][idx]),
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        s = self._start()
+        for i in range(s, s + self._len):
+            yield self._record_at(i)
+
+    def clear(self) -> None:
+        self._ips = _IpIntern()
+        self._head = 0
+        self._len = 0
+
+    def resize(self, capacity: int) -> None:
+        """Change capacity, keeping the most recent rows.
+
+        In time mode this sets the smallest allocation the window shrinks
+        back to; it still grows with the packet rate.
+        """
+        capacity = self._bounded(capacity)
+        self._min_capacity = capacity
+        self._realloc(capacity)
+
+    def _realloc(self, capacity: int) -> None:
+        if capacity == self._capacity:
+            return
+        keep = min(self._len, capacity)
+        # Rows that fall off the front release their IP references.
+        if self._len > keep:
+            self._drop_oldest(self._len - keep)
+        s = self._start()
+        old = {name: arr[s : s + keep].copy() for name, arr in self._cols.items()}
+        self._capacity = capacity
+        self._alloc(capacity)
+        for name, data in old.items():
+            self._cols[name][:keep] = data
+            self._cols[name][capacity : capacity + keep] = data
+        self._len = keep
+        self._head = keep % capacity
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Materialize the window as a DataFrame with text IP columns."""
+        cols = self.columns()
+        data: Dict[str, np.ndarray] = {}
+        for name, _ in self.COLUMNS:
+            arr = cols[name]
+            if name in ("src_ip", "dest_ip"):
+                data[name] = self._ips.texts(arr)
+            elif name in self._INT_COLUMNS:
+                data[name] = arr.astype(np.int64)
+            else:
+                data[name] = arr.copy()
+        return pd.DataFrame(data)
 
 
 class PacketProcessor:
@@ -36,80 +570,228 @@ class PacketProcessor:
         "direction",
     ]
 
-    def __init__(self, window_size: int = 500) -> None:
-        self._local_ips = self._gather_local_ips()
+    def __init__(
+        self,
+        window_size: int = 500,
+        scan_horizon: float = 15.0,
+        hosts: Optional[HostRegistry] = None,
+        scan_counter=None,
+        window_horizon: Optional[float] = None,
+        window_max_bytes: Optional[int] = None,
+    ) -> None:
+        # Local-address registry behind the `direction` feature (default: a
+        # snapshot taken now; the monitor injects one it keeps current)
+        self.hosts = hosts if hosts is not None else HostRegistry()
         self._window_size = int(window_size)
-        self.packet_data: Deque[Dict] = deque(maxlen=self._window_size)
+        # window_horizon > 0 keeps the last N seconds instead of N packets;
+        # window_max_bytes caps memory in either mode
+        self.window = PacketWindow(
+            self._window_size, horizon=window_horizon, max_bytes=window_max_bytes
+        )
+        # Horizon (seconds) behind `unique_dports_15s` / `unique_dips_15s`;
+        # pass a scan_counters.SketchScanCounter to bound memory under scans
+        self.scan_horizon = float(scan_horizon)
+        self.scan_counter = (
+            scan_counter
+            if scan_counter is not None
+            else ExactScanCounter(self.scan_horizon)
+        )
+        # Running state for the incremental (per-packet) feature path
+        self._last_ts: Optional[float] = None
+        self._last_row: Dict = {}
 
-    def _gather_local_ips(self):
-        """Return a set of local IPv4 addresses for direction labeling."""
-        ips = set()
-        try:
-            if netifaces is None:
-                return ips
-            for iface in netifaces.interfaces():
-                addrs = netifaces.ifaddresses(iface).get(netifaces.AF_INET, [])
-                for a in addrs:
-                    ip = a.get("addr")
-                    if ip:
-                        ips.add(str(ip))
-        except Exception:
-            pass
-        return ips
+    @property
+    def packet_data(self) -> PacketWindow:
+        """Backwards-compatible alias for the sliding window."""
+        return self.window
+
+    @property
+    def _local_ips(self) -> FrozenSet[str]:
+        """Local addresses as canonical text (batch feature path)."""
+        return self.hosts.texts
+
+    @_local_ips.setter
+    def _local_ips(self, ips: Iterable[str]) -> None:
+        # Pin a fixed address set (tests, offline feature runs)
+        self.hosts = HostRegistry.fixed(ips)
+
+    def window_stats(self) -> Dict[str, float]:
+        """Window occupancy/eviction metrics (see :meth:`PacketWindow.stats`)."""
+        return self.window.stats()
 
     def set_window_size(self, new_size: int) -> None:
         """Change the sliding window size safely, preserving recent data."""
         new_size = max(1, int(new_size))
         if new_size == self._window_size:
             return
-        recent = list(self.packet_data)[-new_size:]
-        self.packet_data = deque(recent, maxlen=new_size)
+        self.window.resize(new_size)
         self._window_size = new_size
 
-    def process_packet(self, packet) -> None:
-        """Extract fields from a Scapy packet and append to the window."""
+    def clear(self) -> None:
+        """Forget all traffic: the window and the per-packet feature state
+        derived from it (scan counts, last timestamp, last row)."""
+        self.window.clear()
+        self.scan_counter.clear()
+        self._last_ts = None
+        self._last_row = {}
+
+    def process_frame(self, frame: RawFrame) -> None:
+        """Append a raw frame using the struct-based parser (no Scapy objects).
+
+        Exotic encapsulations are dissected with Scapy so results match
+        :meth:`process_packet`.
+        """
         try:
-            if not packet.haslayer(IP):
-                return
+            parsed = self.extract_frame(frame)
+            if parsed is not None:
+                self.window.append(*parsed)
+        except Exception as e:
+            print(f"[PacketProcessor] Failed to process frame: {e}")
+
+    @classmethod
+    def extract_frame(cls, frame: RawFrame) -> Optional[ParsedPacket]:
+        """Header fields of a raw frame, or None for non-IP traffic."""
+        fields = parse_frame(frame.data, frame.linktype)
+        if fields is None:
+            return None
+        if fields is FALLBACK:
+            return cls.extract(cls._dissect(frame))
+        src, dst, proto, sport, dport = cast(FrameFields, fields)
+        return ParsedPacket(
+            float(frame.time), src, dst, proto, len(frame.data), sport, dport
+        )
+
+    @classmethod
+    def extract(cls, packet) -> Optional[ParsedPacket]:
+        """Header fields of a RawFrame or Scapy(-like) packet; None if not IP.
+
+        Lets a capture process pull out fields without owning a window.
+        """
+        if isinstance(packet, ParsedPacket):
+            return packet
+        if isinstance(packet, RawFrame):
+            return cls.extract_frame(packet)
+        if packet.haslayer(IP):
             ip_layer = packet[IP]
             protocol = getattr(ip_layer, "proto", 0)
-            packet_size = int(len(packet)) if hasattr(packet, "__len__") else 0
-            if packet.haslayer(TCP):
-                sport = int(packet[TCP].sport)
-                dport = int(packet[TCP].dport)
-            elif packet.haslayer(UDP):
-                sport = int(packet[UDP].sport)
-                dport = int(packet[UDP].dport)
-            else:
-                sport = dport = 0
-            record = {
-                "timestamp": float(getattr(packet, "time", 0.0)),
-                "src_ip": str(getattr(ip_layer, "src", "")),
-                "dest_ip": str(getattr(ip_layer, "dst", "")),
-                "protocol": int(protocol),
-                "packet_size": packet_size,
-                "sport": sport,
-                "dport": dport,
-            }
-            self.packet_data.append(record)
+        elif IPv6 is not None and packet.haslayer(IPv6):
+            ip_layer = packet[IPv6]
+            protocol = getattr(ip_layer, "nh", 0)
+        else:
+            return None
+        packet_size = int(len(packet)) if hasattr(packet, "__len__") else 0
+        if packet.haslayer(TCP):
+            sport = int(packet[TCP].sport)
+            dport = int(packet[TCP].dport)
+        elif packet.haslayer(UDP):
+            sport = int(packet[UDP].sport)
+            dport = int(packet[UDP].dport)
+        else:
+            sport = dport = 0
+        return ParsedPacket(
+            float(getattr(packet, "time", 0.0)),
+            as_ip_int(str(getattr(ip_layer, "src", ""))),
+            as_ip_int(str(getattr(ip_layer, "dst", ""))),
+            int(protocol),
+            packet_size,
+            sport,
+            dport,
+        )
+
+    @staticmethod
+    def _dissect(frame: RawFrame):
+        from scapy.all import conf  # type: ignore
+
+        cls = conf.l2types.num2layer.get(frame.linktype)
+        if cls is None:
+            raise ValueError(f"unsupported link type {frame.linktype}")
+        pkt = cls(bytes(frame.data))
+        pkt.time = frame.time
+        return pkt
+
+    def process_packet(self, packet) -> None:
+        """Extract fields from a Scapy packet (or RawFrame/ParsedPacket) and
+        append them to the window."""
+        if isinstance(packet, RawFrame):
+            self.process_frame(packet)
+            return
+        try:
+            parsed = self.extract(packet)
+            if parsed is not None:
+                self.window.append(*parsed)
         except Exception as e:
             print(f"[PacketProcessor] Failed to process packet: {e}")
 
-    def get_dataframe(self) -> pd.DataFrame:
-        """Return a DataFrame view of the current sliding window."""
-        if not self.packet_data:
-            return pd.DataFrame(
-                columns=[
-                    "timestamp",
-                    "src_ip",
-                    "dest_ip",
-                    "protocol",
-                    "packet_size",
-                    "sport",
-                    "dport",
-                ]
+    def process_and_featurize(self, packet) -> Optional[np.ndarray]:
+        """Append `packet` and return its feature vector in `FEATURES` order.
+
+        Produces the same values as the last row of
+        ``engineer_features(get_dataframe())`` for packets arriving in
+        timestamp order, but from running state instead of rebuilding and
+        re-sorting the window. Returns None if the packet was not added.
+        """
+        seq = self.window.seq
+        self.process_packet(packet)
+        if self.window.seq == seq:
+            return None
+        return self._featurize_last()
+
+    def _featurize_last(self) -> np.ndarray:
+        win = self.window
+        ts, src_id, dst_id, protocol, packet_size, sport, dport = win.last_row()
+        prev = self._last_ts
+        time_diff = ts - prev if prev is not None and len(win) > 1 else 0.0
+        self._last_ts = ts
+
+        src = win.ip_value(src_id)
+        dst = win.ip_value(dst_id)
+        counter = self.scan_counter
+        # Window-scoped counters key on window ids; sketches need stable ints
+        if counter.window_scoped:
+            unique_dports, unique_dips = counter.update(
+                ts, win.seq - 1, src_id, dst_id, dport, min_seq=win.first_seq
+            )
+        else:
+            unique_dports, unique_dips = counter.update(
+                ts, win.seq - 1, src, dst, dport
             )
-        return pd.DataFrame(list(self.packet_data))
+
+        row = {
+            "timestamp": ts,
+            "src_ip": src,
+            "dest_ip": dst,
+            "protocol": protocol,
+            "packet_size": packet_size,
+            "sport": sport,
+            "dport": dport,
+            "time_diff": float(time_diff),
+            "packet_size_log": float(np.log1p(float(packet_size))),
+            "is_ephemeral_sport": float(sport >= 49152),
+            "unique_dports_15s": float(unique_dports),
+            # Auxiliary (signatures/alerts), not a model feature
+            "unique_dips_15s": float(unique_dips),
+            "direction": float(src in self.hosts.addresses),
+        }
+        self._last_row = row
+        return np.array([float(row[name]) for name in self.FEATURES], dtype=float)
+
+    def last_processed_row(self) -> Dict:
+        """Raw fields plus engineered columns for the most recent packet.
+
+        ``src_ip``/``dest_ip`` are :mod:`ip_codec` integers; render them with
+        :func:`ip_codec.int_to_ip` at the output boundary.
+        """
+        return self._last_row
+
+    def features_frame(self, vectors: np.ndarray) -> pd.DataFrame:
+        """Wrap one or more feature vectors in a `FEATURES`-ordered DataFrame."""
+        return pd.DataFrame(np.atleast_2d(vectors), columns=self.FEATURES)
+
+    def get_dataframe(self) -> pd.DataFrame:
+        """Return a DataFrame copy of the current sliding window."""
+        if not self.window:
+            return pd.DataFrame(columns=[name for name, _ in PacketWindow.COLUMNS])
+        return self.window.to_dataframe()
 
     @staticmethod
     def _shannon_entropy_from_series(series: pd.Series) -> float:
@@ -143,22 +825,30 @@ class PacketProcessor:
             df_processed["sport"].astype(int) >= 49152
         ).astype(float)
 
-        # Per-source unique destination ports in the last 15 seconds (supports scan/recon detection)
+        # Per-source unique destination ports in the last `scan_horizon` seconds
+        # (supports scan/recon detection)
         try:
             current_window = self.get_dataframe()
             if not current_window.empty and "timestamp" in current_window:
                 # Use the last packet time in this processed batch as the reference
                 ref_ts = float(df_processed["timestamp"].iloc[-1])
-                cutoff = ref_ts - 15.0
+                cutoff = ref_ts - self.scan_horizon
                 recent = current_window[current_window["timestamp"] >= cutoff]
-                counts = recent.groupby("src_ip")["dport"].nunique()
+                by_src = recent.groupby("src_ip")
+                counts = by_src["dport"].nunique()
                 df_processed["unique_dports_15s"] = (
                     df_processed["src_ip"].map(counts).fillna(0.0).astype(float)
                 )
+                dips = by_src["dest_ip"].nunique()
+                df_processed["unique_dips_15s"] = (
+                    df_processed["src_ip"].map(dips).fillna(0.0).astype(float)
+                )
             else:
                 df_processed["unique_dports_15s"] = 0.0
+                df_processed["unique_dips_15s"] = 0.0
         except Exception:
             df_processed["unique_dports_15s"] = 0.0
+            df_processed["unique_dips_15s"] = 0.0
 
         # Direction flag: outbound (src is this host) = 1.0, inbound otherwise = 0.0
         df_processed["direction"] = (
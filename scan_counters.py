@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming per-source counters backing the scan-oriented features.
+
+Two backends compute ``unique_dports_15s`` (vertical scans) and
+``unique_dips_15s`` (horizontal scans):
+
+- :class:`ExactScanCounter` keeps every (source, value) sighting inside the
+  packet window, so it matches the batch feature path exactly;
+- :class:`SketchScanCounter` keeps time-bucketed HyperLogLog registers per
+  source under a fixed memory budget, evicting the coldest sources.
+"""
+
+from __future__ import annotations
+
+import math
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Tuple
+
+import numpy as np
+
+__all__ = [
+    "DistinctCounter",
+    "UniqueDportCounter",
+    "ExactScanCounter",
+    "SketchScanCounter",
+    "make_scan_counter",
+]
+
+
+class DistinctCounter:
+    """Distinct values per source over a sliding time horizon.
+
+    Keeps the sequence number of the latest sighting of each (src, value)
+    pair plus an arrival-ordered expiry queue. Each update is amortized O(1)
+    and :meth:`count` answers in O(1), replacing a window-wide
+    ``groupby("src_ip")[column].nunique()``.
+
+    Entries also expire once their packet leaves the packet window (via
+    ``min_seq``), so counts agree with the batch feature path exactly for
+    packets arriving in timestamp order. `value_bits` bounds the values.
+    """
+
+    def __init__(self, horizon: float = 15.0, value_bits: int = 32) -> None:
+        self.horizon = float(horizon)
+        self._bits = int(value_bits)
+        self._mask = (1 << self._bits) - 1
+        self._latest: Dict[int, int] = {}  # (src << bits | value) -> seq
+        self._counts: Dict[int, int] = {}  # src -> live distinct values
+        self._queue: Deque[Tuple[float, int, int]] = deque()  # (ts, seq, key)
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def expire(self, now: float, min_seq: int = 0) -> None:
+        """Drop sightings older than the horizon or outside the packet window."""
+        cutoff = now - self.horizon
+        q = self._queue
+        latest = self._latest
+        counts = self._counts
+        bits = self._bits
+        while q and (q[0][0] < cutoff or q[0][1] < min_seq):
+            _, seq, key = q.popleft()
+            # A newer sighting of the same pair supersedes this entry
+            if latest.get(key) != seq:
+                continue
+            del latest[key]
+            src = key >> bits
+            remaining = counts[src] - 1
+            if remaining:
+                counts[src] = remaining
+            else:
+                del counts[src]
+
+    def add(self, ts: float, seq: int, src: int, value: int, min_seq: int = 0) -> int:
+        """Record one sighting and return the distinct count for `src`."""
+        self.expire(ts, min_seq)
+        key = (int(src) << self._bits) | (int(value) & self._mask)
+        if key not in self._latest:
+            self._counts[src] = self._counts.get(src, 0) + 1
+        self._latest[key] = seq
+        self._queue.append((ts, seq, key))
+        return self._counts[src]
+
+    def count(self, src: int) -> int:
+        return self._counts.get(src, 0)
+
+    def clear(self) -> None:
+        self._latest.clear()
+        self._counts.clear()
+        self._queue.clear()
+
+
+class UniqueDportCounter(DistinctCounter):
+    """Distinct destination ports per source (see :class:`DistinctCounter`)."""
+
+    def __init__(self, horizon: float = 15.0) -> None:
+        super().__init__(horizon, value_bits=16)
+
+    def update(
+        self, ts: float, seq: int, src: int, dport: int, min_seq: int = 0
+    ) -> int:
+        """Record one packet and return the distinct dport count for `src`."""
+        return self.add(ts, seq, src, dport, min_seq)
+
+
+class ExactScanCounter:
+    """Exact distinct dports and destinations per source.
+
+    State grows with the number of live (source, value) pairs in the packet
+    window. Keys are window ip ids, which stay valid because every entry
+    expires with its packet.
+    """
+
+    window_scoped = True
+
+    def __init__(self, horizon: float = 15.0) -> None:
+        self.horizon = float(horizon)
+        self.dports = UniqueDportCounter(self.horizon)
+        self.dips = DistinctCounter(self.horizon, value_bits=32)
+
+    def __len__(self) -> int:
+        return len(self.dports) + len(self.dips)
+
+    def update(
+        self, ts: float, seq: int, src: int, dst: int, dport: int, min_seq: int = 0
+    ) -> Tuple[int, int]:
+        """Record one packet; return (distinct dports, distinct destinations)."""
+        return (
+            self.dports.add(ts, seq, src, dport, min_seq),
+            self.dips.add(ts, seq, src, dst, min_seq),
+        )
+
+    def clear(self) -> None:
+        self.dports.clear()
+        self.dips.clear()
+
+
+_M64 = (1 << 64) - 1
+# Independent hash streams for the two sketches
+_SALT_DPORT = 0x9E3779B97F4A7C15
+_SALT_DIP = 0xC2B2AE3D27D4EB4F
+
+
+def _hash64(value: int, salt: int) -> int:
+    """splitmix64 finalizer over a (possibly 128-bit) integer."""
+    x = ((value ^ (value >> 64)) ^ salt) & _M64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _M64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _M64
+    return x ^ (x >> 31)
+
+
+class _SourceSketch:
+    """Register slices for one source plus the merged view of the live ones."""
+
+    __slots__ = ("regs", "epochs", "epoch", "merged", "inv_sum", "zeros")
+
+    def __init__(self, buckets: int, m: int) -> None:
+        self.regs = np.zeros((2, buckets, m), dtype=np.uint8)
+        self.epochs = np.full(buckets, -1, dtype=np.int64)
+        self.epoch = -1
+        # Merged registers with sum(2**-r) and zero counts kept incrementally
+        self.merged = [bytearray(m), bytearray(m)]
+        self.inv_sum = [float(m), float(m)]
+        self.zeros = [m, m]
+
+
+class SketchScanCounter:
+    """Approximate distinct dports and destinations per source in fixed memory.
+
+    Each tracked source owns ``buckets`` time slices of two HyperLogLog
+    register arrays (2**precision one-byte registers each). An estimate
+    merges the slices from the last `horizon` seconds, to within one slice
+    width. Sources are kept in LRU order; when `memory_bytes` is reached the
+    least recently seen source is dropped, so memory stays flat however many
+    sources are scanning. Standard error is about ``1.04 / sqrt(2**precision)``
+    for large counts and lower for small ones (linear counting).
+
+    The merged view is rebuilt once per slice rotation; between rotations an
+    update touches two registers and reads the estimate in O(1).
+
+    Keys are :mod:`ip_codec` integers: sketches outlive the packet window,
+    so window ip ids (which are recycled) cannot be used.
+    """
+
+    window_scoped = False
+    # Rough per-source cost beyond the registers (objects, dict slot)
+    _OVERHEAD = 512
+
+    def __init__(
+        self,
+        horizon: float = 15.0,
+        memory_bytes: int = 16 << 20,
+        precision: int = 7,
+        buckets: int = 5,
+    ) -> None:
+        if not 4 <= int(precision) <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.horizon = float(horizon)
+        self.precision = int(precision)
+        self.buckets = max(1, int(buckets))
+        self.width = self.horizon / self.buckets
+        self._m = 1 << self.precision
+        self._rest_bits = 64 - self.precision
+        self._rest_mask = (1 << self._rest_bits) - 1
+        self._alpha = self._alpha_for(self._m)
+        self.per_source_bytes = (
+            2 * (self.buckets + 1) * self._m + 8 * self.buckets + self._OVERHEAD
+        )
+        self.max_sources = max(1, int(memory_bytes) // self.per_source_bytes)
+        # Least recently seen first
+        self._sources: "OrderedDict[int, _SourceSketch]" = OrderedDict()
+        self.evictions = 0
+
+    @staticmethod
+    def _alpha_for(m: int) -> float:
+        if m == 16:
+            return 0.673
+        if m == 32:
+            return 0.697
+        if m == 64:
+            return 0.709
+        return 0.7213 / (1.0 + 1.079 / m)
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by the tracked sources."""
+        return len(self._sources) * self.per_source_bytes
+
+    def _source(self, src: int) -> _SourceSketch:
+        sources = self._sources
+        state = sources.get(src)
+        if state is not None:
+            sources.move_to_end(src)
+            return state
+        if len(sources) >= self.max_sources:
+            sources.popitem(last=False)
+            self.evictions += 1
+        state = _SourceSketch(self.buckets, self._m)
+        sources[src] = state
+        return state
+
+    def _rotate(self, state: _SourceSketch, epoch: int) -> None:
+        """Move `state` forward to `epoch`: reset its slice and re-merge the
+        live slices."""
+        slot = epoch % self.buckets
+        if state.epochs[slot] != epoch:
+            state.regs[:, slot, :] = 0
+            state.epochs[slot] = epoch
+        live = state.epochs > epoch - self.buckets
+        merged = state.regs[:, live, :].max(axis=1)
+        inv = np.ldexp(1.0, -merged.astype(np.int32)).sum(axis=1)
+        state.merged = [bytearray(merged[0].tobytes()), bytearray(merged[1].tobytes())]
+        state.inv_sum = [float(inv[0]), float(inv[1])]
+        state.zeros = [int(z) for z in (merged == 0).sum(axis=1)]
+        state.epoch = epoch
+
+    def _observe(
+        self, state: _SourceSketch, k: int, slot: int, value: int, salt: int
+    ) -> int:
+        h = _hash64(value, salt)
+        j = h >> self._rest_bits
+        rank = self._rest_bits - (h & self._rest_mask).bit_length() + 1
+        regs = state.regs[k, slot]
+        if rank > regs[j]:
+            regs[j] = rank
+            merged = state.merged[k]
+            old = merged[j]
+            if rank > old:
+                merged[j] = rank
+                state.inv_sum[k] += math.ldexp(1.0, -rank) - math.ldexp(1.0, -old)
+                if old == 0:
+                    state.zeros[k] -= 1
+        return self._estimate(state.inv_sum[k], state.zeros[k])
+
+    def _estimate(self, inv_sum: float, zeros: int) -> int:
+        m = self._m
+        raw = self._alpha * m * m / inv_sum
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+    def update(
+        self, ts: float, seq: int, src: int, dst: int, dport: int, min_seq: int = 0
+    ) -> Tuple[int, int]:
+        """Record one packet; return (distinct dports, distinct destinations).
+
+        `seq`/`min_seq` are accepted for interface parity and ignored.
+        """
+        state = self._source(src)
+        epoch = int(ts // self.width)
+        if epoch > state.epoch:
+            self._rotate(state, epoch)
+        elif epoch < state.epoch:
+            # Reordered packet: count it into its own (still live) slice
+            # without moving the state back; older than the horizon: ignore
+            if epoch <= state.epoch - self.buckets:
+                return (
+                    self._estimate(state.inv_sum[0], state.zeros[0]),
+                    self._estimate(state.inv_sum[1], state.zeros[1]),
+                )
+            slot = epoch % self.buckets
+            if state.epochs[slot] != epoch:
+                # Not live, so not in the merged view either
+                state.regs[:, slot, :] = 0
+                state.epochs[slot] = epoch
+        slot = epoch % self.buckets
+        return (
+            self._observe(state, 0, slot, int(dport), _SALT_DPORT),
+            self._observe(state, 1, slot, int(dst), _SALT_DIP),
+        )
+
+    def clear(self) -> None:
+        self._sources.clear()
+
+
+def make_scan_counter(
+    backend: str = "exact",
+    horizon: float = 15.0,
+    memory_mb: float = 16.0,
+    precision: int = 7,
+):
+    """Build the scan-feature backend named by ``[Features] ScanCounter``."""
+    backend = (backend or "exact").strip().lower()
+    if backend == "sketch":
+        return SketchScanCounter(
+            horizon, memory_bytes=int(memory_mb * (1 << 20)), precision=precision
+        )
+    if backend == "exact":
+        return ExactScanCounter(horizon)
+    raise ValueError(f"unknown scan counter backend: {backend!r}")
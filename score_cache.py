@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+LRU cache of detector scores keyed on quantized feature vectors.
+
+Live traffic repeats the same protocol/size/port/direction combinations over
+and over, and a batch forest returns the same score for the same row every
+time. Rows are rounded to ``decimals`` places (so e.g. ``time_diff`` jitter
+below the quantum still hits) and only the misses reach the model.
+
+Entries belong to one detector: handing :meth:`ScoreCache.score` a different
+detector (a retrain or hot reload swapped one in) or a retrained one clears
+the cache first. Streaming engines change their scores with every row they
+learn and are never cached.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+__all__ = ["ScoreCache"]
+
+
+class ScoreCache:
+    """Bounded LRU map from quantized feature rows to decision scores."""
+
+    def __init__(self, max_entries: int = 65536, decimals: int = 4) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        if decimals < 0:
+            raise ValueError("decimals must be >= 0")
+        self.max_entries = int(max_entries)
+        self.decimals = int(decimals)
+        self._entries: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Detector, its generation and the column order the entries were
+        # scored with; any change invalidates them
+        self._owner: Optional[Tuple[Any, int, Tuple[str, ...]]] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _keys(self, A: np.ndarray) -> List[bytes]:
+        # + 0.0 folds -0.0 into 0.0 so both round to the same key
+        Q = np.ascontiguousarray(np.round(A, self.decimals) + 0.0)
+        row = Q.dtype.itemsize * Q.shape[1]
+        raw = Q.tobytes()
+        return [raw[i : i + row] for i in range(0, len(raw), row)]
+
+    def _check_owner(self, detector, columns: Sequence[str]) -> None:
+        # `generation` changes whenever the detector is retrained in place,
+        # whether or not its forest could be compiled
+        owner = (detector, detector.generation, tuple(columns))
+        current = self._owner
+        if (
+            current is not None
+            and current[0] is owner[0]
+            and current[1] == owner[1]
+            and current[2] == owner[2]
+        ):
+            return
+        if self._entries:
+            self.invalidations += 1
+            self._entries.clear()
+        self._owner = owner
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._owner = None
+
+    def score(
+        self, detector, X: np.ndarray, columns: Sequence[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """``detector.score_batch(X, columns)`` served from the cache where
+        possible; the misses go to the detector in one call (each distinct
+        row once)."""
+        A = np.asarray(X, dtype=float)
+        if A.ndim == 1:
+            A = A.reshape(1, -1)
+        keys = self._keys(A)
+        scores = np.empty(len(keys), dtype=float)
+        missing: Dict[bytes, List[int]] = {}
+        with self._lock:
+            self._check_owner(detector, columns)
+            owner = self._owner
+            entries = self._entries
+            for i, key in enumerate(keys):
+                value = entries.get(key)
+                if value is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    entries.move_to_end(key)
+                    scores[i] = value
+            # A miss is a row sent to the model; its repeats in the batch hit
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            first = [rows[0] for rows in missing.values()]
+            fresh, _ = detector.score_batch(A[first], columns)
+            with self._lock:
+                # Only keep the results if no swap happened while scoring
+                store = self._owner is owner
+                for (key, rows), value in zip(missing.items(), fresh, strict=True):
+                    scores[rows] = value
+                    if store:
+                        self._entries[key] = float(value)
+                        self._entries.move_to_end(key)
+                overflow = len(self._entries) - self.max_entries
+                for _ in range(max(overflow, 0)):
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return scores, scores < 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "decimals": self.decimals,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
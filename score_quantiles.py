@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Constant-memory streaming quantiles of recent decision scores.
+
+:class:`P2Quantile` is the P² estimator (Jain & Chlamtac, 1985): five
+markers whose heights follow one quantile of everything seen so far, moved
+by a parabolic fit as samples arrive. No sample is stored.
+
+:class:`ScoreQuantiles` tracks several such quantiles over windows of
+``window`` scores. When a window fills, its estimates are frozen and a new
+window starts, so the values follow the current traffic and model instead
+of the whole history. Until a window holds ``min_count`` scores the frozen
+values of the previous one are served.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+__all__ = ["P2Quantile", "ScoreQuantiles"]
+
+
+class P2Quantile:
+    """Running estimate of the `p` quantile (0 < p < 1) in O(1) memory."""
+
+    __slots__ = ("p", "count", "_q", "_n", "_want", "_step")
+
+    def __init__(self, p: float) -> None:
+        if not 0.0 < p < 1.0:
+            raise ValueError("p must be in (0, 1)")
+        self.p = float(p)
+        self.count = 0
+        # Marker heights, actual positions, desired positions and the
+        # desired-position increment per sample
+        self._q: List[float] = []
+        self._n = [0, 1, 2, 3, 4]
+        self._want = [0.0, 2.0 * p, 4.0 * p, 2.0 + 2.0 * p, 4.0]
+        self._step = [0.0, p / 2.0, p, (1.0 + p) / 2.0, 1.0]
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        q = self._q
+        if self.count <= 5:
+            q.append(x)
+            if self.count == 5:
+                q.sort()
+            return
+        n = self._n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        want = self._want
+        step = self._step
+        for i in range(5):
+            want[i] += step[i]
+        for i in (1, 2, 3):
+            d = want[i] - n[i]
+            if (d >= 1.0 and n[i + 1] - n[i] > 1) or (
+                d <= -1.0 and n[i - 1] - n[i] < -1
+            ):
+                s = 1 if d > 0 else -1
+                # Piecewise-parabolic prediction of the marker's new height
+                h = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < h < q[i + 1]:
+                    # Linear fallback keeps the heights ordered
+                    h = q[i] + s * (q[i + s] - q[i]) / (n[i + s] - n[i])
+                q[i] = h
+                n[i] += s
+
+    @property
+    def value(self) -> Optional[float]:
+        """The current estimate (exact for fewer than five samples)."""
+        if not self.count:
+            return None
+        if self.count < 5:
+            ordered = sorted(self._q)
+            return ordered[min(int(self.p * len(ordered)), len(ordered) - 1)]
+        return self._q[2]
+
+
+class ScoreQuantiles:
+    """Windowed streaming quantiles of decision scores (thread-safe)."""
+
+    def __init__(
+        self, probs: Sequence[float], window: int = 100000, min_count: int = 1000
+    ) -> None:
+        if not probs:
+            raise ValueError("at least one quantile is required")
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        self.probs = [float(p) for p in probs]
+        self.window = int(window)
+        self.min_count = max(1, min(int(min_count), self.window))
+        self._lock = threading.Lock()
+        self._current = [P2Quantile(p) for p in self.probs]
+        self._frozen: Optional[List[float]] = None
+        self.total = 0
+        self.windows = 0
+
+    def update(self, scores: np.ndarray) -> None:
+        values = np.asarray(scores, dtype=float).ravel()
+        values = values[np.isfinite(values)].tolist()
+        with self._lock:
+            for x in values:
+                for est in self._current:
+                    est.add(x)
+                if self._current[0].count >= self.window:
+                    self._frozen = [float(e.value) for e in self._current]  # type: ignore[arg-type]
+                    self._current = [P2Quantile(p) for p in self.probs]
+                    self.windows += 1
+            self.total += len(values)
+
+    def values(self) -> Optional[List[float]]:
+        """One estimate per quantile, or None before `min_count` scores."""
+        with self._lock:
+            if self._current[0].count >= self.min_count:
+                return [float(e.value) for e in self._current]  # type: ignore[arg-type]
+            return list(self._frozen) if self._frozen is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        values = self.values()
+        with self._lock:
+            return {
+                "quantiles": {
+                    f"p{p * 100:g}": (values[i] if values is not None else None)
+                    for i, p in enumerate(self.probs)
+                },
+                "window": self.window,
+                "window_count": self._current[0].count,
+                "windows": self.windows,
+                "total": self.total,
+            }
@@ -0,0 +1,90 @@
+"""Compare sklearn IsolationForest scoring against the compiled forest engine.
+
+Usage: python scripts/bench_forest.py [model.joblib] [--sizes 1,10,100,1000,10000]
+Without a model, one is trained on synthetic packet features.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from anomaly_detector import AnomalyDetector
+from forest_engine import CompiledForest
+from packet_processor import PacketProcessor
+
+
+def synthetic_detector(n_estimators):
+    rng = np.random.default_rng(0)
+    n = 5000
+    feats = pd.DataFrame(
+        {
+            "protocol": rng.choice([6, 17], n),
+            "packet_size_log": np.log1p(rng.integers(60, 1500, n)),
+            "time_diff": rng.exponential(0.01, n),
+            "dport": rng.choice([22, 53, 80, 443, 8080], n),
+            "is_ephemeral_sport": rng.integers(0, 2, n),
+            "unique_dports_15s": rng.poisson(2, n),
+            "direction": rng.integers(0, 2, n),
+        }
+    )[PacketProcessor.FEATURES].astype(float)
+    det = AnomalyDetector(n_estimators=n_estimators, random_state=42)
+    det.train(feats)
+    return det, feats.to_numpy()
+
+
+def per_call(fn, min_seconds=0.5):
+    fn()
+    reps, elapsed = 0, 0.0
+    t0 = time.perf_counter()
+    while elapsed < min_seconds:
+        fn()
+        reps += 1
+        elapsed = time.perf_counter() - t0
+    return elapsed / reps
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("model", nargs="?")
+    ap.add_argument("--sizes", default="1,10,100,1000,10000")
+    ap.add_argument("--trees", type=int, default=200, help="for the synthetic model")
+    args = ap.parse_args()
+
+    if args.model:
+        det = AnomalyDetector()
+        det.load_model(args.model)
+        rng = np.random.default_rng(0)
+        pool = rng.normal(size=(10_000, len(det.feature_names)))
+        pool = pool * det.scaler.scale_ + det.scaler.mean_
+    else:
+        det, pool = synthetic_detector(args.trees)
+
+    t0 = time.perf_counter()
+    engine = CompiledForest.from_detector(det)
+    print(
+        f"compiled trees={engine.n_trees} nodes={engine.n_nodes} depth={engine.depth} "
+        f"bytes={engine.nbytes} compile_sec={time.perf_counter() - t0:.3f}"
+    )
+
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        X = np.resize(pool, (size, pool.shape[1]))
+        ref = det.model.decision_function(det.scaler.transform(X))
+        err = float(np.max(np.abs(engine.decision_function(X) - ref)))
+        sk = per_call(lambda X=X: det.model.decision_function(det.scaler.transform(X)))
+        fast = per_call(lambda X=X: engine.decision_function(X))
+        print(
+            f"batch={size:<6} sklearn_ms={sk * 1e3:9.3f} compiled_ms={fast * 1e3:9.3f} "
+            f"sklearn_us_per_row={sk / size * 1e6:9.2f} compiled_us_per_row={fast / size * 1e6:9.2f} "
+            f"speedup={sk / fast:6.1f}x max_abs_err={err:.1e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Compare the struct-based frame parser against Scapy dissection.
+
+Usage: python scripts/bench_parsers.py [capture.pcap] [--limit N]
+Without a pcap, a synthetic mixed TCP/UDP capture is generated.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import argparse
+import time
+
+from scapy.all import IP, TCP, UDP, Ether, RawPcapReader  # type: ignore
+
+from packet_processor import PacketProcessor, RawFrame
+
+
+def synthetic_frames(n=20_000):
+    frames = []
+    t0 = time.time()
+    for i in range(n):
+        l4 = (
+            TCP(sport=49152 + i % 1000, dport=443)
+            if i % 3
+            else UDP(sport=53, dport=5353)
+        )
+        pkt = (
+            Ether() / IP(src=f"10.0.{i % 7}.2", dst="8.8.8.8") / l4 / (b"x" * (i % 200))
+        )
+        frames.append((bytes(pkt), t0 + i * 0.001))
+    return frames
+
+
+def pcap_frames(path, limit):
+    frames = []
+    for data, meta in RawPcapReader(path):
+        ts = getattr(meta, "sec", 0) + getattr(meta, "usec", 0) / 1e6
+        frames.append((data, ts))
+        if limit and len(frames) >= limit:
+            break
+    return frames
+
+
+def bench(label, frames, feed):
+    pp = PacketProcessor(window_size=len(frames))
+    t0 = time.perf_counter()
+    for data, ts in frames:
+        feed(pp, data, ts)
+    elapsed = time.perf_counter() - t0
+    print(
+        f"{label:<6} packets={len(frames)} sec={elapsed:.3f} "
+        f"pps={len(frames) / max(elapsed, 1e-9):,.0f} rows={len(pp.window)}"
+    )
+    return pp
+
+
+def _fast(pp, data, ts):
+    pp.process_packet(RawFrame(data, ts))
+
+
+def _scapy(pp, data, ts):
+    pkt = Ether(data)
+    pkt.time = ts
+    pp.process_packet(pkt)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("pcap", nargs="?")
+    ap.add_argument("--limit", type=int, default=0)
+    args = ap.parse_args()
+    frames = pcap_frames(args.pcap, args.limit) if args.pcap else synthetic_frames()
+
+    fast = bench("fast", frames, _fast)
+    slow = bench("scapy", frames, _scapy)
+    same = fast.get_dataframe().equals(slow.get_dataframe())
+    print(f"identical_rows={same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-process analysis: one capture process fans packets out to N workers.
+
+Packets are hashed by source IP, so every per-source feature (scan counters,
+signatures) sees all of a source's traffic in one shard; in flow mode they are
+hashed by flow instead, so both directions reach the same flow table. Each
+worker runs a full NetworkMonitor (processor, detector, signatures); their
+alerts and device sightings come back to the parent, which owns the single
+sink.
+"""
+
+from __future__ import annotations
+
+import configparser
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from flow_sampler import flow_hash
+from network_monitor import NetworkMonitor
+from packet_processor import PacketProcessor, ParsedPacket
+
+__all__ = ["ShardedPipeline", "PACKET_DTYPE", "parse_cpu_list", "shard_of"]
+
+# Wire format for one packet: 128-bit ip_codec addresses split in two words
+PACKET_DTYPE = np.dtype(
+    [
+        ("timestamp", "f8"),
+        ("src_hi", "u8"),
+        ("src_lo", "u8"),
+        ("dst_hi", "u8"),
+        ("dst_lo", "u8"),
+        ("protocol", "u1"),
+        ("packet_size", "u4"),
+        ("sport", "u2"),
+        ("dport", "u2"),
+    ]
+)
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+
+
+def shard_of(src: int, shards: int) -> int:
+    """Stable shard index for an :mod:`ip_codec` source address."""
+    h = ((src ^ (src >> 64)) * _GOLDEN) & _MASK64
+    return (h >> 32) % shards
+
+
+def parse_cpu_list(spec: str) -> List[int]:
+    """Parse a Linux-style CPU list such as ``"2,4-7"``; empty means none."""
+    cpus: List[int] = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def _pin(cpu: Optional[int], logger: logging.Logger, who: str) -> None:
+    if cpu is None:
+        return
+    try:
+        os.sched_setaffinity(0, {cpu})
+        logger.info("%s pinned to CPU %d", who, cpu)
+    except (AttributeError, OSError) as e:
+        logger.warning("Could not pin %s to CPU %d: %s", who, cpu, e)
+
+
+def _config_dict(config: configparser.ConfigParser) -> Dict[str, Dict[str, str]]:
+    """Plain-dict snapshot of `config` that can be sent to a spawned worker."""
+    data = {"DEFAULT": dict(config.defaults())}
+    for section in config.sections():
+        data[section] = {
+            k: v
+            for k, v in config.items(section, raw=True)
+            if data["DEFAULT"].get(k) != v
+        }
+    return data
+
+
+class _ShardMonitor(NetworkMonitor):
+    """NetworkMonitor that queues sink writes for the parent instead of
+    writing them itself."""
+
+    def __init__(self, config, shard: int) -> None:
+        super().__init__(config)
+        self.shard = shard
+        # One model file and one parquet file are shared by all shards
+        self.online_retrain_interval = 0
+        self.save_rolling = False
+        # Each shard watches (and hot-reloads) the bundle on its own
+        self._model_component = f"model-shard{shard}"
+        # Each shard estimates its own score percentiles
+        self._thresholds_component = f"thresholds-shard{shard}"
+        self._out_lock = threading.Lock()
+        self._out_alerts: List[Dict[str, Any]] = []
+        self._out_devices: Dict[str, None] = {}
+        self._reported = 0
+
+    def _sink_alerts(self, alerts: List[Dict[str, Any]]) -> None:
+        if alerts:
+            with self._out_lock:
+                self._out_alerts.extend(alerts)
+
+    def _sink_devices(self, ips: List[str]) -> None:
+        with self._out_lock:
+            self._out_devices.update(dict.fromkeys(ips))
+
+    def drain(self) -> Optional[Tuple[str, int, int, List, List[str]]]:
+        with self._out_lock:
+            scored = self._packet_counter - self._reported
+            if not (scored or self._out_alerts or self._out_devices):
+                return None
+            self._reported = self._packet_counter
+            alerts, self._out_alerts = self._out_alerts, []
+            devices, self._out_devices = list(self._out_devices), {}
+        return ("results", self.shard, scored, alerts, devices)
+
+
+def _worker_main(
+    shard: int,
+    config_data: Dict[str, Dict[str, str]],
+    model_path: str,
+    cpu: Optional[int],
+    firewall_blocking: bool,
+    max_latency: float,
+    inbox,
+    outbox,
+) -> None:
+    # Ctrl+C reaches the whole process group; the parent coordinates shutdown
+    # so batches already queued are still analyzed.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    config = configparser.ConfigParser()
+    config.read_dict(config_data)
+    try:
+        monitor = _ShardMonitor(config, shard)
+        _pin(cpu, monitor.logger, f"shard {shard}")
+        monitor.detector.load_model(model_path)
+        monitor._check_model_granularity()
+        monitor.firewall_runtime_enabled = bool(firewall_blocking) and bool(
+            monitor.firewall_capabilities.get("supported")
+        )
+    except Exception as e:
+        outbox.put(("error", shard, f"{type(e).__name__}: {e}"))
+        outbox.put(("done", shard))
+        return
+
+    stop = threading.Event()
+    monitor._start_background(stop)
+    monitor._start_model_watch(model_path, stop)
+    monitor.hosts.start()
+
+    def _report() -> None:
+        msg = monitor.drain()
+        if msg is not None:
+            outbox.put(msg)
+
+    try:
+        while True:
+            try:
+                batch = inbox.get(timeout=max_latency)
+            except queue.Empty:
+                _report()
+                continue
+            if batch is None:
+                break
+            for ts, sh, sl, dh, dl, proto, size, sport, dport in batch.tolist():
+                monitor._on_packet(
+                    ParsedPacket(
+                        ts, sh << 64 | sl, dh << 64 | dl, proto, size, sport, dport
+                    )
+                )
+            _report()
+    finally:
+        stop.set()
+        monitor._flush_batch()
+        monitor._flush_flows()
+        _report()
+        outbox.put(("done", shard))
+
+
+class ShardedPipeline:
+    """Capture-side fan-out to worker processes with a merged result sink.
+
+    Call :meth:`submit` from the capture callback. Packets are reduced to a
+    `PACKET_DTYPE` record, buffered per shard and shipped as one NumPy array
+    per `batch_size` packets (or every `max_latency_ms`), so IPC cost is per
+    batch rather than per packet. Queues are bounded by `queue_batches`;
+    a full queue blocks capture rather than growing memory.
+    `sampling=False` turns off each worker's adaptive sampling.
+    `by_flow=True` routes on the direction-independent flow hash instead of
+    the source address (for flow-level scoring).
+    """
+
+    def __init__(
+        self,
+        config: configparser.ConfigParser,
+        model_path: str,
+        workers: int,
+        *,
+        cpus: Sequence[int] = (),
+        capture_cpu: Optional[int] = None,
+        batch_size: int = 256,
+        max_latency_ms: float = 50.0,
+        queue_batches: int = 64,
+        firewall_blocking: bool = False,
+        sampling: bool = True,
+        by_flow: bool = False,
+        on_alerts: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        on_devices: Optional[Callable[[List[str]], None]] = None,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.max_latency = max(float(max_latency_ms), 1.0) / 1000.0
+        self.logger = logger or logging.getLogger("ids.monitor")
+        self._config = _config_dict(config)
+        if not sampling:
+            self._config.setdefault("Monitoring", {})["SamplingTargetLagSeconds"] = "0"
+        self._model_path = model_path
+        self._cpus = list(cpus)
+        self._capture_cpu = capture_cpu
+        self._queue_batches = max(1, int(queue_batches))
+        self._firewall_blocking = bool(firewall_blocking)
+        self.by_flow = bool(by_flow)
+        self._on_alerts = on_alerts
+        self._on_devices = on_devices
+        self._pending: List[List[Tuple]] = [[] for _ in range(self.workers)]
+        self._oldest = [0.0] * self.workers
+        self._lock = threading.Lock()
+        self._closing = threading.Event()
+        self._procs: List[Any] = []
+        self._inboxes: List[Any] = []
+        self._threads: List[threading.Thread] = []
+        self.submitted = 0
+        self.scored = 0
+        self.per_shard = [0] * self.workers
+
+    def start(self) -> None:
+        # spawn: the parent may already run API/flusher threads, which
+        # fork() would copy in an undefined state.
+        ctx = mp.get_context("spawn")
+        self._outbox = ctx.Queue()
+        for shard in range(self.workers):
+            inbox = ctx.Queue(maxsize=self._queue_batches)
+            cpu = self._cpus[shard % len(self._cpus)] if self._cpus else None
+            proc = ctx.Process(
+                target=_worker_main,
+                args=(
+                    shard,
+                    self._config,
+                    self._model_path,
+                    cpu,
+                    self._firewall_blocking,
+                    self.max_latency,
+                    inbox,
+                    self._outbox,
+                ),
+                name=f"ids-shard-{shard}",
+                daemon=True,
+            )
+            proc.start()
+            self._inboxes.append(inbox)
+            self._procs.append(proc)
+        _pin(self._capture_cpu, self.logger, "capture")
+        for target, name in (
+            (self._collect, "shard-sink"),
+            (self._flusher, "shard-flusher"),
+        ):
+            t = threading.Thread(target=target, daemon=True, name=name)
+            t.start()
+            self._threads.append(t)
+        self.logger.info(
+            "Sharded pipeline: %d workers, batch=%d, cpus=%s",
+            self.workers,
+            self.batch_size,
+            self._cpus or "any",
+        )
+
+    def submit(self, packet) -> None:
+        """Capture callback: route one packet to its shard."""
+        try:
+            parsed = PacketProcessor.extract(packet)
+        except Exception:
+            self.logger.debug("failed to extract packet", exc_info=True)
+            return
+        if parsed is None:
+            return
+        ts, src, dst, proto, size, sport, dport = parsed
+        if self.by_flow:
+            shard = flow_hash(src, dst, proto, sport, dport) % self.workers
+        else:
+            shard = shard_of(src, self.workers)
+        record = (
+            ts,
+            src >> 64,
+            src & _MASK64,
+            dst >> 64,
+            dst & _MASK64,
+            proto & 0xFF,
+            min(max(size, 0), 0xFFFFFFFF),
+            sport,
+            dport,
+        )
+        with self._lock:
+            buf = self._pending[shard]
+            if not buf:
+                self._oldest[shard] = time.monotonic()
+            buf.append(record)
+            self.submitted += 1
+            self.per_shard[shard] += 1
+            if len(buf) >= self.batch_size:
+                self._ship_locked(shard)
+
+    def _ship_locked(self, shard: int) -> None:
+        buf = self._pending[shard]
+        if not buf:
+            return
+        self._pending[shard] = []
+        self._inboxes[shard].put(np.array(buf, dtype=PACKET_DTYPE))
+
+    def _flusher(self) -> None:
+        """Ship partial batches so sparse shards still meet the latency bound."""
+        while not self._closing.wait(self.max_latency / 2.0):
+            now = time.monotonic()
+            with self._lock:
+                for shard in range(self.workers):
+                    if (
+                        self._pending[shard]
+                        and now - self._oldest[shard] >= self.max_latency
+                    ):
+                        self._ship_locked(shard)
+
+    def _collect(self) -> None:
+        """Merge worker results into the parent's sinks."""
+        done: Set[int] = set()
+        while len(done) < self.workers:
+            try:
+                msg = self._outbox.get(timeout=0.5)
+            except queue.Empty:
+                for shard, proc in enumerate(self._procs):
+                    if shard not in done and not proc.is_alive():
+                        self.logger.error("Shard %d exited unexpectedly", shard)
+                        done.add(shard)
+                continue
+            kind, shard = msg[0], msg[1]
+            if kind == "results":
+                _, _, scored, alerts, devices = msg
+                self.scored += scored
+                try:
+                    if alerts and self._on_alerts is not None:
+                        self._on_alerts(alerts)
+                    if devices and self._on_devices is not None:
+                        self._on_devices(devices)
+                except Exception:
+                    self.logger.debug("shard sink failed", exc_info=True)
+            elif kind == "error":
+                self.logger.error("Shard %d failed to start: %s", shard, msg[2])
+            elif kind == "done":
+                done.add(shard)
+
+    def stop(self, timeout: float = 30.0) -> Dict[str, Any]:
+        """Flush buffers, let workers drain, and return pipeline stats.
+
+        Workers get as long as they need to finish queued batches; one is
+        only terminated after `timeout` seconds without any reported progress.
+        """
+        self._closing.set()
+        with self._lock:
+            for shard in range(self.workers):
+                self._ship_locked(shard)
+        for inbox, proc in zip(self._inboxes, self._procs, strict=True):
+            if proc.is_alive():
+                inbox.put(None)
+        collector = self._threads[0]
+        last_scored, deadline = self.scored, time.monotonic() + timeout
+        while collector.is_alive() and time.monotonic() < deadline:
+            collector.join(0.5)
+            if self.scored != last_scored:
+                last_scored, deadline = self.scored, time.monotonic() + timeout
+        for t in self._threads[1:]:
+            t.join(1.0)
+        for proc in self._procs:
+            proc.join(0.0 if collector.is_alive() else timeout)
+            if proc.is_alive():
+                self.logger.warning("Terminating unresponsive shard %s", proc.name)
+                proc.terminate()
+        stats = {
+            "submitted": self.submitted,
+            "scored": self.scored,
+            "per_shard": list(self.per_shard),
+        }
+        self.logger.info(
+            "Sharded pipeline stopped: submitted=%d scored=%d per_shard=%s",
+            stats["submitted"],
+            stats["scored"],
+            stats["per_shard"],
+        )
+        return stats
+
+    def __enter__(self) -> "ShardedPipeline":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Callable, Dict, List
+from typing import Callable, Dict, List, Optional
 import pandas as pd  # already in requirements
 
 
@@ -18,13 +18,21 @@ class Rule:
     severity: str
     description: str
     match: Callable[[Dict, pd.DataFrame], bool]  # (last_row, window_df) -> bool
+    # Rules that only read `last_row` let the monitor skip building window_df
+    needs_window: bool = False
 
 
 class SignatureEngine:
     def __init__(self, rules: List[Rule]) -> None:
         self.rules = list(rules)
 
-    def evaluate(self, last_row: Dict, window_df: pd.DataFrame) -> List[SigResult]:
+    @property
+    def needs_window(self) -> bool:
+        return any(r.needs_window for r in self.rules)
+
+    def evaluate(
+        self, last_row: Dict, window_df: Optional[pd.DataFrame] = None
+    ) -> List[SigResult]:
         hits: List[SigResult] = []
         for r in self.rules:
             try:
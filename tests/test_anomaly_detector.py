@@ -56,3 +56,148 @@ def test_determinism_with_fixed_seed():
     s2 = det2.decision_scores(X)
     # exact equality is acceptable here with fixed seed + same lib versions
     assert np.allclose(np.asarray(s1), np.asarray(s2))
+
+
+def test_score_batch_matches_predict_and_decision_scores():
+    X = _make_X(300, 4, seed=4)
+    det = AnomalyDetector(contamination=0.1, n_estimators=50, random_state=0)
+    det.train(X)
+    scores, flags = det.score_batch(X.to_numpy())
+    assert np.allclose(scores, det.decision_scores(X), rtol=0, atol=1e-12)
+    assert np.array_equal(flags, np.asarray(det.predict(X)) == "Anomaly")
+    assert flags.any() and not flags.all()
+
+    # DataFrame input and a single 1-D row take the same path
+    df_scores, _ = det.score_batch(X)
+    assert np.allclose(df_scores, scores, rtol=0, atol=1e-12)
+    one, one_flag = det.score_batch(X.to_numpy()[7])
+    assert one.shape == (1,) and one[0] == pytest.approx(scores[7], abs=1e-12)
+    assert one_flag[0] == flags[7]
+
+
+def test_score_batch_aligns_named_columns():
+    X = _make_X(100, 3, seed=5)
+    det = AnomalyDetector(contamination=0.1, n_estimators=50, random_state=0)
+    det.train(X)
+    ref, _ = det.score_batch(X.to_numpy())
+
+    cols = list(reversed(X.columns))
+    shuffled, _ = det.score_batch(X[cols].to_numpy(), cols)
+    assert np.allclose(shuffled, ref, rtol=0, atol=1e-12)
+
+    # A missing model column is filled with 0, as the DataFrame reindex does
+    partial = X[["f0", "f2"]]
+    expected = det.decision_scores(partial)
+    got, _ = det.score_batch(partial.to_numpy(), ["f0", "f2"])
+    assert np.allclose(got, expected, rtol=0, atol=1e-12)
+
+    with pytest.raises(ValueError):
+        det.score_batch(np.zeros((2, 5)))
+
+
+def test_save_model_is_atomic(tmp_path, monkeypatch):
+    import anomaly_detector
+
+    X = _make_X(64, 3, seed=6)
+    det = AnomalyDetector(contamination=0.1, n_estimators=10, random_state=0)
+    det.train(X)
+    path = tmp_path / "models" / "iforest.joblib"
+    det.save_model(str(path))
+    before = path.read_bytes()
+    files = ["iforest.joblib", "iforest.joblib.forest", "iforest.joblib.meta.json"]
+    assert sorted(p.name for p in path.parent.iterdir()) == files
+
+    def _crash(payload, fh):
+        fh.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(anomaly_detector.joblib, "dump", _crash)
+    with pytest.raises(OSError):
+        det.save_model(str(path))
+    # The previous bundle is untouched and no temp file is left behind
+    assert path.read_bytes() == before
+    assert sorted(p.name for p in path.parent.iterdir()) == files
+
+
+def test_load_maps_forest_and_defers_unpickling(tmp_path, monkeypatch):
+    import anomaly_detector
+
+    X = _make_X(200, 4, seed=7)
+    det = AnomalyDetector(contamination=0.1, n_estimators=30, random_state=0)
+    det.train(X)
+    path = tmp_path / "iforest.joblib"
+    det.save_model(str(path))
+    ref, _ = det.score_batch(X.to_numpy())
+
+    loads = []
+    real_load = anomaly_detector.joblib.load
+    monkeypatch.setattr(
+        anomaly_detector.joblib,
+        "load",
+        lambda p, **kw: loads.append((str(p), kw)) or real_load(p, **kw),
+    )
+    lazy = anomaly_detector.load_detector(str(path))
+    assert lazy.lazy and lazy.forest_mapped
+    assert loads == [(str(path) + ".forest", {"mmap_mode": "r"})]
+    assert lazy.bundle_metadata()["params"] == det.bundle_metadata()["params"]
+    assert lazy.feature_names == det.feature_names
+    assert np.array_equal(lazy.score_batch(X.to_numpy())[0], ref)
+    assert lazy.lazy
+
+    # sklearn paths unpickle the model on first use
+    assert np.array_equal(np.asarray(lazy.predict(X)), np.asarray(det.predict(X)))
+    assert not lazy.lazy and loads[-1] == (str(path), {})
+
+    eager = AnomalyDetector()
+    eager.load_model(str(path), lazy=False)
+    assert not eager.lazy and eager.model is not None
+
+
+def test_load_ignores_sidecars_from_another_save(tmp_path):
+    import shutil
+
+    X = _make_X(120, 3, seed=8)
+    old = AnomalyDetector(n_estimators=10, random_state=0)
+    new = AnomalyDetector(n_estimators=10, random_state=1)
+    old.train(X)
+    new.train(X)
+    path = tmp_path / "iforest.joblib"
+    old.save_model(str(path))
+    stale = tmp_path / "stale.forest"
+    shutil.copy(str(path) + ".forest", stale)
+    new.save_model(str(path))
+    shutil.copy(stale, str(path) + ".forest")
+
+    det = AnomalyDetector()
+    det.load_model(str(path))
+    assert not det.lazy and not det.forest_mapped
+    assert np.allclose(det.score_batch(X)[0], new.score_batch(X)[0], atol=1e-12)
+
+    # A pre-sidecar bundle loads in full as well
+    (tmp_path / "iforest.joblib.meta.json").unlink()
+    (tmp_path / "iforest.joblib.forest").unlink()
+    det.load_model(str(path))
+    assert not det.lazy and det.model is not None
+
+
+def test_load_detector_unpickles_legacy_bundle_once(tmp_path, monkeypatch):
+    import anomaly_detector
+
+    X = _make_X(120, 3, seed=9)
+    det = AnomalyDetector(n_estimators=10, random_state=0)
+    det.train(X)
+    path = tmp_path / "iforest.joblib"
+    det.save_model(str(path))
+    (tmp_path / "iforest.joblib.meta.json").unlink()
+    (tmp_path / "iforest.joblib.forest").unlink()
+
+    loads = []
+    real_load = anomaly_detector.joblib.load
+    monkeypatch.setattr(
+        anomaly_detector.joblib,
+        "load",
+        lambda p, **kw: loads.append(str(p)) or real_load(p, **kw),
+    )
+    loaded = anomaly_detector.load_detector(str(path))
+    assert loads == [str(path)]
+    assert np.allclose(loaded.score_batch(X)[0], det.score_batch(X)[0], atol=1e-12)
@@ -0,0 +1,205 @@
+import socket
+import sys
+
+import pytest
+
+import bpf
+from bpf import (
+    CaptureFilter,
+    accepts,
+    attach_filter,
+    chain,
+    exclusion_program,
+    validate_program,
+)
+
+pytestmark = pytest.mark.unit
+
+scapy_all = pytest.importorskip("scapy.all")
+_MAC = dict(src="02:00:00:00:00:01", dst="02:00:00:00:00:02")
+
+
+def _frame(l3, l4=None):
+    pkt = scapy_all.Ether(**_MAC) / l3
+    if l4 is not None:
+        pkt = pkt / l4
+    return bytes(pkt)
+
+
+IP, IPv6, TCP, UDP = scapy_all.IP, scapy_all.IPv6, scapy_all.TCP, scapy_all.UDP
+
+
+@pytest.mark.parametrize(
+    "frame,accepted",
+    [
+        (_frame(IP(src="10.1.2.3", dst="8.8.8.8"), TCP()), False),  # trusted /8
+        (_frame(IP(src="8.8.8.8", dst="192.168.1.5"), UDP()), False),  # trusted host
+        (_frame(IP(src="8.8.8.8", dst="192.168.1.6"), UDP(sport=1, dport=53)), True),
+        (_frame(IP(src="8.8.8.8", dst="1.1.1.1"), TCP(sport=5000, dport=80)), False),
+        (_frame(IP(src="8.8.8.8", dst="1.1.1.1"), TCP(sport=80, dport=22)), False),
+        # Options shift the TCP header; non-first fragments carry no ports
+        (
+            _frame(
+                IP(src="8.8.8.8", dst="1.1.1.1", options=b"\x01" * 4), TCP(dport=22)
+            ),
+            False,
+        ),
+        (_frame(IP(src="8.8.8.8", dst="1.1.1.1", frag=5), TCP(dport=22)), True),
+        (_frame(IP(src="8.8.8.8", dst="1.1.1.1"), scapy_all.ICMP()), True),
+        (_frame(IPv6(src="2001:db8::5", dst="2001:4860::1"), TCP()), False),
+        (_frame(IPv6(src="2001:db9::5", dst="fe80::1"), TCP()), False),
+        (_frame(IPv6(src="2001:db9::5", dst="fe80::2"), UDP(sport=5000)), False),
+        (
+            _frame(IPv6(src="2001:db9::5", dst="fe80::2"), UDP(sport=5001, dport=53)),
+            True,
+        ),
+        (_frame(scapy_all.ARP()), True),
+    ],
+)
+def test_exclusion_program(frame, accepted):
+    program = exclusion_program(
+        ["10.0.0.0/8", "192.168.1.5", "2001:db8::/32", "fe80::1", "bogus"], [5000, 22]
+    )
+    assert accepts(program, frame) is accepted
+
+
+def test_empty_exclusions_accept_everything():
+    program = exclusion_program()
+    assert program[0] == (0x06, 0, 0, bpf.ACCEPT_LEN)
+    assert accepts(program, _frame(IP(src="10.0.0.1", dst="1.1.1.1"), TCP(dport=5000)))
+
+
+def test_many_exclusions_use_long_jumps():
+    hosts = [f"10.{i // 250}.{i % 250}.1" for i in range(600)]
+    program = exclusion_program(hosts)
+    validate_program(program)
+    assert not accepts(program, _frame(IP(src="8.8.8.8", dst="10.2.99.1"), TCP()))
+    assert accepts(program, _frame(IP(src="8.8.8.8", dst="10.2.99.2"), TCP()))
+
+
+def test_chain_requires_both_programs_to_accept():
+    # "ip and tcp" as libpcap would emit it
+    tcp_only = [
+        (0x28, 0, 0, 12),
+        (0x15, 0, 3, 0x0800),
+        (0x30, 0, 0, 23),
+        (0x15, 0, 1, 6),
+        (0x06, 0, 0, 0x40000),
+        (0x06, 0, 0, 0),
+    ]
+    program = chain(tcp_only, exclusion_program(["10.0.0.1"]))
+    validate_program(program)
+    assert accepts(program, _frame(IP(src="8.8.8.8", dst="1.1.1.1"), TCP()))
+    assert not accepts(program, _frame(IP(src="8.8.8.8", dst="1.1.1.1"), UDP()))
+    assert not accepts(program, _frame(IP(src="10.0.0.1", dst="1.1.1.1"), TCP()))
+
+
+def test_compile_expression_without_compiler(monkeypatch):
+    import scapy.arch.common as common
+
+    def _no_libpcap(*args, **kwargs):
+        raise ImportError("libpcap missing")
+
+    monkeypatch.setattr(common, "compile_filter", _no_libpcap)
+    monkeypatch.setattr(bpf.shutil, "which", lambda name: None)
+    with pytest.raises(ValueError, match="cannot compile"):
+        bpf.compile_expression("tcp port 80")
+
+
+linux_only = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="SO_ATTACH_FILTER is Linux-only"
+)
+
+
+@linux_only
+def test_kernel_rejects_invalid_program():
+    with pytest.raises(ValueError):
+        validate_program([(0x05, 0, 0, 7)])  # jump past the end
+
+
+def _udp_pair():
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.bind(("127.0.0.1", 0))
+    rx.settimeout(0.2)
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    return rx, tx
+
+
+@linux_only
+def test_attached_filter_drops_in_kernel():
+    rx, tx = _udp_pair()
+    with rx, tx:
+        attach_filter(rx, [(0x06, 0, 0, 0)])  # drop everything
+        tx.sendto(b"dropped", rx.getsockname())
+        with pytest.raises(socket.timeout):
+            rx.recv(64)
+        attach_filter(rx, [(0x06, 0, 0, 0xFFFF)])  # replaced atomically
+        tx.sendto(b"kept", rx.getsockname())
+        assert rx.recv(64) == b"kept"
+
+
+@linux_only
+def test_capture_filter_regenerates_when_hosts_change():
+    trusted = ["192.0.2.1"]
+    cf = CaptureFilter(exclude_ports=[5000], hosts_source=lambda: list(trusted))
+    rx, tx = _udp_pair()
+    with rx, tx:
+        cf.attach(rx)
+        first = cf.program
+        assert not accepts(first, _frame(IP(src="192.0.2.1", dst="1.1.1.1"), TCP()))
+        assert cf.refresh() is False
+
+        trusted.append("198.51.100.0/24")
+        assert cf.refresh() is True
+        assert cf.program != first
+        assert not accepts(
+            cf.program, _frame(IP(src="8.8.8.8", dst="198.51.100.7"), TCP())
+        )
+        assert "2 excluded" in cf.describe()
+        cf.detach(rx)
+
+
+def test_inactive_filter_does_nothing():
+    cf = CaptureFilter()
+    assert not cf.active
+    cf.attach(object())  # never touches the socket
+    assert cf.program is None
+
+
+@pytest.mark.parametrize(
+    "hosts,ports",
+    [
+        ([f"2001:db8::{i:x}" for i in range(1, 21)], [22, 5000]),
+        ([f"192.0.2.{i}" for i in range(1, 11)], list(range(6000, 6080))),
+    ],
+)
+def test_many_hosts_and_ports_build(hosts, ports):
+    program = exclusion_program(hosts, ports)
+    validate_program(program)
+    assert not accepts(
+        program, _frame(IP(src="8.8.8.8", dst="1.1.1.1"), TCP(dport=ports[-1]))
+    )
+    assert accepts(program, _frame(IP(src="8.8.8.8", dst="1.1.1.1"), TCP(dport=443)))
+    # A non-first fragment skips every port check
+    assert accepts(
+        program, _frame(IP(src="8.8.8.8", dst="1.1.1.1", frag=5), TCP(dport=ports[-1]))
+    )
+    v6 = ["2001:db9::1", "2001:db9::2"]
+    assert not accepts(
+        program, _frame(IPv6(src=v6[0], dst=v6[1]), UDP(dport=ports[-1]))
+    )
+    assert accepts(program, _frame(IPv6(src=v6[0], dst=v6[1]), UDP(dport=443)))
+    host = hosts[-1]
+    l3 = IPv6(src=host, dst=v6[1]) if ":" in host else IP(src=host, dst="1.1.1.1")
+    assert not accepts(program, _frame(l3, UDP(dport=443)))
+
+
+def test_tagged_frames_are_not_excluded():
+    program = exclusion_program(["192.0.2.1"], [22])
+    tagged = bytes(
+        scapy_all.Ether(**_MAC)
+        / scapy_all.Dot1Q(vlan=7)
+        / IP(src="192.0.2.1")
+        / TCP(dport=22)
+    )
+    assert accepts(program, tagged)
@@ -0,0 +1,145 @@
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+pytestmark = pytest.mark.integration
+
+
+def _open_ring(**kwargs):
+    if not sys.platform.startswith("linux"):
+        pytest.skip("AF_PACKET is Linux-only")
+    from capture import AfPacketRing
+
+    try:
+        return AfPacketRing("lo", **kwargs)
+    except PermissionError:
+        pytest.skip("AF_PACKET capture needs CAP_NET_RAW")
+
+
+def _send_udp(n, port_base, delay=0.2):
+    def _run():
+        time.sleep(delay)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            for i in range(n):
+                s.sendto(b"probe" * (i + 1), ("127.0.0.1", port_base + i))
+
+    t = threading.Thread(target=_run, daemon=True)
+    t.start()
+    return t
+
+
+def test_afpacket_ring_delivers_frames_and_stats():
+    from packet_processor import PacketProcessor
+
+    ring = _open_ring(block_size=1 << 16, block_count=4, block_timeout_ms=10)
+    try:
+        _send_udp(10, 41000)
+        pp = PacketProcessor(window_size=200)
+        for frame in ring.frames(timeout=2.0):
+            pp.process_packet(frame)
+        df = pp.get_dataframe()
+        probes = df[(df["protocol"] == 17) & (df["dport"].between(41000, 41009))]
+        # lo shows each datagram twice (outgoing + incoming)
+        assert set(probes["dport"]) == set(range(41000, 41010))
+        assert (probes["src_ip"] == "127.0.0.1").all()
+        stats = ring.stats()
+        assert stats["packets"] >= len(probes)
+        assert stats["drops"] == 0
+    finally:
+        ring.close()
+
+
+def test_afpacket_ring_refuses_non_ethernet_interfaces(monkeypatch):
+    import capture
+
+    ring = _open_ring()
+    try:
+        assert capture._hardware_type(ring.socket, "lo") == capture.ARPHRD_LOOPBACK
+    finally:
+        ring.close()
+    # ARPHRD_NONE: tun and WireGuard devices deliver bare IP packets
+    monkeypatch.setattr(capture, "_hardware_type", lambda sock, interface: 0xFFFE)
+    with pytest.raises(ValueError, match="Ethernet"):
+        capture.AfPacketRing("lo")
+
+
+def test_afpacket_ring_count_resumes_mid_block():
+    ring = _open_ring(block_size=1 << 16, block_count=4, block_timeout_ms=10)
+    try:
+        _send_udp(6, 42000)
+        first = [f.data[:] for f in ring.frames(count=3, timeout=2.0)]
+        rest = list(ring.frames(timeout=1.0))
+        assert len(first) == 3
+        assert len(first) + len(rest) >= 12
+    finally:
+        ring.close()
+
+
+@pytest.mark.parametrize("fmt", ["pcap", "pcap-nano", "pcapng"])
+def test_pcap_frames_match_scapy_reader(tmp_path, fmt):
+    from scapy.all import IP, TCP, UDP, Ether, PcapNgWriter, wrpcap  # type: ignore
+
+    from capture import pcap_frames
+    from ip_codec import int_to_ip
+    from packet_processor import parse_frame
+
+    pkts = []
+    for i in range(25):
+        l4 = TCP(sport=40000 + i, dport=443) if i % 2 else UDP(sport=53, dport=5300 + i)
+        pkt = (
+            Ether(dst="02:00:00:00:00:01")
+            / IP(src=f"10.1.0.{i + 1}", dst="192.0.2.9")
+            / l4
+        )
+        pkt.time = 1700000000 + i * 0.25
+        pkts.append(pkt)
+    path = str(tmp_path / f"cap.{fmt}")
+    if fmt == "pcapng":
+        with PcapNgWriter(path) as w:
+            for p in pkts:
+                w.write(p)
+    else:
+        wrpcap(path, pkts, nano=fmt == "pcap-nano")
+
+    frames = list(pcap_frames(path))
+    assert len(frames) == len(pkts)
+    for frame, pkt in zip(frames, pkts, strict=True):
+        assert frame.data == bytes(pkt)
+        assert frame.time == pytest.approx(float(pkt.time), abs=1e-6)
+        src, dst, proto, sport, dport = parse_frame(frame.data, frame.linktype)
+        assert (int_to_ip(src), int_to_ip(dst), proto) == (
+            pkt[IP].src,
+            pkt[IP].dst,
+            pkt[IP].proto,
+        )
+        assert (sport, dport) == (pkt.sport, pkt.dport)
+
+
+def test_pcap_frames_realtime_paces_to_timestamps(tmp_path):
+    from scapy.all import IP, UDP, Ether, wrpcap  # type: ignore
+
+    from capture import pcap_frames
+
+    pkts = []
+    for i in range(3):
+        pkt = Ether(dst="02:00:00:00:00:01") / IP(dst="127.0.0.1") / UDP()
+        pkt.time = 100.0 + i * 0.1
+        pkts.append(pkt)
+    path = str(tmp_path / "paced.pcap")
+    wrpcap(path, pkts)
+
+    t0 = time.monotonic()
+    assert len(list(pcap_frames(path, realtime=True, speed=2.0))) == 3
+    assert time.monotonic() - t0 >= 0.09
+
+
+def test_pcap_frames_rejects_unknown_format(tmp_path):
+    from capture import pcap_frames
+
+    path = tmp_path / "junk.pcap"
+    path.write_bytes(b"not a capture file at all")
+    with pytest.raises(ValueError):
+        list(pcap_frames(str(path)))
@@ -42,5 +42,16 @@ def test_verify_model_prints_expected_fields():
         "Feature count",
         "Feature checksum",
         "Feature order",
+        "Load time",
+        "Resident memory",
     ]:
         assert token in out
+
+
+def test_train_sources_are_mutually_exclusive(capsys):
+    import configparser
+
+    parser = cli.build_arg_parser(configparser.ConfigParser())
+    with pytest.raises(SystemExit):
+        parser.parse_args(["train", "--pcap", "a.pcap", "--from-parquet", "b"])
+    assert "not allowed with argument" in capsys.readouterr().err
@@ -51,3 +51,53 @@ def test_nonpositive_window_size():
     cfg.set("DEFAULT", "DefaultWindowSize", "0")
     with pytest.raises(ValueError):
         validate_config(cfg)
+
+
+def test_nonpositive_scan_horizon():
+    cfg = _base_cfg()
+    cfg["Features"] = {"ScanHorizonSeconds": "0"}
+    with pytest.raises(ValueError):
+        validate_config(cfg)
+
+
+@pytest.mark.parametrize(
+    "section,key,value",
+    [
+        ("Monitoring", "ScoringGranularity", "session"),
+        ("Flows", "IdleTimeoutSeconds", "0"),
+        ("Flows", "MaxFlows", "0"),
+    ],
+)
+def test_invalid_flow_settings(section, key, value):
+    cfg = _base_cfg()
+    if not cfg.has_section(section):
+        cfg.add_section(section)
+    cfg.set(section, key, value)
+    with pytest.raises(ValueError):
+        validate_config(cfg)
+
+
+@pytest.mark.parametrize(
+    "key,value",
+    [
+        ("ScanCounter", "bloom"),
+        ("ScanSketchMemoryMB", "0"),
+        ("ScanSketchPrecision", "20"),
+    ],
+)
+def test_invalid_scan_counter_settings(key, value):
+    cfg = _base_cfg()
+    cfg["Features"] = {key: value}
+    with pytest.raises(ValueError):
+        validate_config(cfg)
+
+
+def test_alert_percentiles_must_be_ordered_percentages():
+    cfg = _base_cfg()
+    cfg.set("Monitoring", "AlertPercentiles", "0.5, 2")
+    validate_config(cfg)
+    for bad in ("2, 0.5", "0, 2", "0.5, 100", "high, medium"):
+        cfg.set("Monitoring", "AlertPercentiles", bad)
+        with pytest.raises(ValueError) as ei:
+            validate_config(cfg)
+        assert "AlertPercentiles" in str(ei.value)
@@ -0,0 +1,83 @@
+import pytest
+
+from flow_sampler import FlowSampler, flow_hash
+from ip_codec import ip_to_int
+
+pytestmark = pytest.mark.unit
+
+A = ip_to_int("10.0.0.2")
+B = ip_to_int("203.0.113.5")
+
+
+def _flows(n):
+    return [(A, B, 6, 40000 + i, 443) for i in range(n)]
+
+
+def test_flow_hash_is_direction_independent():
+    assert flow_hash(A, B, 6, 51000, 443) == flow_hash(B, A, 6, 443, 51000)
+    assert flow_hash(A, B, 6, 51000, 443) != flow_hash(A, B, 17, 51000, 443)
+
+
+def test_lower_rate_keeps_a_subset_of_flows():
+    sampler = FlowSampler(1.0)
+    flows = _flows(4000)
+    kept = {}
+    for rate in (0.5, 0.25, 0.1):
+        sampler._set_rate(rate)
+        kept[rate] = {f for f in flows if sampler.keep(*f)}
+        assert len(kept[rate]) == pytest.approx(rate * len(flows), rel=0.15)
+    assert kept[0.1] <= kept[0.25] <= kept[0.5]
+    # Both directions of a kept flow are kept
+    assert all(sampler.keep(f[1], f[0], f[2], f[4], f[3]) for f in kept[0.1])
+
+
+def test_rate_follows_lag():
+    sampler = FlowSampler(1.0, min_rate=0.1, adjust_interval=1.0)
+    now = 100.0
+    sampler.observe(100.0, now=now)  # baseline offset 0
+    assert sampler.rate == 1.0
+
+    # Falling further behind each second: halve until the floor
+    rates = []
+    for i in range(1, 6):
+        now += 1.0
+        sampler.observe(now - 2.0 * i, now=now)
+        rates.append(sampler.rate)
+    assert rates == [0.5, 0.25, 0.125, 0.1, 0.1]
+    assert sampler.sampling
+
+    # Over target but draining: hold the rate
+    now += 1.0
+    sampler.observe(now - 5.0, now=now)
+    assert sampler.rate == 0.1
+
+    # Caught up: grow back to full rate
+    for _ in range(20):
+        now += 1.0
+        sampler.observe(now, now=now)
+    assert sampler.rate == 1.0 and not sampler.sampling
+
+
+def test_adjusts_at_most_once_per_interval():
+    sampler = FlowSampler(0.5, adjust_interval=1.0)
+    sampler.observe(10.0, now=10.0)
+    for step in range(1, 10):
+        sampler.observe(10.0, now=10.0 + step * 0.05)
+    assert sampler.rate == 1.0
+    assert sampler.observe(10.0, now=11.0) is True
+    assert sampler.rate == 0.5
+
+
+def test_disabled_sampler_scores_everything():
+    sampler = FlowSampler(0.0)
+    assert not sampler.enabled
+    assert sampler.observe(0.0, now=1e9) is False
+    assert all(sampler.keep(*f) for f in _flows(100))
+    assert sampler.stats()["kept"] == 100 and sampler.stats()["skipped"] == 0
+
+
+def test_reset_restores_full_rate():
+    sampler = FlowSampler(1.0)
+    sampler._set_rate(0.2)
+    sampler.reset()
+    assert sampler.rate == 1.0 and sampler.lag == 0.0
@@ -0,0 +1,76 @@
+import math
+
+import pytest
+
+from flow_table import FLOW_FEATURES, FlowTable, flow_features
+from ip_codec import ip_to_int
+
+pytestmark = pytest.mark.unit
+
+A = ip_to_int("10.0.0.2")
+B = ip_to_int("93.184.216.34")
+C = ip_to_int("198.51.100.7")
+
+
+def test_both_directions_share_one_flow():
+    table = FlowTable(idle_timeout=30, active_timeout=300)
+    assert table.update(0.0, A, B, 6, 60, 50000, 443) == []
+    assert table.update(0.1, B, A, 6, 1500, 443, 50000) == []
+    assert table.update(0.3, A, B, 6, 60, 50000, 443) == []
+    assert len(table) == 1
+    rec = table.get(B, A, 6, 443, 50000)
+    assert (rec.src, rec.sport, rec.dst, rec.dport) == (A, 50000, B, 443)
+    assert (rec.packets, rec.bytes, rec.fwd_packets, rec.fwd_bytes) == (3, 1620, 2, 120)
+    assert rec.duration == pytest.approx(0.3)
+    assert rec.iat_mean == pytest.approx(0.15)
+    assert rec.iat_std == pytest.approx(0.05)
+    assert rec.iat_max == pytest.approx(0.2)
+
+
+def test_idle_timeout_exports_on_later_packet_and_expire():
+    table = FlowTable(idle_timeout=5, active_timeout=300)
+    table.update(0.0, A, B, 17, 80, 5353, 53)
+    table.update(1.0, A, C, 6, 60, 40000, 22)
+    done = table.update(5.5, C, B, 6, 60, 1234, 80)
+    assert [(r.dst, r.reason) for r in done] == [(B, "idle")]
+    assert [r.dst for r in table.expire(100.0)] == [C, B]
+    assert len(table) == 0
+
+
+def test_active_timeout_exports_snapshot_and_keeps_orientation():
+    table = FlowTable(idle_timeout=30, active_timeout=10)
+    for i in range(12):
+        src, dst, sp, dp = (A, B, 50000, 443) if i % 2 == 0 else (B, A, 443, 50000)
+        done = table.update(float(i), src, dst, 6, 100, sp, dp)
+        if i < 10:
+            assert done == []
+    # the packet at t=10 closed the first 10 s as an "active" export
+    rec = table.get(A, B, 6, 50000, 443)
+    assert (rec.src, rec.sport, rec.packets, rec.first_ts) == (A, 50000, 2, 10.0)
+
+
+def test_lru_eviction_bounds_memory():
+    table = FlowTable(idle_timeout=1e9, active_timeout=1e9, max_flows=3)
+    for port in (1, 2, 3):
+        table.update(float(port), A, B, 6, 60, 40000, port)
+    table.update(4.0, A, B, 6, 60, 40000, 1)  # refresh flow 1
+    done = table.update(5.0, A, B, 6, 60, 40000, 4)
+    assert [(r.dport, r.reason) for r in done] == [(2, "evicted")]
+    assert len(table) == 3 and table.evictions == 1
+    assert sorted(r.dport for r in table.flush()) == [1, 3, 4]
+
+
+def test_flow_features_frame():
+    table = FlowTable()
+    table.update(0.0, A, B, 6, 100, 50000, 443)
+    table.update(2.0, B, A, 6, 300, 443, 50000)
+    df = flow_features(table.flush(), {A})
+    assert list(df.columns) == FLOW_FEATURES
+    row = df.iloc[0]
+    assert row["dport"] == 443.0
+    assert row["duration"] == 2.0
+    assert row["packets_log"] == pytest.approx(math.log1p(2))
+    assert row["mean_packet_size"] == 200.0
+    assert row["fwd_packet_ratio"] == 0.5
+    assert row["direction"] == 1.0
+    assert flow_features([], set()).shape == (0, len(FLOW_FEATURES))
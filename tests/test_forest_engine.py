@@ -0,0 +1,124 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from anomaly_detector import AnomalyDetector
+from forest_engine import CompiledForest, _fold_thresholds
+
+pytestmark = pytest.mark.unit
+
+TOL = 1e-9
+
+
+def _features(n=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    cols = {
+        "gauss": rng.normal(size=n),
+        "wide": rng.normal(1000.0, 250.0, size=n),
+        "tiny": rng.normal(3.0, 0.01, size=n),
+        "port": rng.integers(0, 65536, size=n).astype(float),
+        "flag": rng.integers(0, 2, size=n).astype(float),
+        "const": np.zeros(n),  # zero variance: scaler uses scale 1
+    }
+    return pd.DataFrame(cols)
+
+
+def _probe(df, seed=1):
+    rng = np.random.default_rng(seed)
+    X = df.to_numpy()
+    outliers = X[:300] * rng.uniform(-5, 5, size=(300, X.shape[1]))
+    return np.vstack([X, outliers, X.round(0), np.zeros((1, X.shape[1]))])
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"n_estimators": 100},
+        {"n_estimators": 60, "max_features": 0.5},
+        {"n_estimators": 40, "max_samples": 32},
+        {"n_estimators": 30, "max_samples": 1.0, "contamination": 0.1},
+    ],
+)
+def test_matches_sklearn(params):
+    df = _features()
+    det = AnomalyDetector(random_state=3)
+    det.train(df)
+    det.model = IsolationForest(random_state=3, **params).fit(
+        det.scaler.transform(df.to_numpy())
+    )
+
+    engine = CompiledForest.from_detector(det)
+    X = _probe(df)
+    ref = det.model.decision_function(det.scaler.transform(X))
+    got = engine.decision_function(X)
+    assert np.max(np.abs(got - ref)) < TOL
+    assert np.array_equal(got < 0, det.model.predict(det.scaler.transform(X)) == -1)
+    # Row-at-a-time calls agree with the batch
+    for i in (0, 17, len(X) - 1):
+        assert abs(engine.decision_function(X[i])[0] - ref[i]) < TOL
+
+
+def test_folded_thresholds_split_exactly_like_sklearn():
+    rng = np.random.default_rng(5)
+    thr = rng.normal(size=2000) * 3
+    mean = rng.normal(size=2000) * 1000
+    scale = rng.uniform(1e-3, 1e3, size=2000)
+    cut = _fold_thresholds(thr, mean, scale)
+
+    def goes_left(x):
+        return ((x - mean) / scale).astype(np.float32) <= thr
+
+    assert goes_left(cut).all()
+    assert not goes_left(np.nextafter(cut, np.inf)).any()
+
+
+def test_score_batch_uses_compiled_engine():
+    df = _features(800, seed=2)
+    det = AnomalyDetector(n_estimators=50, random_state=0)
+    det.train(df)
+    assert det.compiled is not None
+    X = _probe(df, seed=3)
+    scores, flags = det.score_batch(X)
+    ref = det.decision_scores(pd.DataFrame(X, columns=df.columns))
+    assert np.max(np.abs(scores - ref)) < TOL
+    assert np.array_equal(flags, ref < 0)
+
+    # Retraining drops the stale engine
+    old = det.compiled
+    det.train(df.iloc[:400])
+    assert det.compiled is not old
+
+
+def test_arrays_round_trip():
+    df = _features(500, seed=4)
+    det = AnomalyDetector(n_estimators=20, random_state=0)
+    det.train(df)
+    engine = det.compiled
+    clone = CompiledForest.from_arrays(engine.arrays(), engine.params())
+    X = _probe(df)
+    assert np.array_equal(clone.decision_function(X), engine.decision_function(X))
+    assert engine.n_trees == 20 and engine.nbytes > 0
+
+
+@pytest.mark.perf
+def test_single_row_latency_beats_sklearn():
+    df = _features(1000, seed=6)
+    det = AnomalyDetector(n_estimators=100, random_state=0)
+    det.train(df)
+    engine = det.compiled
+    row = df.to_numpy()[:1]
+    scaled = det.scaler.transform(row)
+
+    def per_call(fn, reps):
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(reps):
+            fn()
+        return (time.perf_counter() - t0) / reps
+
+    compiled = per_call(lambda: engine.decision_function(row), 200)
+    sklearn = per_call(lambda: det.model.decision_function(scaled), 20)
+    assert compiled * 5 < sklearn
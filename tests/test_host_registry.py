@@ -0,0 +1,92 @@
+import sys
+import threading
+
+import pytest
+
+import host_registry
+from host_registry import HostRegistry
+from ip_codec import ip_to_int
+
+pytestmark = pytest.mark.unit
+
+
+def test_fixed_registry_lookups():
+    reg = HostRegistry.fixed(["10.0.0.2", "fe80::1", "not-an-ip"])
+    assert len(reg) == 2
+    assert reg.is_local(ip_to_int("10.0.0.2"))
+    assert reg.is_local("fe80::1")
+    assert "10.0.0.3" not in reg
+    assert not reg.is_local("garbage")
+    assert reg.texts == {"10.0.0.2", "fe80::1"}
+    assert reg.refresh() is False
+
+
+def test_refresh_swaps_snapshot_and_notifies(monkeypatch):
+    current = {"addrs": frozenset({ip_to_int("192.0.2.10")})}
+    monkeypatch.setattr(
+        host_registry, "gather_local_addresses", lambda: current["addrs"]
+    )
+    reg = HostRegistry(use_netlink=False)
+    seen = []
+    reg.add_listener(seen.append)
+    assert reg.is_local("192.0.2.10")
+    assert reg.refresh() is False
+
+    # DHCP hands out a new address
+    current["addrs"] = frozenset({ip_to_int("192.0.2.99"), ip_to_int("2001:db8::5")})
+    assert reg.refresh() is True
+    assert not reg.is_local("192.0.2.10")
+    assert reg.is_local("2001:db8::5")
+    assert seen == [current["addrs"]]
+
+
+def test_background_refresh_polls(monkeypatch):
+    calls = threading.Event()
+
+    def _gather():
+        calls.set()
+        return frozenset()
+
+    monkeypatch.setattr(host_registry, "gather_local_addresses", _gather)
+    reg = HostRegistry(refresh_interval=0.05, use_netlink=False)
+    calls.clear()
+    reg.start()
+    try:
+        assert calls.wait(2.0)
+    finally:
+        reg.stop()
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="netlink is Linux-only"
+)
+def test_netlink_thread_starts_and_stops():
+    reg = HostRegistry(refresh_interval=0.05)
+    reg.start()
+    reg.stop()
+    assert reg._thread is None
+
+
+def test_processor_uses_injected_registry():
+    from packet_processor import PacketProcessor, ParsedPacket
+
+    reg = HostRegistry.fixed(["10.0.0.2"])
+    pp = PacketProcessor(window_size=5, hosts=reg)
+    assert pp._local_ips == {"10.0.0.2"}
+    pkt = ParsedPacket(
+        1.0, ip_to_int("10.0.0.2"), ip_to_int("8.8.8.8"), 6, 60, 50000, 443
+    )
+    assert pp.process_and_featurize(pkt) is not None
+    assert pp.last_processed_row()["direction"] == 1.0
+
+    # Legacy assignment swaps in a fixed registry
+    pp._local_ips = {"10.0.0.9"}
+    assert pp.hosts is not reg and pp.hosts.is_local("10.0.0.9")
+
+
+def test_processor_default_is_a_snapshot_without_thread():
+    from packet_processor import PacketProcessor
+
+    a, b = PacketProcessor(window_size=5), PacketProcessor(window_size=5)
+    assert a.hosts is not b.hosts
+    assert a.hosts._thread is None and b.hosts._thread is None
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly_detector import AnomalyDetector, load_detector, make_detector
+from hst_detector import HalfSpaceTreesDetector
+
+pytestmark = pytest.mark.unit
+
+
+def _make_X(n=500, d=4, seed=0, loc=0.0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        rng.normal(loc, 1, size=(n, d)), columns=[f"f{i}" for i in range(d)]
+    )
+
+
+def test_train_flags_contamination_share_and_outliers():
+    X = _make_X(2000)
+    det = HalfSpaceTreesDetector(
+        contamination=0.05, n_estimators=25, depth=8, window_size=200
+    )
+    det.train(X)
+    scores, flags = det.score_batch(X)
+    assert flags.mean() == pytest.approx(0.05, abs=0.01)
+    assert np.array_equal(flags, np.asarray(det.predict(X)) == "Anomaly")
+    assert np.allclose(scores, det.decision_scores(X))
+    far, far_flags = det.score_batch(np.full((3, 4), 8.0))
+    assert far_flags.all() and far.max() < np.quantile(scores, 0.01)
+
+
+def test_learn_follows_drift_with_constant_memory():
+    det = HalfSpaceTreesDetector(
+        contamination=0.05, n_estimators=20, depth=8, window_size=100
+    )
+    det.train(_make_X(1000))
+    shifted = _make_X(300, loc=5.0, seed=1).to_numpy()
+    assert det.score_batch(shifted)[1].mean() > 0.9
+
+    sizes = [a.nbytes for a in (det.reference, det.latest, det.split_value)]
+    for row in shifted[:250]:
+        det.learn(row)
+    assert det.swaps == 2 and det.stats()["window_fill"] == 50
+    assert [a.nbytes for a in (det.reference, det.latest, det.split_value)] == sizes
+    # The new regime is normal now; the old one has become the outlier
+    assert det.score_batch(shifted[250:])[1].mean() < 0.2
+    assert det.score_batch(_make_X(100, seed=2))[1].mean() > 0.9
+
+
+def test_batch_learn_matches_row_by_row():
+    X = _make_X(300)
+    one = HalfSpaceTreesDetector(n_estimators=10, depth=6, window_size=50)
+    many = HalfSpaceTreesDetector(n_estimators=10, depth=6, window_size=50)
+    one.train(X)
+    many.train(X)
+    stream = _make_X(120, seed=3).to_numpy()
+    for row in stream:
+        one.learn(row)
+    many.learn(stream)
+    assert one.swaps == many.swaps == 2
+    assert np.array_equal(one.reference, many.reference)
+    assert np.array_equal(one.latest, many.latest)
+    assert one.offset == many.offset
+
+
+def test_score_batch_aligns_named_columns():
+    X = _make_X(300)
+    det = HalfSpaceTreesDetector(n_estimators=10, depth=6, window_size=50)
+    det.train(X)
+    ref, _ = det.score_batch(X.to_numpy())
+    cols = list(reversed(X.columns))
+    got, _ = det.score_batch(X[cols].to_numpy(), cols)
+    assert np.array_equal(got, ref)
+    with pytest.raises(ValueError):
+        det.score_batch(np.zeros((2, 5)))
+    with pytest.raises(RuntimeError):
+        HalfSpaceTreesDetector().score_batch(X)
+
+
+def test_save_load_round_trip_keeps_stream_state(tmp_path):
+    X = _make_X(400)
+    det = HalfSpaceTreesDetector(
+        contamination=0.1, n_estimators=10, depth=6, window_size=50
+    )
+    det.train(X)
+    det.learn(_make_X(70, seed=4))
+    path = tmp_path / "hst.joblib"
+    det.save_model(str(path))
+
+    loaded = load_detector(str(path))
+    assert isinstance(loaded, HalfSpaceTreesDetector)
+    assert loaded.bundle_metadata()["engine"] == "hst"
+    assert loaded.bundle_metadata()["params"] == det.bundle_metadata()["params"]
+    assert np.array_equal(loaded.score_batch(X)[0], det.score_batch(X)[0])
+    tail = _make_X(40, seed=5)
+    det.learn(tail)
+    loaded.learn(tail)
+    assert loaded.swaps == det.swaps == 2
+    assert np.array_equal(loaded.reference, det.reference)
+
+
+def test_engine_mismatch_and_factory(tmp_path):
+    X = _make_X(200)
+    hst = make_detector("hst", n_estimators=5, depth=4, window_size=20)
+    iforest = make_detector("iforest", n_estimators=10)
+    assert isinstance(hst, HalfSpaceTreesDetector) and isinstance(
+        iforest, AnomalyDetector
+    )
+    with pytest.raises(ValueError):
+        make_detector("rrcf")
+
+    hst.train(X)
+    iforest.train(X)
+    hst.save_model(str(tmp_path / "hst.joblib"))
+    iforest.save_model(str(tmp_path / "if.joblib"))
+    with pytest.raises(RuntimeError, match="hst"):
+        AnomalyDetector().load_model(str(tmp_path / "hst.joblib"))
+    with pytest.raises(RuntimeError, match="iforest"):
+        HalfSpaceTreesDetector().load_model(str(tmp_path / "if.joblib"))
+    assert isinstance(load_detector(str(tmp_path / "if.joblib")), AnomalyDetector)
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from ingest_queue import IngestQueue
+
+pytestmark = pytest.mark.unit
+
+
+def _fill(q, n):
+    return [q.put(i) for i in range(n)]
+
+
+def _drain(q):
+    out = []
+    while len(q):
+        out.append(q.get(timeout=0))
+        q.task_done()
+    return out
+
+
+def test_drop_newest_keeps_backlog():
+    q = IngestQueue(4, "drop-newest")
+    assert _fill(q, 6) == [True] * 4 + [False] * 2
+    assert _drain(q) == [0, 1, 2, 3]
+    s = q.stats()
+    assert (s["offered"], s["enqueued"], s["dropped"], s["processed"]) == (6, 4, 2, 4)
+    assert s["high_water"] == 4 and s["depth"] == 0
+
+
+def test_drop_oldest_keeps_fresh_packets():
+    q = IngestQueue(4, "drop-oldest")
+    assert all(_fill(q, 6))
+    assert _drain(q) == [2, 3, 4, 5]
+    s = q.stats()
+    assert s["offered"] == s["processed"] + s["dropped"] + s["depth"]
+    assert s["dropped"] == 2
+
+
+def test_sample_thins_stream_before_full():
+    q = IngestQueue(100, "sample", seed=3)
+    _fill(q, 50)
+    assert q.dropped == 0
+    _fill(q, 40)
+    # Between half and full, admission probability falls towards zero
+    assert q.dropped > 0 and len(q) == 90 - q.dropped
+    _fill(q, 5000)
+    assert len(q) == 100
+    assert q.offered == q.dropped + len(q)
+
+
+def test_close_drains_then_stops_consumer():
+    q = IngestQueue(1000)
+    seen = []
+
+    def consume():
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            seen.append(item)
+            q.task_done()
+
+    t = threading.Thread(target=consume)
+    t.start()
+    _fill(q, 300)
+    q.close()
+    t.join(timeout=5)
+    assert not t.is_alive()
+    assert seen == list(range(300))
+    assert q.processed == 300
+    assert q.put("late") is False and q.dropped == 1
+
+
+def test_get_times_out_and_rejects_bad_policy():
+    assert IngestQueue(2).get(timeout=0.01) is None
+    with pytest.raises(ValueError):
+        IngestQueue(2, "block")
@@ -0,0 +1,42 @@
+import pytest
+
+from ip_codec import V4_MAPPED, as_ip_int, int_to_ip, ip_to_int, is_loopback, is_v4
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "0.0.0.0",
+        "10.0.0.2",
+        "255.255.255.255",
+        "::",
+        "::1",
+        "2001:db8::8:800:200c:417a",
+        "fe80::1",
+    ],
+)
+def test_round_trip(text):
+    assert int_to_ip(ip_to_int(text)) == text
+
+
+def test_ipv4_uses_mapped_range():
+    assert ip_to_int("1.2.3.4") == V4_MAPPED | 0x01020304
+    assert is_v4(ip_to_int("1.2.3.4"))
+    assert not is_v4(ip_to_int("2001:db8::1"))
+    # IPv4-mapped IPv6 text lands on the same value
+    assert ip_to_int("::ffff:1.2.3.4") == ip_to_int("1.2.3.4")
+
+
+def test_loopback_and_coercion():
+    assert is_loopback(ip_to_int("127.8.0.1"))
+    assert is_loopback(ip_to_int("::1"))
+    assert not is_loopback(ip_to_int("10.0.0.1"))
+    assert as_ip_int(ip_to_int("10.0.0.1")) == as_ip_int("10.0.0.1")
+
+
+@pytest.mark.parametrize("bad", ["", "10.0.0", "300.1.1.1", "not-an-ip", "1::2::3"])
+def test_invalid_text_raises_value_error(bad):
+    with pytest.raises(ValueError):
+        ip_to_int(bad)
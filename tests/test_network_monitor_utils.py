@@ -2,6 +2,7 @@ import configparser
 import importlib
 import math
 import sys
+import time
 import types
 
 import pytest
@@ -12,6 +13,8 @@ def network_monitor_module(monkeypatch, tmp_path):
     fake_scapy = types.ModuleType("scapy")
     fake_scapy_all = types.ModuleType("scapy.all")
     fake_scapy_all.sniff = lambda *args, **kwargs: None
+    for layer in ("IP", "TCP", "UDP"):
+        setattr(fake_scapy_all, layer, type(layer, (), {}))
     monkeypatch.setitem(sys.modules, "scapy", fake_scapy)
     monkeypatch.setitem(sys.modules, "scapy.all", fake_scapy_all)
     monkeypatch.setenv("SQLITE_DB", str(tmp_path / "ids_test.db"))
@@ -80,4 +83,646 @@ def test_threshold_fallback_to_defaults(network_monitor_module):
     assert monitor._thr_high == pytest.approx(-0.10)
     assert monitor._thr_med == pytest.approx(-0.05)
     assert monitor.enable_sigs is True
-    assert monitor.sig_engine is not None
\ No newline at end of file
+    assert monitor.sig_engine is not None
+
+def test_analyze_packet_uses_incremental_features(network_monitor_module, monkeypatch):
+    import numpy as np
+    import pandas as pd
+
+    mod = network_monitor_module
+    monitor = mod.NetworkMonitor(_build_config(enable_signatures=True))
+    monitor.online_retrain_interval = 0
+    rng = np.random.default_rng(0)
+    monitor.detector.train(
+        pd.DataFrame(rng.normal(size=(64, 7)), columns=mod.PacketProcessor.FEATURES)
+    )
+
+    def _no_rebuild():
+        raise AssertionError("window DataFrame rebuilt on the packet path")
+
+    monkeypatch.setattr(monitor.processor, "get_dataframe", _no_rebuild)
+    for i in range(5):
+        pkt = mod._SyntheticPacket(
+            timestamp=1000.0 + i,
+            length=120,
+            src="198.51.100.7",
+            dest="10.0.0.2",
+            proto=6,
+            sport=40000,
+            dport=22 + i,
+        )
+        monitor._analyze_packet(pkt)
+    assert monitor._packet_counter == 5
+    assert monitor.processor.last_processed_row()["unique_dports_15s"] == 5.0
+
+
+def test_micro_batch_scores_once_per_batch(network_monitor_module, monkeypatch):
+    import numpy as np
+    import pandas as pd
+
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=True)
+    cfg["Monitoring"]["BatchSize"] = "4"
+    cfg["Monitoring"]["BatchMaxLatencyMs"] = "60000"
+    cfg["Monitoring"]["OnlineRetrainInterval"] = "0"
+    monitor = mod.NetworkMonitor(cfg)
+    rng = np.random.default_rng(1)
+    monitor.detector.train(
+        pd.DataFrame(rng.normal(size=(64, 7)), columns=mod.PacketProcessor.FEATURES)
+    )
+
+    calls = []
+    real_scores = monitor.detector.score_batch
+    monkeypatch.setattr(
+        monitor.detector,
+        "score_batch",
+        lambda X, columns=None: calls.append(len(X)) or real_scores(X, columns),
+    )
+    sunk = []
+    monkeypatch.setattr(mod.webdb, "insert_alerts", lambda items: sunk.append(list(items)))
+
+    for i in range(10):
+        monitor._on_packet(
+            mod._SyntheticPacket(
+                timestamp=2000.0 + i * 0.01,
+                length=90,
+                src="198.51.100.8",
+                dest="10.0.0.2",
+                proto=6,
+                sport=40000,
+                dport=22,
+            )
+        )
+    assert calls == [4, 4]
+    assert len(monitor._batch) == 2
+    monitor._flush_batch()
+    assert calls == [4, 4, 2]
+    assert monitor._packet_counter == 10
+    # inbound-sensitive-port fires for every packet; one bulk insert per batch
+    assert [len(b) >= 2 for b in sunk] == [True, True, True]
+
+
+def test_micro_batch_alerts_follow_engine_flags(network_monitor_module, monkeypatch):
+    import numpy as np
+
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=False)
+    cfg["Monitoring"]["BatchSize"] = "4"
+    cfg["Monitoring"]["BatchMaxLatencyMs"] = "60000"
+    cfg["Monitoring"]["OnlineRetrainInterval"] = "0"
+    monitor = mod.NetworkMonitor(cfg)
+    # Flags that disagree with the sign of the score: the engine decides
+    monitor.detector.score_batch = lambda X, columns=None: (
+        np.array([-0.5, 0.5, -0.5, 0.5]),
+        np.array([False, True, False, True]),
+    )
+    flagged = []
+    monkeypatch.setattr(
+        monitor, "_handle_anomaly", lambda row, score: flagged.append(score) or {}
+    )
+    monkeypatch.setattr(mod.webdb, "insert_alerts", lambda items: None)
+    for i in range(4):
+        monitor._on_packet(
+            mod._SyntheticPacket(
+                timestamp=3000.0 + i * 0.01,
+                length=90,
+                src="198.51.100.9",
+                dest="10.0.0.2",
+                proto=6,
+                sport=40000,
+                dport=22,
+            )
+        )
+    assert flagged == [0.5, 0.5]
+
+
+def _write_pcap(path, n):
+    import struct
+
+    with open(path, "wb") as fh:
+        fh.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for i in range(n):
+            l4 = struct.pack("!HHIIBBHHH", 40000 + i % 50, 22 + i % 5, 0, 0, 0x50, 2, 0, 0, 0)
+            ip = struct.pack(
+                "!BBHHHBBH4s4s", 0x45, 0, 20 + len(l4), 0, 0, 64, 6, 0,
+                bytes([198, 51, 100, i % 8]), bytes([10, 0, 0, 2]),
+            )
+            frame = b"\x00" * 12 + b"\x08\x00" + ip + l4
+            fh.write(struct.pack("<IIII", 3000 + i // 100, (i % 100) * 10000, len(frame), len(frame)))
+            fh.write(frame)
+
+
+def test_train_and_replay_from_pcap(network_monitor_module, monkeypatch, tmp_path):
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=False)
+    cfg["Monitoring"]["OnlineRetrainInterval"] = "0"
+    monkeypatch.setattr(mod.webdb, "insert_alerts", lambda items: None)
+    monkeypatch.setattr(mod.webdb, "record_devices", lambda ips: None)
+    pcap = str(tmp_path / "replay.pcap")
+    model = str(tmp_path / "model.joblib")
+    _write_pcap(pcap, 300)
+
+    trainer = mod.NetworkMonitor(cfg)
+    trainer.train_from_pcap(pcap, 120, model)
+    assert trainer.detector.model is not None
+
+    replayer = mod.NetworkMonitor(cfg)
+    stats = replayer.replay_pcap(pcap, model)
+    assert stats["frames"] == 300
+    assert stats["packets"] == 300
+    assert replayer._packet_counter == 300
+
+
+def test_flow_mode_scores_once_per_exported_flow(network_monitor_module, monkeypatch):
+    import numpy as np
+    import pandas as pd
+
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=False)
+    cfg["Monitoring"]["ScoringGranularity"] = "flow"
+    cfg["Flows"] = {"IdleTimeoutSeconds": "5", "ActiveTimeoutSeconds": "600"}
+    monitor = mod.NetworkMonitor(cfg)
+    rng = np.random.default_rng(3)
+    monitor.detector.train(
+        pd.DataFrame(rng.normal(size=(64, len(mod.FLOW_FEATURES))), columns=mod.FLOW_FEATURES)
+    )
+    calls = []
+    real_scores = monitor.detector.score_batch
+    monkeypatch.setattr(
+        monitor.detector,
+        "score_batch",
+        lambda X, columns=None: calls.append(len(X)) or real_scores(X, columns),
+    )
+    monkeypatch.setattr(mod.webdb, "insert_alerts", lambda items: None)
+    monkeypatch.setattr(mod.webdb, "record_devices", lambda ips: None)
+
+    def pkt(ts, src, dst, sport, dport):
+        return mod._SyntheticPacket(
+            timestamp=ts, length=120, src=src, dest=dst, proto=6, sport=sport, dport=dport
+        )
+
+    # 200 packets of one conversation in both directions, then a second flow
+    for i in range(200):
+        if i % 2:
+            monitor._on_packet(pkt(1000.0 + i * 0.01, "203.0.113.5", "10.0.0.2", 443, 51000))
+        else:
+            monitor._on_packet(pkt(1000.0 + i * 0.01, "10.0.0.2", "203.0.113.5", 51000, 443))
+    assert calls == []
+    assert len(monitor.flow_table) == 1
+    # a packet 10s later idles out the first flow
+    monitor._on_packet(pkt(1012.0, "10.0.0.2", "198.51.100.1", 52000, 80))
+    assert calls == [1]
+    monitor._flush_flows()
+    assert calls == [1, 1]
+    assert monitor._packet_counter == 2
+
+
+def test_live_training_keeps_all_packets_with_time_window(network_monitor_module, monkeypatch, tmp_path):
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=False)
+    cfg["Features"] = {"WindowSeconds": "0.5", "WindowMaxMB": "1"}
+    pcap = str(tmp_path / "train.pcap")
+    _write_pcap(pcap, 300)
+
+    monitor = mod.NetworkMonitor(cfg)
+    trained = {}
+    monkeypatch.setattr(monitor, "_validate_interface", lambda iface: None)
+    monkeypatch.setattr(
+        monitor, "_capture", lambda iface, handler, count=0: [handler(f) for f in mod.pcap_frames(pcap)]
+    )
+    monkeypatch.setattr(monitor.detector, "train", lambda df: trained.setdefault("rows", len(df)))
+    monkeypatch.setattr(monitor.detector, "save_model", lambda path: None)
+
+    monitor.capture_and_train("eth0", 300, str(tmp_path / "m.joblib"))
+
+    assert trained["rows"] == 300
+    stats = monitor.processor.window_stats()
+    assert stats["span_seconds"] <= 0.5 and stats["expired"] > 0
+
+
+def test_queued_capture_processes_everything_and_publishes_stats(network_monitor_module, monkeypatch, tmp_path):
+    from packet_processor import ParsedPacket
+
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=False)
+    cfg["Capture"] = {"QueueSize": "64", "QueuePolicy": "drop-newest"}
+    pcap = str(tmp_path / "q.pcap")
+    _write_pcap(pcap, 200)
+
+    monitor = mod.NetworkMonitor(cfg)
+    seen = []
+    published = {}
+    monkeypatch.setattr(monitor, "_on_packet", seen.append)
+    monkeypatch.setattr(mod.webdb, "set_runtime_stats", lambda name, data: published.__setitem__(name, data))
+
+    def _feed(iface, handler, count=0):
+        for frame in mod.pcap_frames(pcap):
+            # Throttle so the bounded queue never overflows in this test
+            while len(monitor.ingest) >= 60:
+                time.sleep(0.001)
+            handler(frame)
+
+    monkeypatch.setattr(monitor, "_capture", _feed)
+    monitor._capture_queued("eth0")
+    monitor._report_stats()
+
+    assert len(seen) == 200
+    assert all(isinstance(p, ParsedPacket) for p in seen)
+    assert published["ingest"]["processed"] == 200
+    assert published["ingest"]["dropped"] == 0
+    assert "rows" in published["window"]
+
+
+def test_bad_capture_filter_fails_before_capture(network_monitor_module, monkeypatch):
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=False)
+    cfg["Capture"] = {"Filter": "tcp port 80", "ExcludePorts": "5000, 8080"}
+    monitor = mod.NetworkMonitor(cfg)
+    assert monitor.capture_filter.exclude_ports == [5000, 8080]
+
+    import bpf
+
+    monkeypatch.setattr(bpf, "compile_expression", lambda *a, **k: (_ for _ in ()).throw(ValueError("bad")))
+    opened = []
+    monkeypatch.setattr(monitor, "_capture_from", lambda *a: opened.append(a))
+    with pytest.raises(ValueError):
+        monitor._capture("eth0", lambda pkt: None)
+    assert opened == []
+
+
+def test_sampling_skips_model_but_not_signatures(network_monitor_module, monkeypatch):
+    import numpy as np
+    import pandas as pd
+
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=True)
+    cfg["Monitoring"]["OnlineRetrainInterval"] = "0"
+    cfg["Monitoring"]["SamplingTargetLagSeconds"] = "1"
+    monitor = mod.NetworkMonitor(cfg)
+    monitor.detector.train(
+        pd.DataFrame(np.random.default_rng(4).normal(size=(64, 7)), columns=mod.PacketProcessor.FEATURES)
+    )
+    predicted = []
+    real_scores = monitor.detector.score_batch
+    monkeypatch.setattr(
+        monitor.detector, "score_batch", lambda X, columns=None: predicted.append(len(X)) or real_scores(X, columns)
+    )
+    sunk = []
+    monkeypatch.setattr(mod.webdb, "insert_alerts", lambda items: sunk.extend(items))
+    monkeypatch.setattr(mod.webdb, "record_devices", lambda ips: None)
+    # Pin the rate: the synthetic timestamps carry no real lag
+    monitor.sampler._set_rate(0.25)
+    monitor.sampler.enabled = False
+
+    for i in range(400):
+        monitor._on_packet(
+            mod._SyntheticPacket(
+                timestamp=5000.0 + i * 0.001,
+                length=90,
+                src="198.51.100.9",
+                dest="10.0.0.2",
+                proto=6,
+                sport=30000 + i,
+                dport=22,
+            )
+        )
+    kept = monitor.sampler.kept
+    assert 50 < kept < 150
+    assert len(predicted) == kept == monitor._packet_counter
+    # Scan features still count every packet; signatures fire for all of them
+    assert monitor.processor.last_processed_row()["unique_dports_15s"] == 1.0
+    signatures = [a for a in sunk if a["kind"] == "SIGNATURE"]
+    assert sum(1 for a in signatures if a["label"].startswith("inbound-sensitive-port")) == 400
+    assert {a["sample_rate"] for a in sunk} == {0.25}
+
+
+def test_online_retrain_runs_off_the_packet_path(network_monitor_module, monkeypatch, tmp_path):
+    import threading
+
+    import numpy as np
+    import pandas as pd
+
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=False)
+    cfg["Monitoring"]["OnlineRetrainInterval"] = "60"
+    cfg["DEFAULT"]["ModelPath"] = str(tmp_path / "models" / "live.joblib")
+    monitor = mod.NetworkMonitor(cfg)
+    monitor.detector.train(
+        pd.DataFrame(np.random.default_rng(5).normal(size=(64, 7)), columns=mod.PacketProcessor.FEATURES)
+    )
+    original = monitor.detector
+    monkeypatch.setattr(mod.webdb, "insert_alerts", lambda items: None)
+    monkeypatch.setattr(mod.webdb, "record_devices", lambda ips: None)
+
+    release = threading.Event()
+    trained = []
+    from anomaly_detector import AnomalyDetector
+
+    real_train = AnomalyDetector.train
+
+    def _slow_train(self, df):
+        trained.append(len(df))
+        release.wait(10)
+        real_train(self, df)
+
+    monkeypatch.setattr(AnomalyDetector, "train", _slow_train)
+
+    def feed(start, n):
+        for i in range(start, start + n):
+            monitor._on_packet(
+                mod._SyntheticPacket(
+                    timestamp=7000.0 + i * 0.01,
+                    length=100 + i % 50,
+                    src="198.51.100.10",
+                    dest="10.0.0.2",
+                    proto=6,
+                    sport=40000 + i % 7,
+                    dport=80,
+                )
+            )
+
+    started = time.perf_counter()
+    feed(0, 150)  # crosses 60 (starts a retrain) and 120 (trainer busy)
+    assert time.perf_counter() - started < 5
+    assert monitor._packet_counter == 150
+    assert monitor.detector is original
+    assert monitor.retrain_stats()["running"] is True
+    assert monitor.retrain_stats()["skipped"] == 1
+
+    release.set()
+    monitor._wait_retrain()
+    stats = monitor.retrain_stats()
+    assert trained == [60]
+    assert monitor.detector is not original and monitor.detector.compiled is not None
+    assert stats["retrains"] == 1 and stats["last_rows"] == 60
+    assert stats["last_packets_behind"] == 90 and stats["last_staleness_s"] >= 0
+    saved = tmp_path / "models" / "live.joblib"
+    assert sorted(p.name for p in saved.parent.iterdir()) == [
+        "live.joblib",
+        "live.joblib.forest",
+        "live.joblib.meta.json",
+    ]
+
+
+def test_online_retrain_saves_to_the_served_bundle(network_monitor_module, monkeypatch, tmp_path):
+    import numpy as np
+    import pandas as pd
+
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=False)
+    cfg["DEFAULT"]["ModelPath"] = str(tmp_path / "configured.joblib")
+    monitor = mod.NetworkMonitor(cfg)
+    monkeypatch.setattr(mod.webdb, "set_runtime_stats", lambda c, s: None)
+    features = pd.DataFrame(
+        np.random.default_rng(6).normal(size=(64, 7)), columns=mod.PacketProcessor.FEATURES
+    )
+    monitor.detector.train(features)
+    served = tmp_path / "served.joblib"
+    monitor.detector.save_model(str(served))
+    monitor._note_model_loaded(str(served))  # e.g. monitor --model served.joblib
+
+    monitor._retrain(features, time.time(), 0)
+    assert monitor.retrain_stats()["retrains"] == 1
+    assert not (tmp_path / "configured.joblib").exists()
+    assert monitor._bundle_signature(str(served)) == monitor._model_signature
+    reloaded = type(monitor.detector)()
+    reloaded.load_model(str(served))
+    X = features.to_numpy()
+    assert np.array_equal(reloaded.score_batch(X)[0], monitor.detector.score_batch(X)[0])
+
+
+def test_streaming_engine_learns_scored_packets(network_monitor_module, monkeypatch, tmp_path):
+    import numpy as np
+    import pandas as pd
+
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=False)
+    cfg["Monitoring"]["OnlineRetrainInterval"] = "10"
+    cfg["Detector"] = {"Engine": "hst", "HSTTrees": "8", "HSTDepth": "6", "HSTWindowSize": "20"}
+    monitor = mod.NetworkMonitor(cfg)
+    assert monitor.detector.streaming and monitor.detector.n_estimators == 8
+    monitor.detector.train(
+        pd.DataFrame(np.random.default_rng(5).normal(size=(64, 7)), columns=mod.PacketProcessor.FEATURES)
+    )
+    original = monitor.detector
+    monkeypatch.setattr(mod.webdb, "insert_alerts", lambda items: None)
+    monkeypatch.setattr(mod.webdb, "record_devices", lambda ips: None)
+
+    for i in range(50):
+        monitor._on_packet(
+            mod._SyntheticPacket(
+                timestamp=7000.0 + i * 0.01,
+                length=100 + i % 50,
+                src="198.51.100.10",
+                dest="10.0.0.2",
+                proto=6,
+                sport=40000 + i % 7,
+                dport=80,
+            )
+        )
+
+    # Every scored packet was learned; no batch refit was started
+    assert monitor._packet_counter == 50
+    assert original.swaps == 2 and original.stats()["window_fill"] == 10
+    assert monitor.detector is original and monitor._retrain_thread is None
+    assert len(monitor._recent) == 0
+
+    path = tmp_path / "hst.joblib"
+    monitor._save_streaming_model(str(path))
+    assert path.exists()
+
+
+def test_model_hot_reload_swaps_valid_bundles_only(network_monitor_module, monkeypatch, tmp_path):
+    import threading
+
+    import numpy as np
+    import pandas as pd
+
+    from anomaly_detector import AnomalyDetector
+
+    mod = network_monitor_module
+    monkeypatch.setattr(mod.webdb, "DB", tmp_path / "reload.db")
+    mod.webdb.init()
+    cfg = _build_config(enable_signatures=False)
+    cfg["Monitoring"]["ModelWatchSeconds"] = "0.02"
+    monitor = mod.NetworkMonitor(cfg)
+    features = mod.PacketProcessor.FEATURES
+
+    def bundle(seed, columns=features):
+        det = AnomalyDetector(n_estimators=10, random_state=seed)
+        det.train(pd.DataFrame(np.random.default_rng(seed).normal(size=(64, len(columns))), columns=columns))
+        return det
+
+    def wait_for(predicate):
+        deadline = time.monotonic() + 10
+        while not predicate() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert predicate()
+
+    path = str(tmp_path / "live.joblib")
+    bundle(1).save_model(path)
+    monitor.detector.load_model(path)
+    stop = threading.Event()
+    try:
+        monitor._start_model_watch(path, stop)
+        stats = monitor.model_stats
+        first = monitor.detector
+
+        # An API request reloads the same path
+        mod.webdb.post_command("model_reload")
+        wait_for(lambda: stats()["reloads"] == 1)
+        assert stats()["last_reload_reason"] == "api" and monitor.detector is not first
+
+        # A new bundle on disk is picked up once it stops changing
+        replacement = bundle(2)
+        replacement.save_model(path)
+        wait_for(lambda: stats()["reloads"] == 2)
+        assert stats()["last_reload_reason"] == "file"
+        assert stats()["feature_checksum"] == replacement.bundle_metadata()["feature_checksum"]
+        live = monitor.detector
+        scores, _ = live.score_batch(np.zeros((3, len(features))), features)
+        assert np.allclose(scores, replacement.score_batch(np.zeros((3, len(features))))[0])
+
+        # A bundle for other features is refused; the live model stays
+        bundle(3, columns=[f"f{i}" for i in range(len(features))]).save_model(path)
+        wait_for(lambda: stats()["failures"] == 1)
+        assert monitor.detector is live and stats()["reloads"] == 2
+        assert "do not match" in stats()["last_error"]
+        wait_for(lambda: mod.webdb.get_runtime_stats()["model"]["failures"] == 1)
+    finally:
+        stop.set()
+
+
+def test_train_from_parquet_streams_history(network_monitor_module, tmp_path):
+    import numpy as np
+    import pandas as pd
+
+    from anomaly_detector import load_detector
+
+    mod = network_monitor_module
+    features = mod.PacketProcessor.FEATURES
+    rng = np.random.default_rng(0)
+    history = tmp_path / "history"
+    history.mkdir()
+    parts = []
+    for day in range(3):
+        part = pd.DataFrame(rng.normal(day, 1.0, size=(4000, len(features))), columns=features)
+        part["src_ip"] = "10.0.0.1"
+        part.to_parquet(history / f"day{day}.parquet", row_group_size=1000)
+        parts.append(part[features])
+    everything = pd.concat(parts)
+
+    monitor = mod.NetworkMonitor(_build_config(enable_signatures=False))
+    model_path = str(tmp_path / "model.joblib")
+    stats = monitor.train_from_parquet(str(history), 500, model_path, batch_rows=700)
+    assert stats["rows"] == 12_000 and stats["sample"] == 500 and stats["chunks"] >= 18
+    assert stats["rows_per_sec"] > 0 and stats["peak_rss_mb"] > 0
+
+    # The scaler saw every row, not just the sample
+    det = load_detector(model_path)
+    assert np.allclose(det.scaler.mean_, everything.mean().to_numpy())
+    assert np.allclose(det.scaler.scale_, everything.std(ddof=0).to_numpy())
+    assert det.feature_names == features
+
+
+def test_score_cache_answers_repeated_packets(network_monitor_module, monkeypatch):
+    import numpy as np
+    import pandas as pd
+
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=False)
+    cfg["Monitoring"]["OnlineRetrainInterval"] = "0"
+    cfg["Monitoring"]["ScoreCacheSize"] = "128"
+    monitor = mod.NetworkMonitor(cfg)
+    rng = np.random.default_rng(3)
+    monitor.detector.train(
+        pd.DataFrame(rng.normal(size=(64, 7)), columns=mod.PacketProcessor.FEATURES)
+    )
+    calls = []
+    real_scores = monitor.detector.score_batch
+    monkeypatch.setattr(
+        monitor.detector,
+        "score_batch",
+        lambda X, columns=None: calls.append(len(X)) or real_scores(X, columns),
+    )
+    published = {}
+    monkeypatch.setattr(mod.webdb, "set_runtime_stats", lambda c, s: published.__setitem__(c, s))
+
+    for i in range(40):
+        monitor._on_packet(
+            mod._SyntheticPacket(
+                timestamp=3000.0 + i * 0.5,
+                length=90,
+                src="198.51.100.8",
+                dest="10.0.0.2",
+                proto=6,
+                sport=40000,
+                dport=22,
+            )
+        )
+    assert monitor._packet_counter == 40
+    # The first packet has no time_diff and the second a new port count
+    assert len(calls) <= 3
+    monitor._report_stats()
+    assert published["score_cache"]["hits"] == 40 - len(calls)
+
+    # A swapped-in model never sees the old model's scores
+    monitor.detector = type(monitor.detector)(n_estimators=16, random_state=1)
+    monitor.detector.train(
+        pd.DataFrame(rng.normal(size=(64, 7)), columns=mod.PacketProcessor.FEATURES)
+    )
+    vec = np.zeros((1, 7))
+    scores, _ = monitor._score(vec, mod.PacketProcessor.FEATURES)
+    assert scores[0] == monitor.detector.score_batch(vec)[0][0]
+    assert monitor.score_cache.invalidations == 1
+
+
+def test_alert_percentiles_drive_severity(network_monitor_module, monkeypatch):
+    import numpy as np
+
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=False, thresholds="-0.20, -0.10")
+    cfg["Monitoring"]["AlertPercentiles"] = "1, 5"
+    cfg["Monitoring"]["AlertPercentileWindow"] = "20000"
+    monitor = mod.NetworkMonitor(cfg)
+    published = {}
+    monkeypatch.setattr(mod.webdb, "set_runtime_stats", lambda c, s: published.__setitem__(c, s))
+
+    # Fixed thresholds until the estimate has warmed up
+    assert monitor.alert_thresholds() == (-0.20, -0.10)
+    monitor._report_stats()
+    assert published["thresholds"]["mode"] == "percentile"
+    assert published["thresholds"]["source"] == "fixed"
+
+    rng = np.random.default_rng(2)
+    scores = rng.normal(0.05, 0.05, 10000)
+    monitor.detector.score_batch = lambda X, columns=None: (scores, scores < 0)
+    monitor._score(np.zeros((len(scores), 7)), mod.PacketProcessor.FEATURES)
+    high, medium = monitor.alert_thresholds()
+    assert high == pytest.approx(np.quantile(scores, 0.01), abs=0.01)
+    assert medium == pytest.approx(np.quantile(scores, 0.05), abs=0.01)
+    assert monitor._severity_from_score(high - 0.01) == "high"
+    assert monitor._severity_from_score((high + medium) / 2) == "medium"
+    assert monitor._severity_from_score(medium + 0.01) == "low"
+
+    monitor._report_stats()
+    stats = published["thresholds"]
+    assert stats["source"] == "percentile" and stats["high"] == high
+    assert stats["percentiles"] == [1.0, 5.0] and stats["total"] == 10000
+    assert (stats["fixed_high"], stats["fixed_medium"]) == (-0.20, -0.10)
+
+    # Without AlertPercentiles nothing is estimated
+    plain = mod.NetworkMonitor(_build_config(enable_signatures=False))
+    assert plain.score_quantiles is None
+    assert plain.threshold_stats()["mode"] == "fixed"
+
+
+def test_invalid_alert_percentiles_fall_back_with_warning(network_monitor_module, caplog):
+    mod = network_monitor_module
+    cfg = _build_config(enable_signatures=False, thresholds="-0.20, -0.10")
+    cfg["Monitoring"]["AlertPercentiles"] = "1, high"
+    with caplog.at_level("WARNING", logger="ids.monitor"):
+        monitor = mod.NetworkMonitor(cfg)
+    assert monitor.score_quantiles is None
+    assert monitor.alert_thresholds() == (-0.20, -0.10)
+    assert "AlertPercentiles" in caplog.text
@@ -18,3 +18,48 @@ def test_ops_health_and_retention_and_backup():
     assert bk.status_code == 200
     ct = bk.headers.get("Content-Type", "").lower()
     assert ("octet-stream" in ct) or ("sqlite" in ct) or ("zip" in ct)
+
+
+def test_runtime_stats_endpoint(monkeypatch):
+    monkeypatch.setattr(api, "REQUIRE_AUTH", False)
+    api.webdb.set_runtime_stats("window", {"rows": 12, "evicted": 0})
+    r = api.app.test_client().get("/api/runtime")
+    assert r.status_code == 200
+    body = r.get_json()
+    assert body["ok"] is True
+    assert body["components"]["window"]["rows"] == 12
+
+
+def test_model_reload_request_and_health_report(monkeypatch):
+    monkeypatch.setattr(api, "REQUIRE_AUTH", False)
+    c = api.app.test_client()
+    r = c.post("/api/model/reload")
+    assert r.status_code == 202
+    assert api.webdb.get_command("model_reload")["id"] == r.get_json()["id"]
+
+    api.webdb.set_runtime_stats(
+        "model", {"path": "models/iforest.joblib", "reloads": 3, "failures": 0}
+    )
+    body = c.get("/healthz").get_json()
+    assert (
+        body["model"]["reloads"] == 3
+        and body["model"]["path"] == "models/iforest.joblib"
+    )
+
+
+def test_alert_thresholds_endpoint(monkeypatch):
+    monkeypatch.setattr(api, "REQUIRE_AUTH", False)
+    api.webdb.set_runtime_stats(
+        "thresholds",
+        {"mode": "percentile", "source": "percentile", "high": -0.07, "medium": -0.01},
+    )
+    api.webdb.set_runtime_stats(
+        "thresholds-shard1", {"mode": "fixed", "high": -0.1, "medium": -0.05}
+    )
+    body = api.app.test_client().get("/api/thresholds").get_json()
+    assert body["ok"] is True
+    assert (
+        body["thresholds"]["high"] == -0.07
+        and body["thresholds"]["source"] == "percentile"
+    )
+    assert body["shards"]["thresholds-shard1"]["mode"] == "fixed"
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -83,3 +84,270 @@ def test_is_ephemeral_sport_flag():
     feats, _ = pp.engineer_features(df)
     assert feats["is_ephemeral_sport"].iloc[0] == 1.0
     assert feats["is_ephemeral_sport"].iloc[1] == 0.0
+
+
+def test_packet_window_wraps_and_views_are_zero_copy():
+    from packet_processor import PacketWindow
+
+    win = PacketWindow(capacity=4)
+    for i in range(10):
+        win.append(float(i), f"10.0.0.{i % 3}", "8.8.8.8", 6, 100 + i, 50000, i)
+    assert len(win) == 4
+    assert win.first_seq == 6
+    ts = win.column("timestamp")
+    assert ts.tolist() == [6.0, 7.0, 8.0, 9.0]
+    assert win.column("dport").dtype == np.uint16
+    # Views alias the preallocated storage instead of copying it
+    assert np.shares_memory(ts, win._cols["timestamp"])
+    df = win.to_dataframe()
+    assert df["src_ip"].tolist() == ["10.0.0.0", "10.0.0.1", "10.0.0.2", "10.0.0.0"]
+    # Evicted rows release their interned IPs
+    assert len(win._ips) == 4
+
+
+def test_set_window_size_keeps_most_recent_rows():
+    pp = PacketProcessor(window_size=10)
+    pp.packet_data.extend(
+        {
+            "timestamp": float(i),
+            "src_ip": f"10.0.0.{i}",
+            "dest_ip": "10.0.0.254",
+            "protocol": 17,
+            "packet_size": 64,
+            "sport": 1000 + i,
+            "dport": 53,
+        }
+        for i in range(8)
+    )
+    pp.set_window_size(3)
+    df = pp.get_dataframe()
+    assert df["timestamp"].tolist() == [5.0, 6.0, 7.0]
+    assert df["src_ip"].tolist() == ["10.0.0.5", "10.0.0.6", "10.0.0.7"]
+    pp.set_window_size(6)
+    pp.packet_data.append_record(
+        {"timestamp": 8.0, "src_ip": "10.0.0.8", "dest_ip": "10.0.0.254"}
+    )
+    assert pp.get_dataframe()["timestamp"].tolist() == [5.0, 6.0, 7.0, 8.0]
+
+
+def _scapy_packets(n=60, base=1_700_000_000.0):
+    scapy_all = pytest.importorskip("scapy.all")
+    pkts = []
+    for i in range(n):
+        src = "10.0.0.2" if i % 3 else "203.0.113.9"
+        dst = "203.0.113.9" if i % 3 else "10.0.0.2"
+        if i % 4 == 0:
+            l4 = scapy_all.UDP(sport=53, dport=40000 + i)
+        else:
+            l4 = scapy_all.TCP(sport=49152 + i, dport=20 + (i % 17))
+        p = scapy_all.Ether() / scapy_all.IP(src=src, dst=dst) / l4 / (b"x" * i)
+        p.time = base + i * 0.7
+        pkts.append(p)
+    return pkts
+
+
+def test_incremental_features_match_batch_path():
+    pp = PacketProcessor(window_size=25)
+    pp._local_ips = {"10.0.0.2"}
+    for pkt in _scapy_packets():
+        vec = pp.process_and_featurize(pkt)
+        assert vec is not None
+        feats, _ = pp.engineer_features(pp.get_dataframe())
+        expected = feats.tail(1).to_numpy()[0]
+        assert np.array_equal(vec, expected)
+        row = pp.last_processed_row()
+        assert (
+            row["unique_dports_15s"]
+            == expected[PacketProcessor.FEATURES.index("unique_dports_15s")]
+        )
+
+
+def test_incremental_skips_non_ip_packets():
+    scapy_all = pytest.importorskip("scapy.all")
+    pp = PacketProcessor(window_size=5)
+    assert pp.process_and_featurize(scapy_all.Ether() / scapy_all.ARP()) is None
+    assert len(pp.window) == 0
+
+
+def _mixed_frames():
+    s = pytest.importorskip("scapy.all")
+    eth = s.Ether(src="02:00:00:00:00:01", dst="02:00:00:00:00:02")
+    pkts = [
+        eth
+        / s.IP(src="10.0.0.2", dst="8.8.8.8")
+        / s.TCP(sport=50000, dport=443)
+        / b"hi",
+        eth
+        / s.IP(src="8.8.8.8", dst="10.0.0.2")
+        / s.UDP(sport=53, dport=53001)
+        / (b"x" * 40),
+        eth
+        / s.Dot1Q(vlan=7)
+        / s.IP(src="10.1.0.5", dst="10.1.0.9")
+        / s.TCP(sport=22, dport=60000),
+        eth / s.IP(src="10.0.0.2", dst="1.1.1.1") / s.ICMP(),
+        eth / s.IP(src="10.0.0.2", dst="1.1.1.1", frag=3, proto=6) / (b"y" * 16),
+        eth
+        / s.IP(src="192.0.2.1", dst="192.0.2.2")
+        / s.GRE()
+        / s.IP(src="172.16.0.1", dst="172.16.0.2")
+        / s.TCP(sport=1234, dport=80),
+        eth
+        / s.IP(src="192.0.2.1", dst="192.0.2.3")
+        / s.UDP(sport=4789, dport=4789)
+        / s.VXLAN(vni=5)
+        / s.Ether()
+        / s.IP()
+        / s.TCP(sport=7, dport=8),
+        eth / s.ARP(),
+        eth / s.IPv6(src="fe80::1", dst="fe80::2") / s.UDP(sport=546, dport=547),
+    ]
+    return [(bytes(p), 1_700_000_000.0 + i) for i, p in enumerate(pkts)]
+
+
+def test_fast_frame_parser_matches_scapy_dissection():
+    from scapy.all import Ether
+
+    from packet_processor import RawFrame
+
+    fast = PacketProcessor(window_size=50)
+    slow = PacketProcessor(window_size=50)
+    for data, ts in _mixed_frames():
+        fast.process_packet(RawFrame(data, ts))
+        pkt = Ether(data)
+        pkt.time = ts
+        slow.process_packet(pkt)
+    df_fast, df_slow = fast.get_dataframe(), slow.get_dataframe()
+    assert len(df_fast) == 8  # ARP is skipped by both paths
+    assert df_fast["src_ip"].iloc[-1] == "fe80::1"
+    pd.testing.assert_frame_equal(df_fast, df_slow)
+
+
+def test_parse_frame_truncated_and_unknown_linktype():
+    from ip_codec import ip_to_int
+    from packet_processor import FALLBACK, parse_frame
+
+    data, _ = _mixed_frames()[0]
+    assert parse_frame(data[:20]) is None
+    assert parse_frame(data[:34])[:3] == (
+        ip_to_int("10.0.0.2"),
+        ip_to_int("8.8.8.8"),
+        6,
+    )
+    assert parse_frame(data, linktype=147) is FALLBACK
+
+
+def test_window_interns_integer_ips_for_ipv4_and_ipv6():
+    from ip_codec import ip_to_int
+    from packet_processor import PacketWindow
+
+    win = PacketWindow(capacity=3)
+    win.append(1.0, ip_to_int("10.0.0.2"), "2001:db8::1", 6, 60, 1000, 80)
+    win.append(2.0, "2001:db8::1", ip_to_int("10.0.0.2"), 17, 60, 53, 5353)
+    assert win.column("src_ip").dtype == np.uint32
+    assert len(win._ips) == 2
+    assert win.ip_value(win.ip_id("2001:db8::1")) == ip_to_int("2001:db8::1")
+    assert win.ip_id("192.0.2.99") == -1
+    assert win.to_dataframe()["dest_ip"].tolist() == ["2001:db8::1", "10.0.0.2"]
+
+
+def test_incremental_row_carries_integer_ips():
+    from ip_codec import int_to_ip, ip_to_int
+
+    pp = PacketProcessor(window_size=10)
+    pp._local_ips = {"10.0.0.2"}
+    for pkt in _scapy_packets(n=3):
+        pp.process_and_featurize(pkt)
+    row = pp.last_processed_row()
+    assert isinstance(row["src_ip"], int)
+    assert int_to_ip(row["src_ip"]) == pp.get_dataframe()["src_ip"].iloc[-1]
+    assert row["direction"] == float(row["src_ip"] == ip_to_int("10.0.0.2"))
+
+
+@pytest.mark.parametrize("backend", ["exact", "sketch"])
+def test_scan_counter_backends_feed_incremental_rows(backend):
+    from packet_processor import ParsedPacket
+    from scan_counters import make_scan_counter
+
+    pp = PacketProcessor(window_size=100, scan_counter=make_scan_counter(backend, 15.0))
+    pp._local_ips = set()
+    for i in range(30):
+        pp.process_and_featurize(
+            ParsedPacket(1.0 + i * 0.01, 1, 1000 + i % 25, 6, 60, 40000, 20 + i % 12)
+        )
+    row = pp.last_processed_row()
+    assert row["unique_dports_15s"] == 12.0
+    assert row["unique_dips_15s"] == 25.0
+
+
+@pytest.mark.parametrize("backend", ["exact", "sketch"])
+def test_clear_resets_scan_counts_and_time_diff(backend):
+    from packet_processor import ParsedPacket
+    from scan_counters import make_scan_counter
+
+    pp = PacketProcessor(window_size=100, scan_counter=make_scan_counter(backend, 15.0))
+    pp._local_ips = set()
+    for i in range(10):
+        pp.process_and_featurize(ParsedPacket(1.0 + i, 1, 2, 6, 60, 40000, 20 + i))
+    pp.clear()
+    assert len(pp.window) == 0 and pp.last_processed_row() == {}
+
+    pp.process_and_featurize(ParsedPacket(12.0, 1, 2, 6, 60, 40000, 20))
+    vec = pp.process_and_featurize(ParsedPacket(12.5, 1, 2, 6, 60, 40000, 21))
+    assert vec is not None
+    feats = dict(zip(PacketProcessor.FEATURES, vec, strict=True))
+    assert feats["time_diff"] == pytest.approx(0.5)
+    assert feats["unique_dports_15s"] == 2.0
+
+
+def test_time_window_tracks_horizon_across_rates():
+    from packet_processor import PacketWindow
+
+    win = PacketWindow(4, horizon=5.0)
+    # Slow traffic: one packet per second
+    for i in range(20):
+        win.append(float(i), "10.0.0.1", f"10.0.1.{i}", 6, 60, 1000, 80)
+    assert win.column("timestamp")[0] == 14.0  # rows older than t=14 expired
+    assert win.span <= 5.0
+    assert win.expired == 14 and win.evicted == 0
+    assert win.ip_id("10.0.1.0") == -1
+
+    # A burst grows the arrays instead of cutting the horizon short
+    for i in range(2000):
+        win.append(20.0 + i * 0.001, "10.0.0.2", "10.0.0.3", 17, 60, 53, 53)
+    assert len(win) == 2003 and win.capacity >= 2003
+    assert win.evicted == 0
+
+    # ... and the memory is handed back once it has passed
+    for i in range(10):
+        win.append(40.0 + i, "10.0.0.2", "10.0.0.3", 17, 60, 53, 53)
+    assert len(win) == 6
+    assert win.capacity < 64
+
+
+def test_window_byte_budget_evicts_oldest():
+    from packet_processor import PacketWindow
+
+    budget = PacketWindow.row_bytes() * 50
+    win = PacketWindow(8, horizon=60.0, max_bytes=budget)
+    assert win.max_rows == 50
+    for i in range(200):
+        win.append(i * 0.01, f"10.0.{i // 250}.{i % 250}", "10.9.9.9", 6, 60, 1000, 80)
+    stats = win.stats()
+    assert stats["rows"] == 50 and stats["capacity"] == 50
+    assert stats["evicted"] == 150 and stats["expired"] == 0
+    assert stats["bytes"] <= budget
+    assert win.column("timestamp")[0] == pytest.approx(1.5)
+
+    # The budget also caps a count-based window
+    assert PacketWindow(1000, max_bytes=budget).capacity == 50
+
+
+def test_processor_time_window_stats():
+    pp = PacketProcessor(window_size=8, window_horizon=2.0)
+    pp._local_ips = set()
+    for pkt in _scapy_packets(n=60):
+        pp.process_and_featurize(pkt)
+    stats = pp.window_stats()
+    assert stats["span_seconds"] <= 2.0
+    assert stats["rows"] == len(pp.get_dataframe())
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly_detector import AnomalyDetector
+from score_cache import ScoreCache
+
+pytestmark = pytest.mark.unit
+
+COLS = ["f0", "f1", "f2"]
+
+
+def _detector(seed=0):
+    rng = np.random.default_rng(seed)
+    det = AnomalyDetector(contamination=0.1, n_estimators=30, random_state=seed)
+    det.train(pd.DataFrame(rng.normal(size=(200, 3)), columns=COLS))
+    return det
+
+
+def _traffic(n, distinct, seed=1):
+    rng = np.random.default_rng(seed)
+    pool = np.round(rng.normal(size=(distinct, 3)), 2)
+    return pool[rng.integers(0, distinct, size=n)]
+
+
+def test_repeated_rows_hit_the_cache_with_identical_scores(monkeypatch):
+    det = _detector()
+    X = _traffic(2000, 50)
+    ref, ref_flags = det.score_batch(X, COLS)
+
+    calls = []
+    real = det.score_batch
+    monkeypatch.setattr(
+        det,
+        "score_batch",
+        lambda A, columns=None: calls.append(len(A)) or real(A, columns),
+    )
+    cache = ScoreCache(1024, decimals=4)
+    got = [cache.score(det, X[i : i + 100], COLS) for i in range(0, len(X), 100)]
+    scores = np.concatenate([s for s, _ in got])
+    flags = np.concatenate([f for _, f in got])
+    assert np.array_equal(scores, ref) and np.array_equal(flags, ref_flags)
+
+    # Each distinct row reaches the model once
+    assert sum(calls) == 50
+    stats = cache.stats()
+    assert stats["misses"] == 50 and stats["hits"] == 1950
+    assert stats["entries"] == 50 and stats["hit_rate"] == pytest.approx(0.975)
+
+    # Single rows (1-D) take the same path
+    one, one_flag = cache.score(det, X[5], COLS)
+    assert one.shape == (1,) and one[0] == ref[5] and one_flag[0] == ref_flags[5]
+
+
+def test_rows_are_keyed_after_rounding():
+    det = _detector()
+    cache = ScoreCache(16, decimals=3)
+    row = np.array([[0.5, -1.0, 0.25]])
+    first, _ = cache.score(det, row, COLS)
+    again, _ = cache.score(det, row + 1e-5, COLS)
+    assert again[0] == first[0] and cache.hits == 1
+    cache.score(det, row + 1e-2, COLS)
+    assert cache.misses == 2
+    # -0.0 and 0.0 share one entry
+    cache.score(det, np.array([[0.0, 0.0, 0.0]]), COLS)
+    cache.score(det, np.array([[-0.0, -0.0, -0.0]]), COLS)
+    assert cache.hits == 2
+
+
+def test_lru_eviction_keeps_recent_rows():
+    det = _detector()
+    cache = ScoreCache(3, decimals=2)
+    rows = [np.array([[float(i), 0.0, 0.0]]) for i in range(4)]
+    for r in rows[:3]:
+        cache.score(det, r, COLS)
+    cache.score(det, rows[0], COLS)  # row 0 becomes most recent
+    cache.score(det, rows[3], COLS)  # evicts row 1
+    assert cache.stats()["entries"] == 3 and cache.evictions == 1
+    hits = cache.hits
+    cache.score(det, rows[0], COLS)
+    assert cache.hits == hits + 1
+    cache.score(det, rows[1], COLS)
+    assert cache.hits == hits + 1 and cache.evictions == 2
+
+
+def test_model_swap_and_retrain_invalidate():
+    det, other = _detector(0), _detector(5)
+    X = _traffic(200, 20)
+    cache = ScoreCache(256)
+    cache.score(det, X, COLS)
+    assert cache.stats()["entries"] == 20
+
+    swapped, _ = cache.score(other, X, COLS)
+    assert np.array_equal(swapped, other.score_batch(X, COLS)[0])
+    assert cache.invalidations == 1
+
+    # Retraining the same object in place bumps its generation
+    rng = np.random.default_rng(9)
+    other.train(pd.DataFrame(rng.normal(size=(200, 3)), columns=COLS))
+    retrained, _ = cache.score(other, X, COLS)
+    assert np.array_equal(retrained, other.score_batch(X, COLS)[0])
+    assert cache.invalidations == 2
+
+    # Another column order is another key space
+    cache.score(other, X[:, ::-1], COLS[::-1])
+    assert cache.invalidations == 3
+
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+
+
+def test_retrain_invalidates_without_a_compiled_forest(monkeypatch):
+    import forest_engine
+
+    def _fail(detector):
+        raise RuntimeError("cannot compile")
+
+    monkeypatch.setattr(forest_engine.CompiledForest, "from_detector", _fail)
+    det = _detector(0)
+    assert det.compiled is None
+    X = _traffic(200, 20)
+    cache = ScoreCache(256)
+    cache.score(det, X, COLS)
+
+    rng = np.random.default_rng(9)
+    det.train(pd.DataFrame(rng.normal(size=(200, 3)), columns=COLS))
+    assert det.compiled is None
+    retrained, _ = cache.score(det, X, COLS)
+    assert np.array_equal(retrained, det.score_batch(X, COLS)[0])
+    assert cache.invalidations == 1
+
+
+def test_rejects_bad_sizes():
+    with pytest.raises(ValueError):
+        ScoreCache(0)
+    with pytest.raises(ValueError):
+        ScoreCache(8, decimals=-1)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from score_quantiles import P2Quantile, ScoreQuantiles
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.mark.parametrize("p", [0.005, 0.02, 0.5, 0.95])
+def test_p2_tracks_exact_quantiles(p):
+    rng = np.random.default_rng(0)
+    for x in (rng.normal(0.1, 0.05, 50000), rng.exponential(1.0, 50000) - 0.5):
+        est = P2Quantile(p)
+        for v in x.tolist():
+            est.add(v)
+        exact = np.quantile(x, p)
+        spread = np.quantile(x, 0.99) - np.quantile(x, 0.01)
+        assert est.count == len(x)
+        assert est.value == pytest.approx(exact, abs=0.02 * spread)
+
+
+def test_p2_small_counts_and_bad_p():
+    est = P2Quantile(0.5)
+    assert est.value is None
+    for v in (3.0, 1.0, 2.0):
+        est.add(v)
+    assert est.value == 2.0
+    with pytest.raises(ValueError):
+        P2Quantile(1.0)
+
+
+def test_windows_follow_recent_scores():
+    q = ScoreQuantiles([0.01, 0.05], window=5000, min_count=500)
+    assert q.values() is None
+    rng = np.random.default_rng(1)
+    q.update(rng.normal(0.1, 0.02, 400))
+    assert q.values() is None
+    q.update(rng.normal(0.1, 0.02, 4600))
+    first = q.values()
+    assert q.windows == 1 and first is not None
+    assert first[0] < first[1]
+    assert first[0] == pytest.approx(0.1 + 0.02 * -2.326, abs=0.01)
+
+    # Traffic shifts: the frozen window is served until the new one has
+    # min_count scores, then the new estimate takes over
+    shifted = rng.normal(-0.2, 0.02, 5000)
+    q.update(shifted[:100])
+    assert q.values() == first
+    q.update(shifted[100:600])
+    assert q.values()[0] == pytest.approx(-0.2 + 0.02 * -2.326, abs=0.01)
+
+    # NaN / inf scores are ignored
+    q.update(np.array([np.nan, np.inf]))
+    stats = q.stats()
+    assert stats["total"] == 5600 and stats["window_count"] == 600
+    assert set(stats["quantiles"]) == {"p1", "p5"}
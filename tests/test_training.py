@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from training import FeatureReservoir, FeatureRing, iter_parquet_batches
+
+pytestmark = pytest.mark.unit
+
+
+def test_ring_keeps_latest_rows_oldest_first():
+    ring = FeatureRing(4, ["a", "b"])
+    for i in range(3):
+        ring.add(np.array([i, -i]))
+    assert ring.to_frame()["a"].tolist() == [0, 1, 2]
+    for i in range(3, 10):
+        ring.add(np.array([i, -i]))
+    frame = ring.to_frame()
+    assert len(ring) == 4 and list(frame.columns) == ["a", "b"]
+    assert frame["a"].tolist() == [6, 7, 8, 9]
+    # The snapshot is a copy: later rows do not leak into it
+    ring.add(np.array([10, -10]))
+    assert frame["a"].tolist() == [6, 7, 8, 9]
+
+
+def test_reservoir_is_bounded_and_uniform():
+    res = FeatureReservoir(100, ["x"], random_state=0)
+    for i in range(10_000):
+        res.add(np.array([i]))
+    values = res.to_frame()["x"].to_numpy()
+    assert len(values) == 100 and len(set(values)) == 100
+    assert 3000 < values.mean() < 7000
+
+
+def test_reservoir_add_batch_is_bounded_and_uniform():
+    res = FeatureReservoir(500, ["x", "y"], random_state=0)
+    res.add_batch(np.zeros((0, 2)))
+    for start in range(0, 100_000, 7_000):
+        stop = min(start + 7_000, 100_000)
+        idx = np.arange(start, stop, dtype=float)
+        res.add_batch(np.column_stack([idx, -idx]))
+    frame = res.to_frame()
+    assert res.seen == 100_000 and len(frame) == 500
+    assert frame["x"].nunique() == 500 and (frame["y"] == -frame["x"]).all()
+    # Uniform over the whole stream: every tenth of it is represented
+    counts = np.bincount((frame["x"] // 10_000).astype(int), minlength=10)
+    assert counts.min() > 20
+
+
+def test_iter_parquet_batches_streams_files_and_directories(tmp_path):
+    import pandas as pd
+
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({"a": np.arange(10.0), "b": [1.0, None] * 5, "extra": ["s"] * 10})
+    df.iloc[:6].to_parquet(tmp_path / "day1.parquet", row_group_size=4)
+    (tmp_path / "sub").mkdir()
+    df.iloc[6:].to_parquet(tmp_path / "sub" / "day2.parquet")
+
+    one = list(
+        iter_parquet_batches(str(tmp_path / "day1.parquet"), ["b", "a"], batch_rows=3)
+    )
+    assert all(len(chunk) <= 3 for chunk in one)
+    assert np.vstack(one)[:, 1].tolist() == list(range(6))
+    assert np.vstack(one)[:, 0].tolist() == [1.0, 0.0] * 3
+
+    rows = np.vstack(list(iter_parquet_batches(str(tmp_path), ["a", "b"])))
+    assert rows[:, 0].tolist() == list(range(10))
+    with pytest.raises(ValueError, match="missing"):
+        list(iter_parquet_batches(str(tmp_path), ["a", "missing"]))
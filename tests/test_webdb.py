@@ -12,3 +12,49 @@ def test_schema_init_and_list():
     blocks = webdb.list_blocks(limit=1)
     assert isinstance(alerts, list)
     assert isinstance(blocks, list)
+
+
+def test_runtime_stats_round_trip():
+    webdb.init()
+    webdb.set_runtime_stats("ingest", {"dropped": 1, "depth": 5})
+    webdb.set_runtime_stats("ingest", {"dropped": 7, "depth": 0})
+    stats = webdb.get_runtime_stats()
+    assert stats["ingest"]["dropped"] == 7 and stats["ingest"]["depth"] == 0
+    assert stats["ingest"]["ts"]
+
+
+def test_alert_sample_rate_migration(tmp_path, monkeypatch):
+    import sqlite3
+
+    db = tmp_path / "old.db"
+    con = sqlite3.connect(db)
+    con.execute(
+        "CREATE TABLE alerts (id TEXT PRIMARY KEY, ts TEXT, src_ip TEXT, label TEXT, severity TEXT, kind TEXT)"
+    )
+    con.execute(
+        "INSERT INTO alerts VALUES ('a', '2025-01-01T00:00:00Z', '1.2.3.4', 'x', 'LOW', 'ANOMALY')"
+    )
+    con.commit()
+    con.close()
+    monkeypatch.setattr(webdb, "DB", db)
+    webdb.init()
+    base = {
+        "ts": "2025-01-02T00:00:00Z",
+        "src_ip": "1.2.3.4",
+        "label": "y",
+        "severity": "HIGH",
+        "kind": "ANOMALY",
+    }
+    webdb.insert_alerts([dict(base, id="b", sample_rate=0.25)])
+    webdb.insert_alert(dict(base, id="c", ts="2025-01-03T00:00:00Z"))
+    rates = {a["id"]: a["sample_rate"] for a in webdb.list_alerts(limit=10)}
+    assert rates == {"a": 1.0, "b": 0.25, "c": 1.0}
+
+
+def test_commands_keep_latest_request():
+    webdb.init()
+    first = webdb.post_command("model_reload")
+    second = webdb.post_command("model_reload", {"note": "deploy"})
+    cmd = webdb.get_command("model_reload")
+    assert first != second and cmd["id"] == second and cmd["note"] == "deploy"
+    assert webdb.get_command("no_such_command") is None
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded-memory helpers for training on streams larger than RAM.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+from typing import Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+__all__ = [
+    "FeatureReservoir",
+    "FeatureRing",
+    "current_rss_bytes",
+    "iter_parquet_batches",
+    "peak_rss_bytes",
+]
+
+
+class FeatureReservoir:
+    """Uniform random sample of feature rows from an unbounded stream.
+
+    Classic reservoir sampling (Algorithm R) into a preallocated array, so
+    memory is fixed at ``capacity x n_features`` however long the stream is.
+    """
+
+    def __init__(
+        self, capacity: int, columns: List[str], random_state: Optional[int] = 42
+    ) -> None:
+        self.capacity = max(1, int(capacity))
+        self.columns = list(columns)
+        self._rows = np.zeros((self.capacity, len(self.columns)), dtype=float)
+        self._rng = np.random.default_rng(random_state)
+        self.seen = 0
+
+    def __len__(self) -> int:
+        return min(self.seen, self.capacity)
+
+    def add(self, row: Union[np.ndarray, Sequence[float]]) -> None:
+        if self.seen < self.capacity:
+            self._rows[self.seen] = row
+        else:
+            j = int(self._rng.integers(0, self.seen + 1))
+            if j < self.capacity:
+                self._rows[j] = row
+        self.seen += 1
+
+    def add_batch(self, rows: np.ndarray) -> None:
+        """:meth:`add` every row of a 2-D array, vectorized."""
+        rows = np.asarray(rows, dtype=float)
+        n = len(rows)
+        fill = min(max(self.capacity - self.seen, 0), n)
+        if fill:
+            self._rows[self.seen : self.seen + fill] = rows[:fill]
+        if fill < n:
+            # Stream row i lands on a uniform slot in [0, i] if that is < capacity
+            slots = self._rng.integers(0, self.seen + np.arange(fill, n) + 1)
+            keep = slots < self.capacity
+            slots, picked = slots[keep], rows[fill:][keep]
+            # On repeated slots the later row wins, as in the sequential version
+            last = len(slots) - 1 - np.unique(slots[::-1], return_index=True)[1]
+            self._rows[slots[last]] = picked[last]
+        self.seen += n
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self._rows[: len(self)].copy(), columns=self.columns)
+
+
+class FeatureRing:
+    """The most recent `capacity` feature rows, in a preallocated ring.
+
+    :meth:`to_frame` copies the rows out oldest-first, so another thread can
+    train on the snapshot while the ring keeps filling.
+    """
+
+    def __init__(self, capacity: int, columns: List[str]) -> None:
+        self.capacity = max(1, int(capacity))
+        self.columns = list(columns)
+        self._rows = np.zeros((self.capacity, len(self.columns)), dtype=float)
+        self.seen = 0
+
+    def __len__(self) -> int:
+        return min(self.seen, self.capacity)
+
+    def add(self, row: np.ndarray) -> None:
+        self._rows[self.seen % self.capacity] = row
+        self.seen += 1
+
+    def to_frame(self) -> pd.DataFrame:
+        if self.seen <= self.capacity:
+            rows = self._rows[: self.seen].copy()
+        else:
+            start = self.seen % self.capacity
+            rows = np.concatenate([self._rows[start:], self._rows[:start]])
+        return pd.DataFrame(rows, columns=self.columns)
+
+
+def _parquet_files(path: str) -> List[str]:
+    if not os.path.isdir(path):
+        return [path]
+    found: List[str] = []
+    for root, _, names in os.walk(path):
+        found.extend(os.path.join(root, n) for n in names if n.endswith(".parquet"))
+    return sorted(found)
+
+
+def iter_parquet_batches(
+    path: str, columns: Sequence[str], batch_rows: int = 65536
+) -> Iterator[np.ndarray]:
+    """Float rows of `columns` from a Parquet file, or every ``*.parquet``
+    file under a directory, at most `batch_rows` at a time.
+
+    pyarrow decodes one row group at a time and only the requested columns,
+    so memory is bounded by a row group, not by the file. Nulls become 0.0
+    (as ``reindex(...).fillna(0.0)`` does for in-memory features).
+    """
+    import pyarrow.parquet as pq
+
+    files = _parquet_files(path)
+    if not files or not os.path.exists(files[0]):
+        raise FileNotFoundError(f"No Parquet data at: {path}")
+    columns = list(columns)
+    for name in files:
+        pf = pq.ParquetFile(name)
+        missing = [c for c in columns if c not in pf.schema_arrow.names]
+        if missing:
+            raise ValueError(f"{name} lacks feature columns: {missing}")
+        for batch in pf.iter_batches(batch_size=batch_rows, columns=columns):
+            rows = np.empty((batch.num_rows, len(columns)), dtype=float)
+            for i in range(len(columns)):
+                rows[:, i] = batch.column(i).to_numpy(zero_copy_only=False)
+            yield np.nan_to_num(rows, nan=0.0)
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process so far."""
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process now (the peak where /proc is missing)."""
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
@@ -1,4 +1,5 @@
 import hashlib
+import json
 import os
 import sqlite3
 import uuid
@@ -54,6 +55,19 @@ CREATE TABLE IF NOT EXISTS trusted_ips (
   note TEXT,
   created_ts TEXT
 );
+-- Latest sensor counters per component (ingest queue, window, capture)
+CREATE TABLE IF NOT EXISTS runtime_stats (
+  component TEXT PRIMARY KEY,
+  ts TEXT,
+  data TEXT
+);
+-- Latest request per command name (e.g. model reload), polled by the sensor
+CREATE TABLE IF NOT EXISTS commands (
+  name TEXT PRIMARY KEY,
+  id TEXT,
+  ts TEXT,
+  data TEXT
+);
 
 """
 
@@ -81,6 +95,10 @@ def init():
         bcols = [r[1] for r in con.execute("PRAGMA table_info(blocks)")]
         if "expires_at" not in bcols:
             con.execute("ALTER TABLE blocks ADD COLUMN expires_at TEXT DEFAULT ''")
+        # --- migration: model sampling rate in effect when an alert fired ---
+        acols = [r[1] for r in con.execute("PRAGMA table_info(alerts)")]
+        if "sample_rate" not in acols:
+            con.execute("ALTER TABLE alerts ADD COLUMN sample_rate REAL DEFAULT 1.0")
         con.commit()
 
 
@@ -126,7 +144,8 @@ def delete_action_by_ip(ip: str, action: str):
 def insert_alert(a):
     with closing(_con()) as con:
         con.execute(
-            "INSERT OR REPLACE INTO alerts (id, ts, src_ip, label, severity, kind) VALUES (?,?,?,?,?,?)",
+            "INSERT OR REPLACE INTO alerts (id, ts, src_ip, label, severity, kind, sample_rate)"
+            " VALUES (?,?,?,?,?,?,?)",
             (
                 a["id"],
                 a["ts"],
@@ -134,11 +153,37 @@ def insert_alert(a):
                 a["label"],
                 a["severity"],
                 a["kind"],
+                a.get("sample_rate", 1.0),
             ),
         )
         con.commit()
 
 
+def insert_alerts(items):
+    """Insert many alerts in one transaction (bulk sink for batched monitoring)."""
+    rows = [
+        (
+            a["id"],
+            a["ts"],
+            a["src_ip"],
+            a["label"],
+            a["severity"],
+            a["kind"],
+            a.get("sample_rate", 1.0),
+        )
+        for a in items
+    ]
+    if not rows:
+        return
+    with closing(_con()) as con:
+        con.executemany(
+            "INSERT OR REPLACE INTO alerts (id, ts, src_ip, label, severity, kind, sample_rate)"
+            " VALUES (?,?,?,?,?,?,?)",
+            rows,
+        )
+        con.commit()
+
+
 def insert_block(b):
     with closing(_con()) as con:
         con.execute(
@@ -379,7 +424,82 @@ def record_device(ip: str, name: str = ""):
     upsert_device(ip, name or "")
 
 
+def record_devices(ips):
+    """Upsert many devices (refreshing last_seen) in one transaction."""
+    ts = _now()
+    rows = [(ip, ts, ts, "") for ip in dict.fromkeys(ips) if ip]
+    if not rows:
+        return
+    with closing(_con()) as con:
+        con.executemany(
+            """
+            INSERT INTO devices (ip, first_seen, last_seen, name)
+            VALUES (?,?,?,?)
+            ON CONFLICT(ip) DO UPDATE SET last_seen=excluded.last_seen
+            """,
+            rows,
+        )
+        con.commit()
+
+
 # --- Scan results helpers ---
+def set_runtime_stats(component: str, data: Dict[str, Any]) -> None:
+    """Replace the latest counters snapshot for `component`."""
+    with closing(_con()) as con:
+        con.execute(
+            """
+            INSERT INTO runtime_stats (component, ts, data) VALUES (?,?,?)
+            ON CONFLICT(component) DO UPDATE SET ts=excluded.ts, data=excluded.data
+            """,
+            (component, _now(), json.dumps(data)),
+        )
+        con.commit()
+
+
+def get_runtime_stats() -> Dict[str, Dict[str, Any]]:
+    """Latest snapshot per component: {component: {"ts": ..., **counters}}."""
+    with closing(_con()) as con:
+        rows = con.execute("SELECT component, ts, data FROM runtime_stats").fetchall()
+    out: Dict[str, Dict[str, Any]] = {}
+    for r in rows:
+        try:
+            data = json.loads(r["data"] or "{}")
+        except ValueError:
+            data = {}
+        out[r["component"]] = {"ts": r["ts"], **data}
+    return out
+
+
+def post_command(name: str, data: Optional[Dict[str, Any]] = None) -> str:
+    """Record a new `name` request (replacing any earlier one); returns its id."""
+    cid = str(uuid.uuid4())
+    with closing(_con()) as con:
+        con.execute(
+            """
+            INSERT INTO commands (name, id, ts, data) VALUES (?,?,?,?)
+            ON CONFLICT(name) DO UPDATE SET id=excluded.id, ts=excluded.ts, data=excluded.data
+            """,
+            (name, cid, _now(), json.dumps(data or {})),
+        )
+        con.commit()
+    return cid
+
+
+def get_command(name: str) -> Optional[Dict[str, Any]]:
+    """Latest `name` request as {"id": ..., "ts": ..., **data}, or None."""
+    with closing(_con()) as con:
+        row = con.execute(
+            "SELECT id, ts, data FROM commands WHERE name=?", (name,)
+        ).fetchone()
+    if row is None:
+        return None
+    try:
+        data = json.loads(row["data"] or "{}")
+    except ValueError:
+        data = {}
+    return {"id": row["id"], "ts": row["ts"], **data}
+
+
 def set_device_scan(ip: str, ports_csv: str, risk: str = ""):
     if not ip:
         return